@@ -0,0 +1,4 @@
+import os
+
+# Benchmarks run offline and never call the LLM; Settings only needs a placeholder key.
+os.environ.setdefault("DEEPSEEK_API_KEY", "benchmark")
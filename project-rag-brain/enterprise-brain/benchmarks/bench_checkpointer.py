@@ -0,0 +1,144 @@
+"""
+Checkpointer benchmark: 并发会话下 checkpoint 写入 / 读取的延迟
+
+    python -m benchmarks.bench_checkpointer --sessions 64 --turns 5 --output checkpointer.json
+
+对比三种配置:
+- sync-shared:  旧实现, 一个 sqlite3 连接 (check_same_thread=False) 被所有请求共享
+- async-pool-1: 单连接的异步 checkpointer
+- async-pool-N: 按 thread_id 分片的连接池 (N = --pool-size)
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import asyncio
+import sqlite3
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langgraph.checkpoint.base import empty_checkpoint
+from langgraph.checkpoint.sqlite import SqliteSaver
+from src.core.memory import PooledAsyncSqliteSaver
+from benchmarks.stats import summarize
+
+
+def _payload(turn: int, size: int):
+    # 模拟一轮对话的消息状态: 随轮次增长的消息列表
+    return [f"turn {i}: " + "x" * size for i in range(turn + 1)]
+
+
+async def _session_async(saver, session_id: int, turns: int, payload_size: int, write_lat, read_lat):
+    config = {"configurable": {"thread_id": f"bench-{session_id}-{uuid.uuid4().hex[:6]}", "checkpoint_ns": ""}}
+    for turn in range(turns):
+        checkpoint = empty_checkpoint()
+        checkpoint["channel_values"] = {"messages": _payload(turn, payload_size)}
+
+        start = time.perf_counter()
+        saved = await saver.aput(config, checkpoint, {"source": "loop", "step": turn}, {})
+        await saver.aput_writes(saved, [("messages", f"reply {turn}"), ("tool", "result")], task_id=f"task-{turn}")
+        write_lat.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await saver.aget_tuple(config)
+        read_lat.append(time.perf_counter() - start)
+
+
+def _session_sync(saver, session_id: int, turns: int, payload_size: int, write_lat, read_lat):
+    config = {"configurable": {"thread_id": f"bench-{session_id}-{uuid.uuid4().hex[:6]}", "checkpoint_ns": ""}}
+    for turn in range(turns):
+        checkpoint = empty_checkpoint()
+        checkpoint["channel_values"] = {"messages": _payload(turn, payload_size)}
+
+        start = time.perf_counter()
+        saved = saver.put(config, checkpoint, {"source": "loop", "step": turn}, {})
+        saver.put_writes(saved, [("messages", f"reply {turn}"), ("tool", "result")], task_id=f"task-{turn}")
+        write_lat.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        saver.get_tuple(config)
+        read_lat.append(time.perf_counter() - start)
+
+
+async def run_sync_shared(path, args):
+    conn = sqlite3.connect(path, check_same_thread=False)
+    saver = SqliteSaver(conn)
+    saver.setup()
+    write_lat, read_lat = [], []
+    start = time.perf_counter()
+    # 每个会话一个线程, 与异步配置的并发度相同
+    loop = asyncio.get_running_loop()
+    with ThreadPoolExecutor(max_workers=args.sessions) as pool:
+        await asyncio.gather(*(
+            loop.run_in_executor(pool, _session_sync, saver, i, args.turns, args.payload_size, write_lat, read_lat)
+            for i in range(args.sessions)
+        ))
+    elapsed = time.perf_counter() - start
+    conn.close()
+    return write_lat, read_lat, elapsed, {}
+
+
+async def run_async_pool(path, args, pool_size):
+    saver = await PooledAsyncSqliteSaver.create(path, pool_size=pool_size, busy_timeout_ms=args.busy_timeout_ms)
+    write_lat, read_lat = [], []
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*(
+            _session_async(saver, i, args.turns, args.payload_size, write_lat, read_lat)
+            for i in range(args.sessions)
+        ))
+    finally:
+        elapsed = time.perf_counter() - start
+        stats = saver.stats()
+        await saver.aclose()
+    return write_lat, read_lat, elapsed, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark conversation checkpointers under concurrent sessions")
+    parser.add_argument("--sessions", type=int, default=64)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--payload-size", type=int, default=512, help="bytes per message in the fake state")
+    parser.add_argument("--pool-size", type=int, default=4)
+    parser.add_argument("--busy-timeout-ms", type=int, default=5000)
+    parser.add_argument("--output", help="write JSON results to this file")
+    args = parser.parse_args()
+
+    configs = [("sync-shared", None), ("async-pool-1", 1)]
+    if args.pool_size > 1:
+        configs.append((f"async-pool-{args.pool_size}", args.pool_size))
+
+    results = {"benchmark": "checkpointer", "params": vars(args).copy(), "results": {}}
+    results["params"].pop("output")
+    for name, pool_size in configs:
+        with tempfile.TemporaryDirectory(prefix="eb-bench-ckpt-") as tmp:
+            path = os.path.join(tmp, "chat_history.db")
+            if pool_size is None:
+                write_lat, read_lat, elapsed, stats = asyncio.run(run_sync_shared(path, args))
+            else:
+                write_lat, read_lat, elapsed, stats = asyncio.run(run_async_pool(path, args, pool_size))
+        ops = len(write_lat) + len(read_lat)
+        results["results"][name] = {
+            "write_ms": summarize(write_lat),
+            "read_ms": summarize(read_lat),
+            "elapsed_s": round(elapsed, 3),
+            "ops_per_s": round(ops / elapsed, 1) if elapsed else None,
+            "saver": stats,
+        }
+        print(f"📊 {name}: write p95={results['results'][name]['write_ms']['p95']}ms "
+              f"read p95={results['results'][name]['read_ms']['p95']}ms "
+              f"({results['results'][name]['ops_per_s']} ops/s)")
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Embedding 后端基准: 各后端的吞吐量与相对 PyTorch 向量的偏差
+
+    python -m benchmarks.bench_embeddings --backends torch onnx onnx-int8 --texts 2000 --output embeddings.json
+
+需要能下载 (或本地已缓存) EMBEDDING_MODEL 的权重; onnx 后端需要 pip install "sentence-transformers[onnx]"。
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from src.core.llm import EMBEDDING_BACKENDS, build_embeddings, settings
+
+WORDS = (
+    "企业 知识库 战略 流程 审批 报销 VPN 权限 安全 合规 客户 产品 发布 季度 目标 "
+    "strategy platform release incident review budget policy onboarding access region"
+).split()
+
+def synthetic_texts(n: int, words_per_text: int, seed: int = 42):
+    """确定性的合成 chunk 文本, 长度接近 ingest 切分后的 chunk"""
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(WORDS) for _ in range(words_per_text)) for _ in range(n)]
+
+def run_backend(backend: str, texts, batch_size: int):
+    started = time.perf_counter()
+    embeddings = build_embeddings(backend)
+    embeddings.encode_kwargs["batch_size"] = batch_size
+    embeddings.embed_documents(texts[:batch_size])  # warmup
+    load_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    vectors = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+    elapsed = time.perf_counter() - started
+    return vectors, {
+        "load_s": round(load_s, 3),
+        "elapsed_s": round(elapsed, 3),
+        "texts_per_s": round(len(texts) / elapsed, 1) if elapsed else None,
+        "dim": int(vectors.shape[1]),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark embedding backends")
+    parser.add_argument("--backends", nargs="+", default=list(EMBEDDING_BACKENDS), choices=EMBEDDING_BACKENDS)
+    parser.add_argument("--texts", type=int, default=2000)
+    parser.add_argument("--words", type=int, default=80, help="words per synthetic chunk")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--output", help="write JSON results to this file")
+    args = parser.parse_args()
+
+    texts = synthetic_texts(args.texts, args.words)
+    results = {"benchmark": "embeddings", "model": settings.EMBEDDING_MODEL, "params": vars(args).copy(), "results": {}}
+    results["params"].pop("output")
+
+    reference = None
+    for backend in args.backends:
+        try:
+            vectors, stats = run_backend(backend, texts, args.batch_size)
+        except Exception as e:
+            print(f"⚠️ {backend}: {e}")
+            results["results"][backend] = {"error": str(e)}
+            continue
+        if backend == "torch":
+            reference = vectors
+        if reference is not None and vectors.shape == reference.shape:
+            cosine = (vectors * reference).sum(axis=1) / (
+                np.linalg.norm(vectors, axis=1) * np.linalg.norm(reference, axis=1)
+            )
+            stats["cosine_vs_torch"] = {"min": round(float(cosine.min()), 6), "mean": round(float(cosine.mean()), 6)}
+        results["results"][backend] = stats
+        print(f"📊 {backend}: {stats['texts_per_s']} texts/s (load {stats['load_s']}s)")
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""
+Ingest + 混合检索端到端基准 (离线, 不需要 Chroma Server 和模型下载)
+
+    python -m benchmarks.bench_ingest_retrieval --files 300 --queries 500 --output ingest_retrieval.json
+
+- 语料: benchmarks.corpus 生成的 md / txt / pdf (相同参数生成的内容完全一致)
+- Chroma: 进程内 PersistentClient (CHROMA_MODE=persistent), 数据写在临时 INDEX_DIR 下
+- Embedding: 默认是确定性的哈希向量 (--embedder hash), 只衡量流水线本身;
+  --embedder local 使用 EMBEDDING_MODEL (需要本地已缓存的模型)
+报告 files/s, chunks/s, 检索 p50/p95/p99, 峰值 RSS 与索引大小。
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import tempfile
+import threading
+import contextlib
+from typing import List
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from src.config.settings import get_settings
+from src.core.db import DBFactory
+from src.core.ingest import ingest_docs
+from src.core.ingest_pipeline import MemoryGuard
+from src.core.batch_retrieval import hybrid_search_batch
+from src.core.hybrid_retriever import HybridRetriever
+from src.core.retriever import get_retriever, reset_bm25_cache
+from benchmarks.corpus import generate_corpus, sample_queries
+from benchmarks.stats import summarize
+
+settings = get_settings()
+
+
+class HashEmbeddings(Embeddings):
+    """确定性的假 Embedding: 词项哈希到固定维度 (feature hashing) 后归一化, 相同文本永远得到相同向量"""
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in text.lower().split():
+            digest = hashlib.md5(token.encode("utf-8")).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dim
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+class RSSSampler:
+    """后台线程按固定间隔采样进程 RSS, 记录整个基准期间的峰值"""
+
+    def __init__(self, interval: float = 0.02):
+        self.interval = interval
+        self.memory = MemoryGuard(limit_mb=0)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.memory.sample()
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.memory.sample()
+
+
+def dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+def build_embedder(name: str) -> Embeddings:
+    if name == "hash":
+        return HashEmbeddings()
+    from src.core.llm import get_embeddings
+    return get_embeddings()
+
+def configure(data_dir: str, index_dir: str, args):
+    """把所有状态指向临时目录, 并关闭会干扰计时的缓存"""
+    settings.DATA_DIR = data_dir
+    settings.INDEX_DIR = index_dir
+    settings.CHROMA_MODE = "persistent"
+    settings.LEXICAL_INDEX_SOURCE = "chunks"
+    settings.EMBEDDING_CACHE_ENABLED = False
+    settings.SEMANTIC_CACHE_ENABLED = False
+    settings.RETRIEVAL_CACHE_ENABLED = False
+    settings.RERANK_ENABLED = False
+    settings.INGEST_PARSE_WORKERS = args.parse_workers
+    settings.RETRIEVAL_TOP_K = args.k
+    DBFactory.invalidate()
+    reset_bm25_cache()
+
+def run_ingest(embedder, verbose: bool) -> dict:
+    quiet = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+    with quiet:
+        started = time.perf_counter()
+        summary = ingest_docs(embeddings=embedder)
+        elapsed = time.perf_counter() - started
+    if not summary.get("ok"):
+        raise RuntimeError(f"ingest failed: {summary.get('error')}")
+    return summary, elapsed
+
+def run_retrieval(embedder, queries: List[str], warmup: int) -> dict:
+    reset_bm25_cache()
+    retriever = get_retriever(embedder)
+    if not isinstance(retriever, HybridRetriever):
+        raise RuntimeError("BM25 index is empty, hybrid retrieval is not available")
+    for query in queries[:warmup]:
+        retriever.invoke(query)
+
+    latencies, empty = [], 0
+    started = time.perf_counter()
+    for query in queries:
+        t = time.perf_counter()
+        docs = retriever.invoke(query)
+        latencies.append(time.perf_counter() - t)
+        empty += not docs
+    elapsed = time.perf_counter() - started
+    return {
+        "latency_ms": summarize(latencies),
+        "queries_per_s": round(len(queries) / elapsed, 1) if elapsed else None,
+        "empty_results": empty,
+    }
+
+def run_batch_retrieval(embedder, queries: List[str], k: int) -> dict:
+    started = time.perf_counter()
+    hybrid_search_batch(embedder, queries, k)
+    elapsed = time.perf_counter() - started
+    return {"elapsed_s": round(elapsed, 3), "queries_per_s": round(len(queries) / elapsed, 1) if elapsed else None}
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ingest and hybrid retrieval on a synthetic corpus")
+    parser.add_argument("--files", type=int, default=300)
+    parser.add_argument("--paragraphs", type=int, default=12, help="paragraphs per file")
+    parser.add_argument("--pdf-ratio", type=float, default=0.2)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--parse-workers", type=int, default=0, help="INGEST_PARSE_WORKERS (0 = all cores)")
+    parser.add_argument("--embedder", choices=["hash", "local"], default="hash")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--corpus", help="use an existing corpus directory instead of generating one")
+    parser.add_argument("--verbose", action="store_true", help="show ingest progress logs")
+    parser.add_argument("--output", help="write JSON results to this file")
+    args = parser.parse_args()
+
+    results = {"benchmark": "ingest_retrieval", "params": vars(args).copy(), "corpus": {}, "results": {}}
+    for key in ("output", "verbose"):
+        results["params"].pop(key)
+    embedder = build_embedder(args.embedder)
+    queries = sample_queries(args.queries, seed=args.seed)
+
+    with tempfile.TemporaryDirectory(prefix="eb-bench-ingest-", ignore_cleanup_errors=True) as tmp:
+        data_dir = args.corpus or os.path.join(tmp, "data")
+        if args.corpus:
+            results["corpus"] = {"bytes": dir_size(data_dir)}
+        else:
+            results["corpus"] = generate_corpus(data_dir, args.files, args.paragraphs, args.pdf_ratio, args.seed)
+        configure(data_dir, os.path.join(tmp, "index"), args)
+
+        try:
+            with RSSSampler() as sampler:
+                summary, elapsed = run_ingest(embedder, args.verbose)
+                files = summary["added"] + summary["updated"]
+                results["results"]["ingest"] = {
+                    "files": files,
+                    "failed": summary["failed"],
+                    "chunks": summary["chunks"],
+                    "elapsed_s": round(elapsed, 3),
+                    "files_per_s": round(files / elapsed, 1) if elapsed else None,
+                    "chunks_per_s": round(summary["chunks"] / elapsed, 1) if elapsed else None,
+                    "pipeline": summary.get("pipeline"),
+                }
+                print(f"📊 ingest: {files} files / {summary['chunks']} chunks in {elapsed:.2f}s "
+                      f"({results['results']['ingest']['files_per_s']} files/s, "
+                      f"{results['results']['ingest']['chunks_per_s']} chunks/s)")
+
+                # 没有变化的再次同步: 只比对清单, 衡量增量同步的固定开销
+                _, elapsed = run_ingest(embedder, args.verbose)
+                results["results"]["noop_resync_s"] = round(elapsed, 3)
+
+                retrieval = run_retrieval(embedder, queries, args.warmup)
+                results["results"]["retrieval"] = retrieval
+                print(f"📊 retrieval: p50={retrieval['latency_ms']['p50']}ms p95={retrieval['latency_ms']['p95']}ms "
+                      f"p99={retrieval['latency_ms']['p99']}ms ({retrieval['queries_per_s']} q/s)")
+                results["results"]["batch_retrieval"] = run_batch_retrieval(embedder, queries, args.k)
+            results["results"]["peak_rss_mb"] = sampler.memory.peak_rss_mb
+
+            results["results"]["index_bytes"] = {
+                "chroma": dir_size(settings.CHROMA_PERSIST_DIR),
+                "bm25": os.path.getsize(settings.BM25_INDEX_PATH),
+                "manifest": os.path.getsize(settings.INGEST_MANIFEST_PATH),
+            }
+            results["results"]["index_bytes"]["total"] = sum(results["results"]["index_bytes"].values())
+        finally:
+            DBFactory.invalidate()
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+确定性的合成语料: Markdown / TXT / PDF
+
+    python -m benchmarks.corpus --files 300 --output /tmp/corpus
+
+PDF 由本模块直接写出 (Helvetica 文本页, 只含 ASCII), 不依赖额外的 PDF 生成库。
+"""
+import os
+import random
+import argparse
+from typing import Dict, List
+
+TOPICS = {
+    "vpn": "VPN remote access certificate gateway 远程 访问 证书 申请",
+    "expense": "expense reimbursement invoice approval finance 报销 发票 审批 财务",
+    "onboarding": "onboarding laptop account mentor training 入职 账号 培训 导师",
+    "security": "security incident phishing password audit 安全 事件 密码 审计",
+    "release": "release deployment rollback pipeline canary 发布 部署 回滚 流水线",
+    "strategy": "strategy roadmap quarterly revenue market 战略 规划 季度 收入 市场",
+    "leave": "leave vacation holiday policy manager 请假 休假 假期 政策 经理",
+    "procurement": "procurement vendor contract budget purchase 采购 供应商 合同 预算",
+}
+FILLER = (
+    "the team should review the process before the deadline and document every decision "
+    "所有 变更 需要 记录 在 知识库 中 并 通知 相关 负责人 according to the standard operating procedure"
+).split()
+
+
+def _paragraph(rng: random.Random, topic_words: List[str], words: int, ascii_only: bool) -> str:
+    pool = topic_words * 3 + FILLER
+    if ascii_only:
+        pool = [w for w in pool if w.isascii()]
+    return " ".join(rng.choice(pool) for _ in range(words))
+
+def _document(rng: random.Random, topic: str, paragraphs: int, ascii_only: bool = False) -> List[str]:
+    words = TOPICS[topic].split()
+    return [_paragraph(rng, words, rng.randint(40, 120), ascii_only) for _ in range(paragraphs)]
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def write_pdf(path: str, paragraphs: List[str], lines_per_page: int = 45, chars_per_line: int = 90):
+    """写出一个最小但合法的多页 PDF (带 xref 表, pypdf 可以正常解析文本)"""
+    lines = []
+    for paragraph in paragraphs:
+        words, line = paragraph.split(), ""
+        for word in words:
+            if len(line) + len(word) + 1 > chars_per_line:
+                lines.append(line)
+                line = word
+            else:
+                line = f"{line} {word}".strip()
+        lines.extend([line, ""])
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)] or [[""]]
+
+    # 对象编号: 1 catalog, 2 pages, 3 font, 之后每页一个 page 对象 + 一个内容流
+    objects = {1: b"<< /Type /Catalog /Pages 2 0 R >>", 3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"}
+    kids = []
+    for i, page_lines in enumerate(pages):
+        page_id, content_id = 4 + 2 * i, 5 + 2 * i
+        text = "\n".join(f"({_pdf_escape(line)}) Tj T*" for line in page_lines)
+        stream = f"BT /F1 10 Tf 14 TL 50 780 Td\n{text}\nET".encode("latin-1")
+        objects[content_id] = b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream)
+        objects[page_id] = (
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        kids.append(b"%d 0 R" % page_id)
+    objects[2] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(kids), len(pages))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for obj_id in sorted(objects):
+        offsets[obj_id] = len(out)
+        out += b"%d 0 obj\n%s\nendobj\n" % (obj_id, objects[obj_id])
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for obj_id in sorted(objects):
+        out += b"%010d 00000 n \n" % offsets[obj_id]
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, "wb") as f:
+        f.write(out)
+
+def generate_corpus(directory: str, files: int, paragraphs: int = 12, pdf_ratio: float = 0.2, seed: int = 42) -> Dict[str, int]:
+    """
+    在 directory 下生成 files 个文件 (按 md / txt / pdf 轮换, pdf 占比约 pdf_ratio)
+    Returns: {"md": n, "txt": n, "pdf": n, "bytes": total}
+    """
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    counts = {"md": 0, "txt": 0, "pdf": 0, "bytes": 0}
+    topics = sorted(TOPICS)
+    for i in range(files):
+        topic = topics[i % len(topics)]
+        subdir = os.path.join(directory, topic)
+        os.makedirs(subdir, exist_ok=True)
+        if rng.random() < pdf_ratio:
+            kind = "pdf"
+            path = os.path.join(subdir, f"{topic}-{i:05d}.pdf")
+            write_pdf(path, _document(rng, topic, paragraphs, ascii_only=True))
+        else:
+            kind = "md" if i % 2 == 0 else "txt"
+            body = _document(rng, topic, paragraphs)
+            path = os.path.join(subdir, f"{topic}-{i:05d}.{kind}")
+            with open(path, "w", encoding="utf-8") as f:
+                if kind == "md":
+                    f.write(f"# {topic.title()} {i}\n\n" + "\n\n".join(f"## Section {n}\n\n{p}" for n, p in enumerate(body)))
+                else:
+                    f.write("\n\n".join(body))
+        counts[kind] += 1
+        counts["bytes"] += os.path.getsize(path)
+    return counts
+
+def sample_queries(n: int, seed: int = 7) -> List[str]:
+    """从主题词中抽样的查询, 与语料同分布, BM25 与向量分支都能命中"""
+    rng = random.Random(seed)
+    topics = sorted(TOPICS)
+    queries = []
+    for _ in range(n):
+        words = TOPICS[rng.choice(topics)].split()
+        queries.append(" ".join(rng.sample(words, rng.randint(2, 4))))
+    return queries
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic md/txt/pdf corpus")
+    parser.add_argument("--files", type=int, default=300)
+    parser.add_argument("--paragraphs", type=int, default=12, help="paragraphs per file")
+    parser.add_argument("--pdf-ratio", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", required=True, help="directory to write the corpus into")
+    args = parser.parse_args()
+    print(generate_corpus(args.output, args.files, args.paragraphs, args.pdf_ratio, args.seed))
+
+if __name__ == "__main__":
+    main()
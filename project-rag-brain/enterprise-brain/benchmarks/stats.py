@@ -0,0 +1,23 @@
+from typing import Dict, List
+
+def percentile(values: List[float], pct: float) -> float:
+    """最近秩 (nearest-rank) 百分位"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, int(round(pct / 100.0 * len(ordered) + 0.5)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+def summarize(seconds: List[float]) -> Dict[str, float]:
+    """把一组以秒为单位的延迟汇总成毫秒的 p50/p95/p99/mean/max"""
+    if not seconds:
+        return {"count": 0}
+    ms = [s * 1000 for s in seconds]
+    return {
+        "count": len(ms),
+        "mean": round(sum(ms) / len(ms), 3),
+        "p50": round(percentile(ms, 50), 3),
+        "p95": round(percentile(ms, 95), 3),
+        "p99": round(percentile(ms, 99), 3),
+        "max": round(max(ms), 3),
+    }
@@ -1,12 +1,56 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from src.api.routes import chat, upload, stream
+from fastapi.responses import JSONResponse, Response
+from src.api.routes import chat, upload, stream, ingest, retrieve
+from src.config.settings import get_settings
+from src.core.db import DBFactory
+from src.core.hybrid_retriever import get_retrieval_stats
+from src.core.reranker import get_reranker
+from src.core.retrieval_cache import get_retrieval_cache
+from src.core.memory import aclose_checkpointer
+from src.core.kb_interface import aclose_kb_clients
+from src.core.metrics import render_metrics
+from src.core.warmup import start_warmup, get_readiness
 
-app = FastAPI(title="Enterprise Brain API", version="1.0.0")
+settings = get_settings()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 预热 Embedding 模型 / BM25 索引 / Chroma 连接, 避免首个请求承担冷启动开销
+    if settings.WARMUP_ON_STARTUP:
+        start_warmup()
+    yield
+    await aclose_checkpointer()
+    await aclose_kb_clients()
+
+app = FastAPI(title="Enterprise Brain API", version="1.0.0", lifespan=lifespan)
 
 app.include_router(chat.router, prefix="/api/v1", tags=["Chat"])
 app.include_router(stream.router, prefix="/api/v1", tags=["Chat"])
 app.include_router(upload.router, prefix="/api/v1", tags=["Upload"])
+app.include_router(ingest.router, prefix="/api/v1", tags=["Ingest"])
+app.include_router(retrieve.router, prefix="/api/v1", tags=["Retrieve"])
 
 @app.get("/health")
 def health_check():
     return {"status": "ok"}
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus scrape endpoint: 各阶段延迟直方图, 缓存命中/未命中, 入库 chunk 数与错误数"""
+    content, content_type = render_metrics()
+    return Response(content=content, media_type=content_type)
+
+@app.get("/ready")
+def readiness_check():
+    """Readiness probe: 503 until the model, BM25 index and Chroma connection are warm."""
+    readiness = get_readiness()
+    readiness["chroma_pool"] = DBFactory.stats()
+    readiness["retrieval_latency"] = get_retrieval_stats()
+    retrieval_cache = get_retrieval_cache()
+    if retrieval_cache is not None:
+        readiness["retrieval_cache"] = retrieval_cache.stats()
+    reranker = get_reranker()
+    if reranker is not None:
+        readiness["reranker"] = reranker.stats()
+    return JSONResponse(status_code=200 if readiness["ready"] else 503, content=readiness)
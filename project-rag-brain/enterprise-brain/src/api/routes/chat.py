@@ -1,9 +1,11 @@
 from fastapi import APIRouter, HTTPException
 from src.api.schemas import ChatRequest, ChatResponse
-from src.core.agent import build_agent
+from src.core.agent import get_agent
 from src.core.llm import get_embeddings
-from src.core.memory import get_checkpointer
+from src.core.memory import aget_checkpointer
+from src.core.semantic_cache import get_semantic_cache, safe_lookup, safe_store, is_new_thread, record_cached_turn
 from langchain_core.messages import HumanMessage
+import asyncio
 import uuid
 
 router = APIRouter()
@@ -12,18 +14,28 @@ router = APIRouter()
 async def chat(request: ChatRequest):
     try:
         embeddings = get_embeddings()
-        checkpointer = get_checkpointer()
+        checkpointer = await aget_checkpointer()
         
-        # Build agent with memory
-        graph, _ = build_agent(pro_mode=request.pro_mode, embeddings=embeddings, checkpointer=checkpointer)
+        # Prebuilt agent with memory (cached across requests); a rebuild after ingest loads the
+        # BM25 index and connects to Chroma, so it runs in a worker thread instead of the event loop
+        graph, _ = await asyncio.to_thread(get_agent, request.pro_mode, embeddings, checkpointer)
         
         # Setup config with thread_id
         session_id = request.session_id or str(uuid.uuid4())
         config = {"configurable": {"thread_id": session_id}}
         
-        # Invoke the graph
+        # Non-pro mode: answer repeated first-turn questions from the semantic cache
+        cache = None if request.pro_mode else get_semantic_cache()
+        cache_embedding = None
+        if cache is not None and (request.session_id is None or await is_new_thread(graph, config)):
+            hit, cache_embedding = await asyncio.to_thread(safe_lookup, cache, request.message)
+            if hit:
+                await record_cached_turn(graph, config, request.message, hit["response"])
+                return ChatResponse(response=hit["response"], sources=hit["sources"])
+        
+        # Invoke the graph asynchronously (LLM, tools and checkpoint I/O never block the event loop)
         inputs = {"messages": [HumanMessage(content=request.message)]}
-        result = graph.invoke(inputs, config=config)
+        result = await graph.ainvoke(inputs, config=config)
         
         # Extract the last message content
         last_message = result["messages"][-1]
@@ -39,6 +51,9 @@ async def chat(request: ChatRequest):
                     if line.startswith("Source: "):
                         sources.add(line.replace("Source: ", "").strip())
         
+        if cache_embedding is not None:
+            await asyncio.to_thread(safe_store, cache, request.message, cache_embedding, response_text, list(sources))
+        
         return ChatResponse(response=response_text, sources=list(sources))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,19 @@
+from fastapi import APIRouter, HTTPException
+from src.api.schemas import IngestJobResponse
+from src.core.jobs import get_ingest_queue
+
+router = APIRouter()
+
+@router.post("/ingest", response_model=IngestJobResponse)
+def trigger_ingest():
+    """Queue a full sync of the data directory (coalesced with any queued sync)."""
+    job = get_ingest_queue().submit(reason="manual")
+    return IngestJobResponse(**job.to_dict())
+
+@router.get("/ingest/jobs/{job_id}", response_model=IngestJobResponse)
+def get_ingest_job(job_id: str):
+    """Report progress and timings of an ingest job."""
+    job = get_ingest_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Ingest job {job_id} not found")
+    return IngestJobResponse(**job.to_dict())
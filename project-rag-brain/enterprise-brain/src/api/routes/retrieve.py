@@ -0,0 +1,43 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from src.api.schemas import RetrieveBatchRequest
+from src.config.settings import get_settings
+from src.core.kb_interface import get_kb_client
+import json
+
+router = APIRouter()
+settings = get_settings()
+
+async def ndjson_generator(queries, k: int):
+    """
+    按 RETRIEVE_BATCH_CHUNK_SIZE 分批检索, 每批完成后立即输出, 每个查询一行 JSON:
+    {"index": 0, "query": "...", "results": [...]} 或 {"index": 0, "query": "...", "error": "..."}
+    """
+    kb = get_kb_client()
+    chunk_size = max(1, settings.RETRIEVE_BATCH_CHUNK_SIZE)
+    for offset in range(0, len(queries), chunk_size):
+        chunk = queries[offset:offset + chunk_size]
+        try:
+            batches = await kb.aretrieve_batch(chunk, k)
+            lines = [
+                {"index": offset + i, "query": query, "results": results}
+                for i, (query, results) in enumerate(zip(chunk, batches))
+            ]
+        except Exception as e:
+            # 一批失败不影响后续批次, 失败的查询逐条报告错误
+            print(f"❌ Batch retrieval failed for queries {offset}-{offset + len(chunk) - 1}: {e}")
+            lines = [{"index": offset + i, "query": query, "error": str(e)} for i, query in enumerate(chunk)]
+        yield "".join(json.dumps(line, ensure_ascii=False, default=str) + "\n" for line in lines)
+
+@router.post("/retrieve/batch")
+async def retrieve_batch(request: RetrieveBatchRequest):
+    """
+    Retrieve knowledge base chunks for many queries in one call.
+    Streams NDJSON, one line per query, in request order.
+    """
+    if len(request.queries) > settings.RETRIEVE_BATCH_MAX_QUERIES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Too many queries ({len(request.queries)} > {settings.RETRIEVE_BATCH_MAX_QUERIES})",
+        )
+    return StreamingResponse(ndjson_generator(request.queries, request.k), media_type="application/x-ndjson")
@@ -1,11 +1,14 @@
 from fastapi import APIRouter, HTTPException
 from fastapi.responses import StreamingResponse
 from src.api.schemas import ChatRequest
-from src.core.agent import build_agent
+from src.core.agent import get_agent
 from src.core.llm import get_embeddings
-from src.core.memory import get_checkpointer
+from src.core.memory import aget_checkpointer
+from src.core.metrics import observe_latency, record_error
+from src.core.semantic_cache import get_semantic_cache, safe_lookup, safe_store, is_new_thread, record_cached_turn
 from langchain_core.messages import HumanMessage
 import json
+import time
 import asyncio
 import uuid
 
@@ -16,27 +19,59 @@ async def event_generator(message: str, pro_mode: bool, session_id: str = None):
     Generator function for SSE.
     Yields JSON strings formatted as SSE events.
     """
+    started = time.perf_counter()
+    first_token_at = None
     try:
         embeddings = get_embeddings()
-        checkpointer = get_checkpointer()
+        checkpointer = await aget_checkpointer()
         
-        graph, _ = build_agent(pro_mode=pro_mode, embeddings=embeddings, checkpointer=checkpointer)
+        # 入库后的重建会加载 BM25 索引并连接 Chroma, 放到线程中执行, 不阻塞其它请求
+        graph, _ = await asyncio.to_thread(get_agent, pro_mode, embeddings, checkpointer)
+        observe_latency("stream_setup", time.perf_counter() - started)
         
         # Setup config
         thread_id = session_id or str(uuid.uuid4())
         config = {"configurable": {"thread_id": thread_id}}
         
+        # Non-pro mode: answer repeated first-turn questions from the semantic cache
+        cache = None if pro_mode else get_semantic_cache()
+        cache_embedding = None
+        if cache is not None and (session_id is None or await is_new_thread(graph, config)):
+            hit, cache_embedding = await asyncio.to_thread(safe_lookup, cache, message)
+            if hit:
+                await record_cached_turn(graph, config, message, hit["response"])
+                observe_latency("stream_first_token", time.perf_counter() - started)
+                yield f"data: {json.dumps({'token': hit['response']})}\n\n"
+                for source_name in hit["sources"]:
+                    yield f"data: {json.dumps({'source': source_name})}\n\n"
+                yield "data: [DONE]\n\n"
+                return
+        
         inputs = {"messages": [HumanMessage(content=message)]}
+        answer_tokens = []  # tokens of the latest LLM call = the final answer
+        sources = []
         
         # Use astream_events to get granular token-by-token updates
         # version="v2" is standard for newer LangChain versions
         async for event in graph.astream_events(inputs, config=config, version="v2"):
             kind = event["event"]
             
+            # 对话摘要是 pre_model_hook 内部的 LLM 调用, 不属于回答
+            if event.get("metadata", {}).get("langgraph_node") == "pre_model_hook":
+                continue
+            
+            if kind == "on_chat_model_start":
+                answer_tokens = []
+            
             # Filter for LLM streaming events to get tokens
-            if kind == "on_chat_model_stream":
+            elif kind == "on_chat_model_stream":
                 content = event["data"]["chunk"].content
                 if content:
+                    if first_token_at is None:
+                        # 用户感知的首 token 延迟: 包含检索、工具调用和之前的 LLM 轮次
+                        first_token_at = time.perf_counter()
+                        observe_latency("stream_first_token", first_token_at - started)
+                    answer_tokens.append(content)
                     # Construct a JSON data payload
                     payload = json.dumps({"token": content})
                     yield f"data: {payload}\n\n"
@@ -57,12 +92,18 @@ async def event_generator(message: str, pro_mode: bool, session_id: str = None):
                     for line in lines:
                         if line.startswith("Source: "):
                             source_name = line.replace("Source: ", "").strip()
+                            sources.append(source_name)
                             payload = json.dumps({"source": source_name})
                             yield f"data: {payload}\n\n"
                 
+        if cache_embedding is not None:
+            await asyncio.to_thread(safe_store, cache, message, cache_embedding, "".join(answer_tokens), sorted(set(sources)))
+        
+        observe_latency("stream_total", time.perf_counter() - started)
         yield "data: [DONE]\n\n"
         
     except Exception as e:
+        record_error("stream")
         error_payload = json.dumps({"error": str(e)})
         yield f"data: {error_payload}\n\n"
 
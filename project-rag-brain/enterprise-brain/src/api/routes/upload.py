@@ -1,10 +1,10 @@
-from fastapi import APIRouter, UploadFile, File, BackgroundTasks, HTTPException
+from fastapi import APIRouter, UploadFile, File, HTTPException
 import shutil
 import os
 import glob
 from typing import List
 from src.config.settings import get_settings
-from src.core.ingest import ingest_docs
+from src.core.jobs import get_ingest_queue
 from src.api.schemas import UploadResponse
 
 router = APIRouter()
@@ -27,7 +27,7 @@ def list_files():
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/upload", response_model=UploadResponse)
-async def upload_file(background_tasks: BackgroundTasks, file: UploadFile = File(...)):
+async def upload_file(file: UploadFile = File(...)):
     try:
         # Ensure data directory exists
         os.makedirs(settings.DATA_DIR, exist_ok=True)
@@ -37,9 +37,9 @@ async def upload_file(background_tasks: BackgroundTasks, file: UploadFile = File
         with open(file_location, "wb") as buffer:
             shutil.copyfileobj(file.file, buffer)
             
-        # Trigger ingestion in background
-        background_tasks.add_task(ingest_docs)
+        # Queue ingestion (bursts of uploads are coalesced into one sync)
+        job = get_ingest_queue().submit(reason=f"upload:{file.filename}")
         
-        return UploadResponse(filename=file.filename, status="File uploaded and ingestion triggered")
+        return UploadResponse(filename=file.filename, status="File uploaded and ingestion triggered", job_id=job.id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Optional
 
 class ChatRequest(BaseModel):
     message: str
@@ -13,3 +13,23 @@ class ChatResponse(BaseModel):
 class UploadResponse(BaseModel):
     filename: str
     status: str
+    job_id: Optional[str] = None
+
+class IngestJobResponse(BaseModel):
+    job_id: str
+    status: str
+    triggers: int
+    reasons: List[str]
+    message: str
+    log: List[str]
+    queued_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    wait_seconds: float
+    run_seconds: Optional[float] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+class RetrieveBatchRequest(BaseModel):
+    queries: List[str] = Field(..., min_length=1)
+    k: int = Field(5, ge=1, le=50)
@@ -18,21 +18,123 @@ class Settings(BaseSettings):
     CHROMA_SERVER_PORT: int = 8000
     COLLECTION_NAME: str = "enterprise_knowledge"
     CACHE_COLLECTION_NAME: str = "llm_cache"
+    CHROMA_KEEPALIVE_SECONDS: float = 40.0
+    CHROMA_MAX_CONNECTIONS: int = 20
+    CHROMA_HEALTHCHECK_SECONDS: float = 30.0  # heartbeat 间隔, 失败则重连
+    # "http": 连接 Chroma Server; "persistent": 进程内 Chroma, 数据存放在 INDEX_DIR/chroma (本地开发 / 基准测试)
+    CHROMA_MODE: str = "http"
 
     # RAG Engine Config (Local vs RAGFlow)
     RAG_ENGINE: str = "local"  # Options: "local", "ragflow"
     RAGFLOW_BASE_URL: str = "http://localhost:9380"
     RAGFLOW_API_KEY: str = "ragflow-x-api-key"
+    RAGFLOW_CONNECT_TIMEOUT: float = 2.0
+    RAGFLOW_READ_TIMEOUT: float = 5.0
+    RAGFLOW_MAX_CONNECTIONS: int = 20      # keep-alive 连接池大小
+    RAGFLOW_MAX_RETRIES: int = 2           # 连接错误 / 超时 / 429 / 5xx 的重试次数 (带抖动的指数退避)
+    RAGFLOW_BREAKER_THRESHOLD: int = 5     # 连续失败多少次后熔断
+    RAGFLOW_BREAKER_RESET_SECONDS: float = 30.0
+    RAGFLOW_HEALTH_TTL_SECONDS: float = 30.0
     
     # Embedding Model
     EMBEDDING_MODEL: str = "all-MiniLM-L6-v2"
     HF_ENDPOINT: str = "https://hf-mirror.com"  # For China access
+    # 推理后端: "torch" (默认) / "onnx" (ONNX Runtime) / "onnx-int8" (int8 量化的 ONNX 模型)
+    # onnx 后端需要额外安装: pip install "sentence-transformers[onnx]"
+    EMBEDDING_BACKEND: str = "torch"
+    EMBEDDING_ONNX_INT8_FILE: str = "onnx/model_quint8_avx2.onnx"  # 模型仓库中的量化文件
+    # 按 (模型, chunk 文本哈希) 缓存向量, 文件改动后未变化的 chunk 无需重新推理
+    EMBEDDING_CACHE_ENABLED: bool = True
+
+    # BM25 索引数据来源: "chunks" 复用 ingest 写入 Chroma 的 chunk (PDF 只解析一次, 与向量检索 ID 一致);
+    # "files" 重新解析 DATA_DIR
+    LEXICAL_INDEX_SOURCE: str = "chunks"
+
+    # Hybrid Retrieval (BM25 + 向量并行检索, RRF 融合)
+    RETRIEVAL_TOP_K: int = 3            # 融合后返回给 LLM 的 chunk 数
+    RETRIEVAL_CANDIDATE_K: int = 20     # 每个分支的候选数 (多取再融合)
+    RETRIEVAL_RRF_K: int = 60
+    RETRIEVAL_LEXICAL_WEIGHT: float = 0.4
+    RETRIEVAL_VECTOR_WEIGHT: float = 0.6
+
+    # Batch Retrieval API (/api/v1/retrieve/batch)
+    RETRIEVE_BATCH_MAX_QUERIES: int = 5000
+    RETRIEVE_BATCH_CHUNK_SIZE: int = 64    # 每次批量 embedding + Chroma 多查询的查询数, 完成一批就流式返回一批
+
+    # Retrieval Cache (查询 -> 排序后的 chunk, LRU + TTL; 键中包含索引代数, 入库后自动失效)
+    RETRIEVAL_CACHE_ENABLED: bool = True
+    RETRIEVAL_CACHE_MAX_ENTRIES: int = 1000
+    RETRIEVAL_CACHE_TTL_SECONDS: float = 300.0
+
+    # Rerank (可选): 用 CPU 上的 cross-encoder 对融合后的前 N 个候选重新打分
+    RERANK_ENABLED: bool = False
+    RERANK_MODEL: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    RERANK_CANDIDATES: int = 20         # 参与重排的融合候选数
+    RERANK_BUDGET_MS: float = 300.0     # 超过预算则放弃重排, 直接使用融合顺序
+
+    # Context Packing: knowledge_base 工具输出去重、合并重叠 chunk, 并裁剪到 token 预算内
+    CONTEXT_TOKEN_BUDGET: int = 2000    # 0 表示不裁剪 (仍然去重与合并)
+
+    # Ingest: 并行解析文档的进程数, 0 表示使用全部 CPU 核
+    INGEST_PARSE_WORKERS: int = 0
+    # Ingest 流水线: 嵌入第 N+1 批的同时写入第 N 批; 队列有界, 写入跟不上时嵌入会等待 (back-pressure)
+    INGEST_EMBED_BATCH_SIZE: int = 64
+    INGEST_WRITE_BATCH_SIZE: int = 256
+    INGEST_PIPELINE_QUEUE_SIZE: int = 4    # 已嵌入、等待写入的批次数上限
+    # Ingest 内存软上限 (MB, 按进程 RSS); 超过后暂停读取新文件直到流水线排空, 0 表示不限制
+    # 仅为建议值: BM25 索引整体驻留内存, 排空后仍超限时只告警并在入库结果中报告 memory_limit_exceeded
+    INGEST_MEMORY_LIMIT_MB: int = 0
+    # 入库任务合并窗口: 窗口内的多次上传只触发一次同步
+    INGEST_DEBOUNCE_SECONDS: float = 2.0
+
+    # Semantic Cache (非 Pro 模式的回答缓存, 存于 CACHE_COLLECTION_NAME)
+    SEMANTIC_CACHE_ENABLED: bool = True
+    SEMANTIC_CACHE_THRESHOLD: float = 0.95  # cosine 相似度阈值
+    SEMANTIC_CACHE_TTL_SECONDS: int = 86400
+    SEMANTIC_CACHE_MAX_ENTRIES: int = 5000
+
+    # Startup Warmup (加载模型 / BM25 / Chroma 连接, 完成后 /ready 返回 200)
+    WARMUP_ON_STARTUP: bool = True
+    WARMUP_RETRY_SECONDS: float = 5.0
+
+    # Conversation Memory (每轮发给 LLM 的上下文窗口)
+    MEMORY_WINDOW_TURNS: int = 6           # 原样保留最近 N 轮对话, 0 表示发送完整历史
+    MEMORY_TOOL_OUTPUT_CHARS: int = 600    # 当前轮之前的工具输出截断到此长度
+    MEMORY_SUMMARY_ENABLED: bool = True    # 窗口之外的旧对话压缩成滚动摘要 (关闭则直接丢弃)
+    MEMORY_SUMMARY_MAX_CHARS: int = 1500
+
+    # Conversation Checkpointer (SQLite, WAL 模式)
+    # 异步 checkpointer 的连接数: 1 个写连接 (批量提交) + N-1 个按 thread_id 分片的读连接
+    # benchmarks/bench_checkpointer.py (64 会话): 读连接越多写 p95 越低, 但读 p95 反而升高, 吞吐量持平
+    CHECKPOINT_POOL_SIZE: int = 1
+    # 一次 group commit 最多合并的写入数
+    CHECKPOINT_WRITE_BATCH: int = 64
+    # 写锁被占用时等待的毫秒数, 超时前不会抛出 "database is locked"
+    CHECKPOINT_BUSY_TIMEOUT_MS: int = 5000
 
     # Paths
     # 获取当前文件(src/config/settings.py)的上两级目录作为 src 根
     # 再上一级作为项目根
     BASE_DIR: str = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
     DATA_DIR: str = os.path.join(BASE_DIR, "data")
+    # 本地索引状态 (BM25 倒排索引等), Docker 部署时需挂载持久化
+    INDEX_DIR: str = os.path.join(BASE_DIR, "index")
+
+    @property
+    def BM25_INDEX_PATH(self) -> str:
+        return os.path.join(self.INDEX_DIR, "bm25_index.pkl")
+
+    @property
+    def INGEST_MANIFEST_PATH(self) -> str:
+        return os.path.join(self.INDEX_DIR, "ingest_manifest.db")
+
+    @property
+    def EMBEDDING_CACHE_DIR(self) -> str:
+        return os.path.join(self.INDEX_DIR, "embedding_cache")
+
+    @property
+    def CHROMA_PERSIST_DIR(self) -> str:
+        return os.path.join(self.INDEX_DIR, "chroma")
 
     class Config:
         env_file = ".env"
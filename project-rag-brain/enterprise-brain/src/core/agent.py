@@ -1,19 +1,35 @@
+import threading
 from langgraph.prebuilt import create_react_agent
 from langchain_core.tools.retriever import create_retriever_tool
 
+from src.config.settings import get_settings
 from src.core.llm import get_llm
+from src.core.conversation import ConversationState, get_memory_hook
 from src.core.db import DBFactory
-from src.core.retriever import get_retriever
+from src.core.retriever import get_retriever, get_index_generation
+from src.core.metrics import stage_metrics_handler
 from src.core.tools.retrieval import get_retrieval_tool
 from src.tools.search import get_search_tool
 from src.tools.python import get_python_tool
 from src.tools.files import get_file_tools
 
+def _with_metrics(runnable):
+    """挂上耗时统计回调 (LLM 首 token / 完整耗时, 工具执行耗时), 不覆盖已有的回调"""
+    callbacks = runnable.callbacks
+    if callbacks is None:
+        runnable.callbacks = [stage_metrics_handler]
+    elif isinstance(callbacks, list):
+        if stage_metrics_handler not in callbacks:
+            runnable.callbacks = callbacks + [stage_metrics_handler]
+    elif stage_metrics_handler not in callbacks.handlers:
+        callbacks.add_handler(stage_metrics_handler, inherit=False)
+    return runnable
+
 def build_agent(pro_mode: bool, embeddings, checkpointer=None):
     """
     构建 LangGraph ReAct Agent
     """
-    llm = get_llm()
+    llm = _with_metrics(get_llm())
     # 使用混合检索器 (BM25 + Vector)
     retriever = get_retriever(embeddings)
     
@@ -36,6 +52,47 @@ def build_agent(pro_mode: bool, embeddings, checkpointer=None):
     你不仅能回答问题，还能编写代码、分析数据、管理文件、联网搜索。
     """
 
-    # 3. 构建图 (传入 checkpointer 以支持记忆)
-    graph = create_react_agent(llm, tools, checkpointer=checkpointer)
+    tools = [_with_metrics(tool) for tool in tools]
+
+    # 3. 构建图 (传入 checkpointer 以支持记忆; pre_model_hook 把发给 LLM 的历史限制在窗口 + 摘要内)
+    graph = create_react_agent(
+        llm,
+        tools,
+        checkpointer=checkpointer,
+        state_schema=ConversationState,
+        pre_model_hook=get_memory_hook(llm),
+    )
     return graph, system_prompt
+
+# (pro_mode, engine, (index generation, Chroma connection generation), checkpointer id) -> (graph, system_prompt)
+_agent_registry = {}
+_registry_lock = threading.Lock()
+
+def get_agent(pro_mode: bool, embeddings, checkpointer=None):
+    """
+    返回预构建的 Agent, 避免每个请求都重建 LLM / 检索器 / 工具 / 图。
+    入库完成 (bump_index_generation) 或 Chroma 重连 (DBFactory.invalidate) 后自动重建,
+    不会继续使用已丢弃连接上的 VectorStore。
+    """
+    generation = (get_index_generation(), DBFactory.generation())
+    key = (pro_mode, get_settings().RAG_ENGINE, generation, id(checkpointer))
+
+    agent = _agent_registry.get(key)
+    if agent is not None:
+        return agent
+
+    with _registry_lock:
+        agent = _agent_registry.get(key)
+        if agent is None:
+            # 旧代或绑定旧 checkpointer (事件循环变化后 aget_checkpointer() 会新建) 的 Agent
+            # 永远不会再被命中, 顺手清理, 同时释放它们持有的 checkpointer 连接
+            for stale_key in [k for k in _agent_registry if k[2] != generation or k[3] != id(checkpointer)]:
+                del _agent_registry[stale_key]
+            agent = build_agent(pro_mode, embeddings, checkpointer=checkpointer)
+            _agent_registry[key] = agent
+    return agent
+
+def invalidate_agents():
+    """清空 Agent 注册表, 下一个请求重新构建"""
+    with _registry_lock:
+        _agent_registry.clear()
@@ -0,0 +1,57 @@
+from typing import List
+from langchain_core.documents import Document
+from src.config.settings import get_settings
+from src.core.db import DBFactory
+from src.core.hybrid_retriever import rrf_fuse
+from src.core.retriever import warm_bm25_cache
+
+settings = get_settings()
+
+def embed_queries(embeddings, queries: List[str]) -> List[List[float]]:
+    """
+    一次前向计算编码所有查询
+    HuggingFaceEmbeddings 未配置 query_encode_kwargs 时, embed_query 与 embed_documents 的编码方式相同;
+    配置了查询专用参数 (如 e5 的 query 前缀) 时退回逐条 embed_query, 保证与单条检索一致
+    """
+    if getattr(embeddings, "query_encode_kwargs", None):
+        return [embeddings.embed_query(q) for q in queries]
+    return embeddings.embed_documents(queries)
+
+def vector_search_batch(embeddings, queries: List[str], k: int) -> List[List[Document]]:
+    """一次 Chroma 请求完成所有查询的向量检索"""
+    result = DBFactory.get_collection().query(
+        query_embeddings=embed_queries(embeddings, queries),
+        n_results=k,
+        include=["documents", "metadatas", "distances"],
+    )
+    batches = []
+    for ids, texts, metadatas, distances in zip(result["ids"], result["documents"], result["metadatas"], result["distances"]):
+        batches.append([
+            Document(id=chunk_id, page_content=text or "", metadata={**(meta or {}), "distance": distance})
+            for chunk_id, text, meta, distance in zip(ids, texts, metadatas, distances)
+        ])
+    return batches
+
+def lexical_search_batch(queries: List[str], k: int) -> List[List[Document]]:
+    bm25 = warm_bm25_cache()
+    if bm25 is None:
+        return [[] for _ in queries]
+    index = bm25.index
+    return [[index.get_document(chunk_id) for chunk_id, _ in hits] for hits in index.search_batch(queries, k)]
+
+def hybrid_search_batch(embeddings, queries: List[str], k: int) -> List[List[Document]]:
+    """与 HybridRetriever 相同的 RRF 融合, 只是两个分支都按批执行"""
+    candidate_k = max(k, settings.RETRIEVAL_CANDIDATE_K)
+    vector = vector_search_batch(embeddings, queries, candidate_k)
+    lexical = lexical_search_batch(queries, candidate_k)
+    return [
+        rrf_fuse(
+            [
+                ("lexical", settings.RETRIEVAL_LEXICAL_WEIGHT, lexical_docs),
+                ("vector", settings.RETRIEVAL_VECTOR_WEIGHT, vector_docs),
+            ],
+            k=k,
+            rrf_k=settings.RETRIEVAL_RRF_K,
+        )
+        for lexical_docs, vector_docs in zip(lexical, vector)
+    ]
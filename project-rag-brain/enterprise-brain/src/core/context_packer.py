@@ -0,0 +1,149 @@
+import re
+import math
+import hashlib
+from typing import List, Optional, Tuple
+from langchain_core.documents import Document
+from src.config.settings import get_settings
+
+settings = get_settings()
+
+_CJK = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]")
+# ingest 的 chunk ID 为 "<source>-<hash>-<seq>", BM25 files 模式为 "<source>:<seq>"
+_SEQ = re.compile(r"[-:](\d+)$")
+# 少于这么多字符的首尾重合视为巧合, 不做拼接
+MIN_OVERLAP_CHARS = 20
+# 预算剩余不足这么多 token 时, 不再截断塞入下一段
+MIN_PARTIAL_TOKENS = 50
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估计 token 数: 中日韩字符按 1 个 token, 其余按 4 个字符 1 个 token"""
+    cjk = len(_CJK.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+def _source(doc: Document) -> str:
+    return doc.metadata.get("source") or doc.metadata.get("filename") or ""
+
+def _chunk_key(doc: Document) -> str:
+    chunk_id = doc.metadata.get("chunk_id") or doc.id
+    if chunk_id:
+        return chunk_id
+    return f"{_source(doc)}#{hashlib.md5(doc.page_content.encode('utf-8')).hexdigest()}"
+
+def _seq(doc: Document) -> Optional[int]:
+    match = _SEQ.search(doc.metadata.get("chunk_id") or doc.id or "")
+    return int(match.group(1)) if match else None
+
+def _overlap(left: str, right: str) -> int:
+    """left 的后缀与 right 的前缀最长重合的字符数 (chunk_overlap 产生的重复部分)"""
+    for size in range(min(len(left), len(right)), MIN_OVERLAP_CHARS - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+def _join(left: str, right: str, adjacent: bool) -> Optional[str]:
+    """拼接同一文件中的两段文本; 既不重合也不相邻时返回 None"""
+    if right in left:
+        return left
+    size = _overlap(left, right)
+    if size:
+        return left + right[size:]
+    if adjacent:
+        return f"{left} {right}"
+    return None
+
+
+class _Block:
+    """同一来源中连续的一段文本, rank 取其中排名最靠前的 chunk"""
+
+    def __init__(self, doc: Document, rank: int):
+        self.doc = doc
+        self.rank = rank
+        self.seq = _seq(doc)
+        self.last_seq = self.seq
+        self.text = doc.page_content
+        self.chunk_ids = [_chunk_key(doc)]
+
+    def absorb(self, other: "_Block") -> bool:
+        adjacent = False
+        if self.last_seq is not None and other.seq is not None:
+            if other.seq - self.last_seq > 1:
+                return False
+            adjacent = other.seq - self.last_seq == 1
+        joined = _join(self.text, other.text, adjacent)
+        if joined is None:
+            return False
+        self.text = joined
+        self.rank = min(self.rank, other.rank)
+        self.last_seq = other.last_seq if other.last_seq is not None else self.last_seq
+        self.chunk_ids.extend(other.chunk_ids)
+        return True
+
+    def to_document(self, text: str = None) -> Document:
+        metadata = {**self.doc.metadata, "merged_chunk_ids": list(self.chunk_ids)}
+        return Document(id=self.doc.id, page_content=text if text is not None else self.text, metadata=metadata)
+
+
+def merge_chunks(docs: List[Document]) -> List[Tuple[int, Document]]:
+    """
+    按 chunk ID 去重, 并把同一来源中相邻或重叠的 chunk 合并成一段
+    Returns: [(rank, doc)], rank 为合并段中最靠前的检索名次
+    """
+    seen = set()
+    by_source = {}
+    for rank, doc in enumerate(docs):
+        key = _chunk_key(doc)
+        if key in seen:
+            continue
+        seen.add(key)
+        by_source.setdefault(_source(doc), []).append(_Block(doc, rank))
+
+    merged = []
+    for blocks in by_source.values():
+        # 按文件内顺序排列; 没有序号的 chunk 保持检索顺序
+        blocks.sort(key=lambda b: (b.seq is None, b.seq if b.seq is not None else b.rank))
+        current = blocks[0]
+        for block in blocks[1:]:
+            if not current.absorb(block):
+                merged.append(current)
+                current = block
+        merged.append(current)
+    merged.sort(key=lambda b: b.rank)
+    return [(block.rank, block.to_document()) for block in merged]
+
+def _truncate_to_tokens(text: str, budget: int) -> str:
+    if estimate_tokens(text) <= budget:
+        return text
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if estimate_tokens(text[:mid]) + 1 <= budget:
+            low = mid
+        else:
+            high = mid - 1
+    return text[:low] + "…"
+
+def pack_context(docs: List[Document], budget: int = None, header=lambda doc: "") -> List[Document]:
+    """
+    Context packing: 去重 -> 合并相邻/重叠 chunk -> 按检索分数顺序装入 token 预算
+    docs 的顺序即检索打分顺序 (rerank_score / rrf_score 降序);
+    header(doc) 是每段输出前缀 (如 "Source: ..."), 一并计入预算
+    """
+    budget = settings.CONTEXT_TOKEN_BUDGET if budget is None else budget
+    packed, used = [], 0
+    for _, doc in merge_chunks(docs):
+        cost = estimate_tokens(header(doc)) + estimate_tokens(doc.page_content)
+        if not budget or used + cost <= budget:
+            packed.append(doc)
+            used += cost
+            continue
+        remaining = budget - used - estimate_tokens(header(doc))
+        # 第一段总是保留 (截断), 之后只在剩余预算足够时截断塞入
+        if not packed or remaining >= MIN_PARTIAL_TOKENS:
+            packed.append(Document(
+                id=doc.id,
+                page_content=_truncate_to_tokens(doc.page_content, max(remaining, 0)),
+                metadata={**doc.metadata, "truncated": True},
+            ))
+        break
+    return packed
@@ -0,0 +1,137 @@
+from typing import List, Optional
+from typing_extensions import NotRequired
+from langchain_core.messages import AIMessage, AnyMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.runnables import RunnableLambda
+from langgraph.prebuilt.chat_agent_executor import AgentState
+from src.config.settings import get_settings
+
+settings = get_settings()
+
+SUMMARY_PROMPT = """你负责维护一段对话的滚动摘要。请把“已有摘要”与“新增对话”合并成一份新的摘要:
+- 保留用户的目标、关键事实、结论、引用过的文档名称和尚未解决的问题
+- 省略寒暄和工具返回的原文细节
+- 使用中文, 不超过 {max_chars} 个字符, 只输出摘要本身
+
+已有摘要:
+{summary}
+
+新增对话:
+{transcript}"""
+
+
+class ConversationState(AgentState):
+    """Agent 状态 + 滚动摘要 (随 checkpointer 持久化)"""
+    summary: NotRequired[str]
+    summarized_count: NotRequired[int]  # messages[:summarized_count] 已经合并进 summary
+
+
+def turn_starts(messages: List[AnyMessage]) -> List[int]:
+    """每一轮对话从一条用户消息开始, 返回这些消息的下标"""
+    return [i for i, m in enumerate(messages) if isinstance(m, HumanMessage)]
+
+def window_start(messages: List[AnyMessage], turns: int) -> int:
+    """最近 turns 轮对话的起始下标; 从轮次边界切分, 工具调用与其结果不会被拆开"""
+    starts = turn_starts(messages)
+    if turns <= 0 or len(starts) <= turns:
+        return 0
+    return starts[-turns]
+
+def _truncate(text: str, max_chars: int) -> str:
+    if len(text) <= max_chars:
+        return text
+    return f"{text[:max_chars]}... [truncated {len(text) - max_chars} chars]"
+
+def compact_tool_outputs(messages: List[AnyMessage], max_chars: int) -> List[AnyMessage]:
+    """截断当前轮之前的工具输出; 当前轮 (最后一条用户消息之后) 的工具输出原样保留"""
+    starts = turn_starts(messages)
+    current = starts[-1] if starts else 0
+    compacted = []
+    for i, message in enumerate(messages):
+        if i < current and isinstance(message, ToolMessage) and isinstance(message.content, str) \
+                and len(message.content) > max_chars:
+            message = message.model_copy(update={"content": _truncate(message.content, max_chars)})
+        compacted.append(message)
+    return compacted
+
+def format_transcript(messages: List[AnyMessage], tool_chars: int) -> str:
+    lines = []
+    for message in messages:
+        content = message.content if isinstance(message.content, str) else str(message.content)
+        if isinstance(message, HumanMessage):
+            lines.append(f"用户: {content}")
+        elif isinstance(message, ToolMessage):
+            lines.append(f"工具 {message.name}: {_truncate(content, tool_chars)}")
+        elif isinstance(message, AIMessage):
+            if content:
+                lines.append(f"助手: {content}")
+            for call in message.tool_calls:
+                lines.append(f"助手调用工具 {call['name']}: {call['args']}")
+    return "\n".join(lines)
+
+
+class ConversationMemory:
+    """
+    Agent 的 pre_model_hook: 控制每次调用 LLM 时的上下文
+    - 最近 MEMORY_WINDOW_TURNS 轮原样保留 (之前轮次的工具输出会被截断)
+    - 更早的对话增量合并进滚动摘要, 作为一条系统消息放在窗口前面
+    完整历史仍保存在 checkpointer 中, 只是不再全部发送给 LLM。
+    """
+
+    def __init__(self, llm=None, window_turns: int = None, tool_output_chars: int = None,
+                 summarize: bool = None, summary_max_chars: int = None):
+        self.llm = llm
+        self.window_turns = settings.MEMORY_WINDOW_TURNS if window_turns is None else window_turns
+        self.tool_output_chars = settings.MEMORY_TOOL_OUTPUT_CHARS if tool_output_chars is None else tool_output_chars
+        self.summarize = (settings.MEMORY_SUMMARY_ENABLED if summarize is None else summarize) and llm is not None
+        self.summary_max_chars = settings.MEMORY_SUMMARY_MAX_CHARS if summary_max_chars is None else summary_max_chars
+
+    def _plan(self, state):
+        messages = state["messages"]
+        start = window_start(messages, self.window_turns)
+        done = state.get("summarized_count") or 0
+        pending = messages[done:start] if self.summarize and start > done else []
+        return messages, start, pending
+
+    def _summary_prompt(self, summary: str, pending: List[AnyMessage]) -> str:
+        return SUMMARY_PROMPT.format(
+            max_chars=self.summary_max_chars,
+            summary=summary or "(无)",
+            transcript=format_transcript(pending, self.tool_output_chars),
+        )
+
+    def _result(self, messages, start, summary: str, update: dict) -> dict:
+        window = compact_tool_outputs(messages[start:], self.tool_output_chars)
+        if summary:
+            window = [SystemMessage(content=f"以下是本次对话更早内容的摘要:\n{summary}")] + window
+        return {**update, "llm_input_messages": window}
+
+    def __call__(self, state) -> dict:
+        messages, start, pending = self._plan(state)
+        summary, update = state.get("summary") or "", {}
+        if pending:
+            try:
+                summary = self.llm.invoke(self._summary_prompt(summary, pending)).content.strip()
+                update = {"summary": summary, "summarized_count": start}
+            except Exception as e:
+                # 摘要失败不影响回答: 本轮沿用旧摘要, 下一轮重试
+                print(f"⚠️ Conversation summary failed: {e}")
+        return self._result(messages, start, summary, update)
+
+    async def acall(self, state) -> dict:
+        messages, start, pending = self._plan(state)
+        summary, update = state.get("summary") or "", {}
+        if pending:
+            try:
+                summary = (await self.llm.ainvoke(self._summary_prompt(summary, pending))).content.strip()
+                update = {"summary": summary, "summarized_count": start}
+            except Exception as e:
+                print(f"⚠️ Conversation summary failed: {e}")
+        return self._result(messages, start, summary, update)
+
+
+def get_memory_hook(llm) -> Optional[RunnableLambda]:
+    """返回 create_react_agent 的 pre_model_hook; MEMORY_WINDOW_TURNS=0 时不裁剪历史"""
+    if settings.MEMORY_WINDOW_TURNS <= 0:
+        return None
+    memory = ConversationMemory(llm)
+    return RunnableLambda(memory, afunc=memory.acall, name="conversation_memory")
@@ -1,31 +1,168 @@
+import threading
+import time
 import chromadb
+import httpx
+from chromadb.config import Settings as ChromaSettings
 from langchain_chroma import Chroma
 from src.config.settings import get_settings
 
 settings = get_settings()
 
+def is_connection_error(error: BaseException) -> bool:
+    """连接 / 传输层错误 (含被包装过的); 模型、参数等其它错误重连也无济于事"""
+    while error is not None:
+        if isinstance(error, (httpx.TransportError, ConnectionError)):
+            return True
+        if isinstance(error, ValueError) and "Could not connect to a Chroma server" in str(error):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
 class DBFactory:
-    @staticmethod
-    def get_client():
-        return chromadb.HttpClient(
-            host=settings.CHROMA_SERVER_HOST,
-            port=settings.CHROMA_SERVER_PORT
-        )
+    """
+    进程级共享的 ChromaDB 连接池
+    - HttpClient 长连接复用 (keep-alive), 避免每次检索/入库都重新握手
+    - 定期 heartbeat 健康检查, 失败后自动重连
+    - 缓存 Collection / VectorStore 句柄, 省去重复的 collection 查找
+    - 每次丢弃连接时递增 generation, 持有旧 VectorStore 的对象 (如缓存的 Agent) 据此重建
+    """
+    _lock = threading.RLock()
+    _client = None
+    _last_health_check = 0.0
+    _generation = 0
+    _collections = {}     # collection name -> Collection
+    _vector_stores = {}   # (collection name, id(embeddings)) -> Chroma
+    _stats = {
+        "clients_created": 0,
+        "client_reuses": 0,
+        "reconnects": 0,
+        "health_checks": 0,
+        "health_failures": 0,
+    }
 
-    @staticmethod
-    def get_vector_store(embeddings):
-        client = DBFactory.get_client()
-        return Chroma(
-            client=client,
-            collection_name=settings.COLLECTION_NAME,
-            embedding_function=embeddings,
-        )
+    @classmethod
+    def _create_client(cls):
+        if settings.CHROMA_MODE == "persistent":
+            client = chromadb.PersistentClient(
+                path=settings.CHROMA_PERSIST_DIR,
+                settings=ChromaSettings(anonymized_telemetry=False),
+            )
+        else:
+            client = chromadb.HttpClient(
+                host=settings.CHROMA_SERVER_HOST,
+                port=settings.CHROMA_SERVER_PORT,
+                settings=ChromaSettings(
+                    chroma_http_keepalive_secs=settings.CHROMA_KEEPALIVE_SECONDS,
+                    chroma_http_max_connections=settings.CHROMA_MAX_CONNECTIONS,
+                    anonymized_telemetry=False,
+                ),
+            )
+        cls._stats["clients_created"] += 1
+        cls._last_health_check = time.monotonic()
+        return client
+
+    @classmethod
+    def _is_healthy(cls) -> bool:
+        """距上次检查超过 CHROMA_HEALTHCHECK_SECONDS 才发 heartbeat, 其余时间视为健康"""
+        if time.monotonic() - cls._last_health_check < settings.CHROMA_HEALTHCHECK_SECONDS:
+            return True
+        cls._stats["health_checks"] += 1
+        try:
+            cls._client.heartbeat()
+            cls._last_health_check = time.monotonic()
+            return True
+        except Exception as e:
+            cls._stats["health_failures"] += 1
+            print(f"⚠️ ChromaDB health check failed, reconnecting: {e}")
+            return False
+
+    @classmethod
+    def get_client(cls):
+        with cls._lock:
+            if cls._client is not None and cls._is_healthy():
+                cls._stats["client_reuses"] += 1
+                return cls._client
+            if cls._client is not None:
+                cls._stats["reconnects"] += 1
+                cls._drop_handles()
+            cls._client = cls._create_client()
+            return cls._client
+
+    @classmethod
+    def get_collection(cls, name: str = None, metadata: dict = None):
+        name = name or settings.COLLECTION_NAME
+        client = cls.get_client()
+        with cls._lock:
+            collection = cls._collections.get(name)
+            if collection is None:
+                collection = client.get_or_create_collection(name=name, metadata=metadata)
+                cls._collections[name] = collection
+            return collection
 
-    @staticmethod
-    def get_cache_collection(embeddings):
+    @classmethod
+    def get_vector_store(cls, embeddings):
+        client = cls.get_client()
+        key = (settings.COLLECTION_NAME, id(embeddings))
+        with cls._lock:
+            vector_store = cls._vector_stores.get(key)
+            if vector_store is None:
+                vector_store = Chroma(
+                    client=client,
+                    collection_name=settings.COLLECTION_NAME,
+                    embedding_function=embeddings,
+                )
+                cls._vector_stores[key] = vector_store
+            return vector_store
+
+    @classmethod
+    def get_cache_collection(cls, embeddings):
         # Cache usually uses raw chromadb collection for simple query
-        client = DBFactory.get_client()
-        return client.get_or_create_collection(
+        return cls.get_collection(
             name=settings.CACHE_COLLECTION_NAME,
             metadata={"hnsw:space": "cosine"}
         )
+
+    @classmethod
+    def invalidate(cls):
+        """主动丢弃连接 (如请求失败时), 下次调用会重新连接"""
+        with cls._lock:
+            if cls._client is not None:
+                cls._stats["reconnects"] += 1
+            cls._drop_handles()
+            cls._client = None
+
+    @classmethod
+    def invalidate_on(cls, error: BaseException) -> bool:
+        """
+        只在连接错误时丢弃连接 (会使所有缓存的 Agent 重建); 返回是否丢弃
+        嵌入式 PersistentClient 没有可断开的连接, 重建只会在同一目录上再打开一个客户端
+        """
+        if settings.CHROMA_MODE == "persistent" or not is_connection_error(error):
+            return False
+        cls.invalidate()
+        return True
+
+    @classmethod
+    def generation(cls) -> int:
+        return cls._generation
+
+    @classmethod
+    def stats(cls) -> dict:
+        with cls._lock:
+            return {
+                **cls._stats,
+                "connected": cls._client is not None,
+                "cached_collections": len(cls._collections),
+                "cached_vector_stores": len(cls._vector_stores),
+            }
+
+    @classmethod
+    def _drop_handles(cls):
+        cls._collections.clear()
+        cls._vector_stores.clear()
+        cls._generation += 1
+        # chromadb 按 host:port 缓存底层 System, 不清理的话重连仍会拿到旧连接
+        try:
+            chromadb.api.client.SharedSystemClient.clear_system_cache()
+        except Exception:
+            pass
@@ -0,0 +1,219 @@
+import os
+import re
+import hashlib
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from src.config.settings import get_settings
+from src.core.llm import embedding_cache_name
+from src.core.metrics import record_cache
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+settings = get_settings()
+
+# cache namespace (model@backend) -> EmbeddingCache, 同一进程内每个命名空间只打开一次
+_caches: Dict[str, "EmbeddingCache"] = {}
+_caches_lock = threading.Lock()
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class EmbeddingCache:
+    """
+    内容寻址的 Embedding 缓存: (模型, chunk 文本哈希) -> 向量
+    - vectors.f32: 追加写入的 float32 矩阵, 通过 numpy.memmap 读取
+    - index.tsv:   追加写入的 "文本哈希<TAB>行号", 启动时加载到内存
+    两个文件都只追加不改写, 进程中途退出最多留下未被索引的孤儿行。
+    多个进程 (API 服务与命令行 ingest) 可以共享同一目录: 追加写入持有文件锁,
+    并在锁内先读入其他进程追加的行, 行号不会冲突。
+    """
+
+    def __init__(self, directory: str, model_name: str):
+        self.directory = os.path.join(directory, re.sub(r"[^\w.-]+", "_", model_name))
+        self.vectors_path = os.path.join(self.directory, "vectors.f32")
+        self.index_path = os.path.join(self.directory, "index.tsv")
+        self.dim_path = os.path.join(self.directory, "dim")
+        self.lock_path = os.path.join(self.directory, ".lock")
+        self.dim: Optional[int] = None
+        self.rows = {}        # text hash -> row
+        self.n_rows = 0       # rows physically present in vectors.f32
+        self._index_offset = 0  # bytes of index.tsv already read
+        self._mmap = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _load(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with self._file_lock():
+            self._refresh()
+
+    @contextmanager
+    def _file_lock(self):
+        """跨进程互斥: 同一缓存目录任意时刻只有一个进程在追加"""
+        with open(self.lock_path, "a+b") as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _refresh(self):
+        """
+        持有文件锁时调用: 读入其他进程追加的行
+        写入中途退出留下的半行向量 / 半行索引在这里截掉, 否则后续追加的行号会错位
+        """
+        if self.dim is None and os.path.exists(self.dim_path):
+            with open(self.dim_path) as f:
+                self.dim = int(f.read().strip())
+        if self.dim is not None and os.path.exists(self.vectors_path):
+            row_bytes = 4 * self.dim
+            size = os.path.getsize(self.vectors_path)
+            if size % row_bytes:
+                with open(self.vectors_path, "r+b") as f:
+                    f.truncate(size - size % row_bytes)
+            self.n_rows = size // row_bytes
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r+b") as f:
+                f.seek(self._index_offset)
+                data = f.read()
+                complete = data.rfind(b"\n") + 1
+                if complete < len(data):
+                    f.truncate(self._index_offset + complete)
+            for line in data[:complete].decode("utf-8").splitlines():
+                parts = line.split("\t")
+                if len(parts) == 2 and parts[1].isdigit() and int(parts[1]) < self.n_rows:
+                    self.rows[parts[0]] = int(parts[1])
+            self._index_offset += complete
+
+    def _matrix(self):
+        if self._mmap is None or self._mmap.shape[0] < self.n_rows:
+            self._mmap = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(self.n_rows, self.dim))
+        return self._mmap
+
+    def get_many(self, texts: List[str]) -> List[Optional[List[float]]]:
+        with self._lock:
+            results = []
+            for text in texts:
+                row = self.rows.get(text_hash(text))
+                if row is None:
+                    self.misses += 1
+                    results.append(None)
+                else:
+                    self.hits += 1
+                    results.append(self._matrix()[row].tolist())
+            return results
+
+    def put_many(self, texts: List[str], vectors: List[List[float]]):
+        if not texts:
+            return
+        matrix = np.asarray(vectors, dtype=np.float32)
+        with self._lock, self._file_lock():
+            self._refresh()
+            if self.dim is None:
+                self.dim = matrix.shape[1]
+                with open(self.dim_path, "w") as f:
+                    f.write(str(self.dim))
+
+            new_entries = []
+            for text, vector in zip(texts, matrix):
+                key = text_hash(text)
+                if key in self.rows:
+                    continue
+                new_entries.append((key, vector))
+            if not new_entries:
+                return
+
+            # 先写向量再写索引, 保证索引里的行号一定有对应的向量
+            with open(self.vectors_path, "ab") as f:
+                for _, vector in new_entries:
+                    f.write(vector.tobytes())
+            lines = []
+            for offset, (key, _) in enumerate(new_entries):
+                row = self.n_rows + offset
+                lines.append(f"{key}\t{row}\n")
+                self.rows[key] = row
+            with open(self.index_path, "ab") as f:
+                data = "".join(lines).encode("utf-8")
+                f.write(data)
+            self._index_offset += len(data)
+            self.n_rows += len(new_entries)
+
+    def stats(self) -> dict:
+        return {"entries": len(self.rows), "hits": self.hits, "misses": self.misses}
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that only runs the model for chunk texts it has never seen."""
+
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache):
+        self.embeddings = embeddings
+        self.cache = cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = self.cache.get_many(texts)
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        record_cache("embedding", hit=True, count=len(texts) - len(missing))
+        record_cache("embedding", hit=False, count=len(missing))
+        if missing:
+            computed = self.embeddings.embed_documents([texts[i] for i in missing])
+            self.cache.put_many([texts[i] for i in missing], computed)
+            for i, vector in zip(missing, computed):
+                vectors[i] = list(vector)
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+
+
+def cache_namespace(embeddings: Embeddings) -> Optional[str]:
+    """
+    按 (模型, 后端) 确定 embeddings 的缓存命名空间, 与 embedding_cache_name() 的命名一致
+    无法识别模型名时返回 None: 不同模型的向量绝不能共用一个缓存
+    """
+    model_name = getattr(embeddings, "model_name", None) or getattr(embeddings, "model", None)
+    if not isinstance(model_name, str):
+        return None
+    model_kwargs = getattr(embeddings, "model_kwargs", None) or {}
+    backend = model_kwargs.get("backend", "torch")
+    file_name = (model_kwargs.get("model_kwargs") or {}).get("file_name")
+    if file_name:
+        backend = "onnx-int8" if file_name == settings.EMBEDDING_ONNX_INT8_FILE else f"{backend}-{file_name}"
+    return embedding_cache_name(backend, model_name=model_name)
+
+def get_cached_embeddings(embeddings: Embeddings) -> Embeddings:
+    """
+    为 embeddings 包上按 (模型, 后端) 划分的磁盘缓存
+    EMBEDDING_CACHE_ENABLED=False 或无法识别模型时原样返回
+    """
+    if not settings.EMBEDDING_CACHE_ENABLED:
+        return embeddings
+    namespace = cache_namespace(embeddings)
+    if namespace is None:
+        return embeddings
+    cache = _caches.get(namespace)
+    if cache is None:
+        with _caches_lock:
+            cache = _caches.get(namespace)
+            if cache is None:
+                cache = _caches[namespace] = EmbeddingCache(settings.EMBEDDING_CACHE_DIR, namespace)
+    return CachedEmbeddings(embeddings, cache)
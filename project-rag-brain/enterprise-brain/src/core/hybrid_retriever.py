@@ -0,0 +1,194 @@
+import time
+import asyncio
+import hashlib
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Tuple
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from src.core.db import DBFactory
+from src.core.metrics import observe_latency, record_error, timed
+
+BRANCHES = ("lexical", "vector")
+# Prometheus 中的阶段名
+STAGE_NAMES = {"lexical": "bm25", "vector": "vector_branch", "total": "hybrid_retrieval"}
+
+# 向量分支的线程池: 同步调用时与 BM25 分支并行执行
+_branch_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="hybrid-branch")
+
+
+class BranchLatency:
+    """各分支最近若干次检索的耗时 (毫秒), 供 /ready 等接口查看"""
+
+    def __init__(self, window: int = 1000):
+        self._samples = {name: deque(maxlen=window) for name in (*BRANCHES, "total")}
+        self._errors = {name: 0 for name in BRANCHES}
+        self._lock = threading.Lock()
+
+    def record(self, timings: Dict[str, float], errors: List[str] = ()):
+        with self._lock:
+            for name, ms in timings.items():
+                self._samples[name].append(ms)
+            for name in errors:
+                self._errors[name] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            result = {}
+            for name, samples in self._samples.items():
+                ordered = sorted(samples)
+                result[name] = {
+                    "count": len(ordered),
+                    "last_ms": round(samples[-1], 2) if samples else None,
+                    "p50_ms": round(ordered[len(ordered) // 2], 2) if ordered else None,
+                    "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 2) if ordered else None,
+                }
+                if name in self._errors:
+                    result[name]["errors"] = self._errors[name]
+            return result
+
+
+branch_latency = BranchLatency()
+
+
+def doc_key(doc: Document) -> str:
+    """融合去重用的 ID: chunk_id > 向量库 ID > 内容哈希"""
+    return doc.metadata.get("chunk_id") or doc.id or hashlib.md5(doc.page_content.encode("utf-8")).hexdigest()
+
+def rrf_fuse(ranked_lists: List[Tuple[str, float, List[Document]]], k: int, rrf_k: int = 60) -> List[Document]:
+    """
+    加权 Reciprocal Rank Fusion: score(d) = Σ weight / (rrf_k + rank)
+    ranked_lists: [(branch name, weight, docs in rank order)]
+    同一 chunk 只保留一份, 并在 metadata 中记录融合分数和各分支名次
+    """
+    scores: Dict[str, float] = {}
+    docs: Dict[str, Document] = {}
+    ranks: Dict[str, Dict[str, int]] = {}
+    for name, weight, ranked in ranked_lists:
+        seen = set()
+        for rank, doc in enumerate(ranked, start=1):
+            key = doc_key(doc)
+            if key in seen:
+                continue
+            seen.add(key)
+            scores[key] = scores.get(key, 0.0) + weight / (rrf_k + rank)
+            docs.setdefault(key, doc)
+            ranks.setdefault(key, {})[name] = rank
+
+    fused = []
+    for key in sorted(scores, key=scores.get, reverse=True)[:k]:
+        doc = docs[key]
+        metadata = {**doc.metadata, "rrf_score": round(scores[key], 6)}
+        for name, rank in ranks[key].items():
+            metadata[f"{name}_rank"] = rank
+        fused.append(Document(id=doc.id or key, page_content=doc.page_content, metadata=metadata))
+    return fused
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    BM25 + 向量的混合检索
+    - 两个分支并行执行, 延迟约为 max(分支) 而不是 sum(分支)
+    - 每个分支多取 candidate_k 个候选, 再用 RRF 融合并按 chunk_id 去重, 返回前 k 个
+    - 单个分支出错时退化为另一个分支的结果
+    - 配置了 reranker 时先融合出 rerank_candidates 个候选, 再由 cross-encoder 选出前 k 个
+    """
+    lexical_index: Any = None
+    vector_store: Any = None
+    k: int = 3
+    candidate_k: int = 20
+    rrf_k: int = 60
+    lexical_weight: float = 0.4
+    vector_weight: float = 0.6
+    reranker: Any = None
+    rerank_candidates: int = 20
+
+    def _lexical(self, query: str) -> List[Document]:
+        if self.lexical_index is None:
+            return []
+        return [self.lexical_index.get_document(chunk_id) for chunk_id, _ in self.lexical_index.search(query, k=self.candidate_k)]
+
+    def _vector(self, query: str) -> List[Document]:
+        if self.vector_store is None:
+            return []
+        embeddings = getattr(self.vector_store, "embeddings", None)
+        if not isinstance(embeddings, Embeddings):
+            return self.vector_store.similarity_search(query, k=self.candidate_k)
+        # 与 similarity_search 等价, 拆开以便分别统计 embedding 与 Chroma 查询耗时
+        with timed("embedding"):
+            vector = embeddings.embed_query(query)
+        with timed("chroma_search"):
+            return self.vector_store.similarity_search_by_vector(vector, k=self.candidate_k)
+
+    @staticmethod
+    def _timed(fn, query: str):
+        start = time.perf_counter()
+        try:
+            return fn(query), None, (time.perf_counter() - start) * 1000
+        except Exception as e:
+            return [], e, (time.perf_counter() - start) * 1000
+
+    def _fuse(self, query: str, results: Dict[str, tuple], started: float) -> List[Document]:
+        timings = {name: ms for name, (_, _, ms) in results.items()}
+        timings["total"] = (time.perf_counter() - started) * 1000
+        errors = [name for name, (_, error, _) in results.items() if error is not None]
+        branch_latency.record(timings, errors)
+        for name, ms in timings.items():
+            observe_latency(STAGE_NAMES[name], ms / 1000)
+        for name in errors:
+            record_error(STAGE_NAMES[name])
+
+        for name in errors:
+            print(f"⚠️ Hybrid retrieval: {name} branch failed: {results[name][1]}")
+        if len(errors) == len(results):
+            raise results[BRANCHES[-1]][1]
+        if "vector" in errors:
+            # Chroma 连接失效时丢弃连接, 下次检索重新连接 (嵌入模型等其它错误只计数)
+            DBFactory.invalidate_on(results["vector"][1])
+
+        fused = rrf_fuse(
+            [
+                ("lexical", self.lexical_weight, results["lexical"][0]),
+                ("vector", self.vector_weight, results["vector"][0]),
+            ],
+            k=self.rerank_candidates if self.reranker is not None else self.k,
+            rrf_k=self.rrf_k,
+        )
+        if errors:
+            # 只有部分分支的结果, 标记出来避免被结果缓存长期保存
+            for doc in fused:
+                doc.metadata["partial"] = True
+        return fused
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun = None
+    ) -> List[Document]:
+        started = time.perf_counter()
+        vector_future = _branch_executor.submit(self._timed, self._vector, query)
+        lexical = self._timed(self._lexical, query)
+        fused = self._fuse(query, {"lexical": lexical, "vector": vector_future.result()}, started)
+        if self.reranker is None:
+            return fused
+        with timed("rerank"):
+            return self.reranker.rerank(query, fused, self.k)
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun = None
+    ) -> List[Document]:
+        started = time.perf_counter()
+        lexical, vector = await asyncio.gather(
+            asyncio.to_thread(self._timed, self._lexical, query),
+            asyncio.to_thread(self._timed, self._vector, query),
+        )
+        fused = self._fuse(query, {"lexical": lexical, "vector": vector}, started)
+        if self.reranker is None:
+            return fused
+        with timed("rerank"):
+            return await asyncio.to_thread(self.reranker.rerank, query, fused, self.k)
+
+
+def get_retrieval_stats() -> dict:
+    return branch_latency.stats()
@@ -1,33 +1,148 @@
 import os
 import glob
 import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 from langchain_community.document_loaders import TextLoader, PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_chroma import Chroma
 from src.config.settings import get_settings
 from src.core.db import DBFactory
 from src.core.llm import get_embeddings
-from src.core.retriever import reset_bm25_cache
+from src.core.embedding_cache import get_cached_embeddings
+from src.core.ingest_pipeline import EmbedWritePipeline, MemoryGuard
+from src.core.retriever import bump_index_generation, load_lexical_index
 from src.core.loader_factory import AdaptiveLoader # Import the new factory
+from src.core.manifest import IngestManifest
+from src.core.semantic_cache import get_semantic_cache
+from src.core.metrics import record_error
 
 settings = get_settings()
 
-def calculate_file_hash(filepath):
-    """计算文件的 MD5 哈希值"""
-    hasher = hashlib.md5()
+def parse_file(path, file_hash):
+    """
+    解析单个文件并补充元数据 (在子进程中执行)
+    Returns: (path, docs, error) —— 失败时返回错误信息而不是抛出, 单个文件失败不影响其它文件
+    """
+    try:
+        # 使用自适应加载器 (根据硬件自动选择 MarkItDown 或 PyPDF)
+        docs = AdaptiveLoader.load(path)
+        for doc in docs:
+            doc.metadata["source"] = path
+            doc.metadata["filename"] = os.path.basename(path)
+            doc.metadata["file_hash"] = file_hash
+        return path, docs, None
+    except Exception as e:
+        return path, [], str(e)
+
+def _new_parse_pool(workers):
+    """
+    解析进程池使用 spawn 启动: ingest 运行在后台线程中, fork 会把其它线程持有的锁
+    (Chroma 客户端、日志等) 一并复制到子进程, 可能导致子进程死锁
+    """
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+def _parse_window(pool, files, local_state, log, workers):
+    """
+    用进程池解析一批文件, 返回 ({path: (path, docs, error)}, pool)
+    子进程崩溃 (如 PDF 解析库段错误) 会使整个进程池失效, 未完成的文件换一个新进程池重试一次
+    """
+    results = {}
+    pending = list(files)
+    for attempt in range(2):
+        if not pending:
+            break
+        futures = {pool.submit(parse_file, f, local_state[f]): f for f in pending}
+        for future in as_completed(futures):
+            f = futures[future]
+            try:
+                results[f] = future.result()
+            except BrokenProcessPool as e:
+                results[f] = (f, [], f"parser process crashed: {e}")
+            except Exception as e:
+                results[f] = (f, [], str(e))
+        crashed = [f for f in pending if results[f][2] and "parser process crashed" in results[f][2]]
+        if crashed:
+            pool.shutdown(wait=False, cancel_futures=True)
+            pool = _new_parse_pool(workers)
+            if attempt == 0:
+                log(f"   ⚠️ Parser pool crashed, retrying {len(crashed)} files...")
+        pending = crashed
+    return results, pool
+
+def iter_parsed_files(files, local_state, log, workers=None):
+    """
+    并行解析文件 (进程池), 按输入顺序逐个产出 (path, docs, error)
+    每次只提交 workers * 2 个文件, 内存中最多只有这一批文件的解析结果
+    workers: 默认取 INGEST_PARSE_WORKERS, 0 表示使用全部 CPU 核
+    """
+    workers = settings.INGEST_PARSE_WORKERS if workers is None else workers
+    workers = min(workers or os.cpu_count() or 1, len(files))
+    if workers <= 1:
+        for f in files:
+            yield parse_file(f, local_state[f])
+        return
+
+    window = workers * 2
+    pool = _new_parse_pool(workers)
+    try:
+        for i in range(0, len(files), window):
+            batch = files[i:i + window]
+            results, pool = _parse_window(pool, batch, local_state, log, workers)
+            for f in batch:
+                yield results.pop(f)
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+def make_chunk_id(source, file_hash, seq):
+    """确定性的 chunk ID: 向量库与 BM25 索引共用, 混合检索时可按 ID 去重"""
+    source_key = hashlib.md5(source.encode("utf-8")).hexdigest()[:16]
+    return f"{source_key}-{file_hash[:12]}-{seq}"
+
+def assign_chunk_ids(chunks):
+    seq_by_source = {}
+    for chunk in chunks:
+        source = chunk.metadata["source"]
+        seq = seq_by_source.get(source, 0)
+        seq_by_source[source] = seq + 1
+        chunk.metadata["chunk_id"] = make_chunk_id(source, chunk.metadata.get("file_hash", ""), seq)
+    return chunks
+
+def update_manifest(to_delete, to_update, chunk_ids_by_source, local_state):
+    """记录本次同步结果; 加载失败的文件不记录, 下次同步会重试"""
+    with IngestManifest(settings.INGEST_MANIFEST_PATH) as manifest:
+        manifest.remove_sources([item[0] for item in to_delete + to_update])
+        for source, chunk_ids in chunk_ids_by_source.items():
+            manifest.record_source(source, local_state[source], chunk_ids)
+
+def open_lexical_index(to_delete, to_update):
+    """加载磁盘上的 BM25 索引并移除本次删除/更新的文件; 新 chunk 在流式切分时逐个文件写入"""
+    index = load_lexical_index()
+    for item in to_delete + to_update:
+        index.remove_source(item[0])
+    return index
+
+def invalidate_answer_cache(to_add, to_update, to_delete, log):
+    """删除引用了本次变动文件的语义缓存条目 (缓存故障不影响入库)"""
+    cache = get_semantic_cache()
+    if cache is None:
+        return
+    changed = [os.path.basename(item[0]) for item in to_add + to_update + to_delete]
     try:
-        with open(filepath, 'rb') as f:
-            buf = f.read()
-            hasher.update(buf)
-        return hasher.hexdigest()
+        removed = cache.invalidate_sources(changed)
+        if removed:
+            log(f"   🧹 Invalidated {removed} cached answers")
     except Exception as e:
-        print(f"⚠️ Error reading {filepath}: {e}")
-        return ""
+        log(f"   ⚠️ Could not invalidate semantic cache: {e}")
 
-def ingest_docs(progress_callback=None):
+def ingest_docs(progress_callback=None, reconcile=False, embeddings=None):
     """
     全量同步 data/ 目录到 ChromaDB
     progress_callback: 用于 Streamlit 显示进度的回调函数 func(text)
+    reconcile: 修复模式, 先分页扫描 ChromaDB 重建本地入库清单
+    embeddings: 指定 Embedding 模型 (如基准测试中的确定性假模型), 默认使用 get_embeddings()
+    Returns: 同步摘要 {"ok", "added", "updated", "deleted", "failed", "chunks", "pipeline", "peak_rss_mb"}
     """
     def log(msg):
         print(msg)
@@ -36,45 +151,30 @@ def ingest_docs(progress_callback=None):
 
     log("🔌 Connecting to ChromaDB Server...")
     try:
-        client = DBFactory.get_client()
-        collection = client.get_or_create_collection(name=settings.COLLECTION_NAME)
+        collection = DBFactory.get_collection()
     except Exception as e:
         log(f"❌ Could not connect to ChromaDB: {e}")
-        return
+        return {"ok": False, "error": f"Could not connect to ChromaDB: {e}"}
 
-    # --- 1. 获取数据库现有状态 ---
-    log("🔍 Scanning database state...")
-    existing_data = collection.get(include=["metadatas"])
-    
-    db_state = {} 
-    
-    if existing_data and existing_data["ids"]:
-        for i, doc_id in enumerate(existing_data["ids"]):
-            meta = existing_data["metadatas"][i]
-            if not meta: continue
-            
-            source = meta.get("source")
-            if not source: continue
-            
-            norm_source = os.path.normpath(source)
-            
-            if norm_source not in db_state:
-                db_state[norm_source] = {"ids": [], "hash": meta.get("file_hash", "")}
-            db_state[norm_source]["ids"].append(doc_id)
-
-    # --- 2. 获取本地文件状态 ---
     # 支持 txt, md, pdf
     patterns = ["**/*.md", "**/*.txt", "**/*.pdf"]
     local_files = []
     for p in patterns:
         local_files.extend(glob.glob(os.path.join(settings.DATA_DIR, p), recursive=True))
-    
-    local_state = {} 
-    for f in local_files:
-        norm_path = os.path.normpath(f)
-        local_state[norm_path] = calculate_file_hash(norm_path)
 
-    log(f"📂 Local folder contains {len(local_state)} files.")
+    with IngestManifest(settings.INGEST_MANIFEST_PATH) as manifest:
+        # --- 1. 获取数据库现有状态 (来自本地入库清单) ---
+        if reconcile or not manifest.reconciled:
+            log("🔍 Reconciling ingest manifest with database...")
+            manifest.reconcile(collection, log=log)
+        db_state = manifest.indexed_state()
+
+        # --- 2. 获取本地文件状态 ---
+        # size 与 mtime 未变的文件直接复用清单中的哈希, 不再读取文件内容
+        local_state = manifest.hash_files(sorted({os.path.normpath(f) for f in local_files}))
+        rehashed = manifest.rehashed
+
+    log(f"📂 Local folder contains {len(local_state)} files ({rehashed} re-hashed).")
 
     # --- 3. 计算差异 ---
     to_add = []      
@@ -94,12 +194,23 @@ def ingest_docs(progress_callback=None):
             to_delete.append((db_path, info["ids"]))
 
     log(f"📊 Sync Plan: +{len(to_add)} | ~{len(to_update)} | -{len(to_delete)}")
+    summary = {
+        "ok": True,
+        "added": len(to_add),
+        "updated": len(to_update),
+        "deleted": len(to_delete),
+        "failed": 0,
+        "chunks": 0,
+    }
 
     if not to_add and not to_update and not to_delete:
         log("✅ Knowledge Base is up to date.")
-        return
+        return summary
 
     # --- 4. 执行同步 ---
+    # 先加载 BM25 索引: 首次构建失败 (如 Chroma 不可用) 时在改动向量库之前就中止, 不会保存空索引
+    index = open_lexical_index(to_delete, to_update)
+
     ids_to_remove = []
     for item in to_delete:
         ids_to_remove.extend(item[1])
@@ -116,51 +227,76 @@ def ingest_docs(progress_callback=None):
     files_to_process = [x[0] for x in to_add] + [x[0] for x in to_update]
     
     if not files_to_process:
+        update_manifest(to_delete, to_update, {}, local_state)
+        index.save()
+        bump_index_generation()
+        invalidate_answer_cache(to_add, to_update, to_delete, log)
         log("✅ Sync complete (Only deletions performed).")
-        return
+        return summary
 
-    # 加载并切分
-    documents = []
-    for f in files_to_process:
-        try:
-            # 使用自适应加载器 (根据硬件自动选择 MarkItDown 或 PyPDF)
-            docs = AdaptiveLoader.load(f)
-            
-            current_hash = local_state[f]
-
-            for doc in docs:
-                doc.metadata["source"] = f
-                doc.metadata["filename"] = os.path.basename(f)
-                doc.metadata["file_hash"] = current_hash
-            documents.extend(docs)
-            log(f"   - Loaded: {os.path.basename(f)}")
-        except Exception as e:
-            log(f"   ❌ Failed to load {f}: {e}")
-
-    if documents:
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-        chunks = text_splitter.split_documents(documents)
-        
-        log("🧠 Initializing embeddings...")
-        embeddings = get_embeddings()
-        
-        vector_store = DBFactory.get_vector_store(embeddings)
-        
-        batch_size = 100
-        total_chunks = len(chunks)
-        log(f"💾 Ingesting {total_chunks} chunks...")
-        
-        for i in range(0, total_chunks, batch_size):
-            batch = chunks[i:i+batch_size]
-            vector_store.add_documents(batch)
-            log(f"      ...ingested {min(i+batch_size, total_chunks)}/{total_chunks}")
+    log("🧠 Initializing embeddings...")
+    embeddings = get_cached_embeddings(embeddings or get_embeddings())
+    cache = getattr(embeddings, "cache", None)
+    cache_before = cache.stats() if cache is not None else None
+
+    # 流式处理: 解析 -> 切分 -> 嵌入 -> 写入 按文件逐个推进, 内存占用与语料总量无关
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+    memory = MemoryGuard()
+    pipeline = EmbedWritePipeline(embeddings, collection, log=log, memory=memory)
+    chunk_ids_by_source = {}
+
+    def stream_chunks():
+        for f, docs, error in iter_parsed_files(files_to_process, local_state, log):
+            if error:
+                log(f"   ❌ Failed to load {f}: {error}")
+                record_error("ingest_parse")
+                summary["failed"] += 1
+                continue
+            chunks = assign_chunk_ids(text_splitter.split_documents(docs))
+            del docs
+            chunk_ids = [c.metadata["chunk_id"] for c in chunks]
+            if chunks:
+                chunk_ids_by_source[f] = chunk_ids
+                index.upsert_source(f, local_state[f], chunks, ids=chunk_ids)
+            log(f"   - Loaded: {os.path.basename(f)} ({len(chunks)} chunks)")
+            yield from chunks
+            del chunks
+            memory.relieve(pipeline.drain, log)
+
+    log(f"💾 Ingesting {len(files_to_process)} files...")
+    # 嵌入与写入流水线化: 写入第 N 批时嵌入第 N+1 批
+    stats = pipeline.run(stream_chunks())
+    log(
+        f"   ⏱️ Embed {stats['embed']['chunks_per_s']} chunks/s (waited {stats['embed']['wait_s']}s on writes)"
+        f" | Write {stats['write']['chunks_per_s']} chunks/s (waited {stats['write']['wait_s']}s on embeddings)"
+        f" | Overall {stats['chunks_per_s']} chunks/s"
+    )
+    log(f"   📈 Peak RSS {memory.peak_rss_mb} MB" + (f" (throttled {memory.throttled}x)" if memory.throttled else ""))
+    summary["pipeline"] = stats
+    summary["peak_rss_mb"] = memory.peak_rss_mb
+    if memory.exceeded:
+        # 上限是建议值: BM25 索引仍整体驻留内存, 超限时只报告不失败
+        summary["memory_limit_exceeded"] = memory.exceeded
+
+    if cache is not None:
+        cache_after = cache.stats()
+        hits = cache_after["hits"] - cache_before["hits"]
+        misses = cache_after["misses"] - cache_before["misses"]
+        log(f"   ♻️ Embedding cache: {hits} reused / {misses} computed")
+
+    update_manifest(to_delete, to_update, chunk_ids_by_source, local_state)
+    log("🔤 Updating BM25 index...")
+    index.save()
 
-    # Reset BM25 Cache to reflect new data
-    reset_bm25_cache()
+    # Reset BM25 Cache and invalidate cached agents to reflect new data
+    bump_index_generation()
+    invalidate_answer_cache(to_add, to_update, to_delete, log)
+    summary["chunks"] = stats["write"]["chunks"]
     log("✅ Sync complete!")
+    return summary
 
 if __name__ == "__main__":
     # 简单的命令行调用
     import sys
     sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
-    ingest_docs()
+    ingest_docs(reconcile="--reconcile" in sys.argv)
@@ -0,0 +1,222 @@
+import gc
+import time
+import queue
+import threading
+from typing import Callable, Iterable, List, Optional
+import psutil
+from langchain_core.documents import Document
+from src.config.settings import get_settings
+from src.core.metrics import INGEST_CHUNKS, observe_latency, record_error
+
+settings = get_settings()
+
+_DONE = object()
+
+
+class StageStats:
+    """单个阶段的累计处理量与耗时 (只统计真正工作的时间, 不含排队等待)"""
+
+    def __init__(self):
+        self.items = 0
+        self.busy_seconds = 0.0
+        self.wait_seconds = 0.0
+
+    @property
+    def throughput(self) -> float:
+        return self.items / self.busy_seconds if self.busy_seconds else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "chunks": self.items,
+            "busy_s": round(self.busy_seconds, 3),
+            "wait_s": round(self.wait_seconds, 3),
+            "chunks_per_s": round(self.throughput, 1),
+        }
+
+
+class MemoryGuard:
+    """
+    进程 RSS 监控 (psutil)
+    - 记录采样到的峰值 RSS, 用于入库报告
+    - limit_mb > 0 时作为软上限: 超过后由调用方暂停读取新文件, 等待流水线排空
+    - 上限只是建议值: 排空只能释放排队中的向量, BM25 索引等常驻数据本身超限时无法压回, 只会告警
+    """
+
+    def __init__(self, limit_mb: int = None):
+        self.limit_mb = settings.INGEST_MEMORY_LIMIT_MB if limit_mb is None else limit_mb
+        self._process = psutil.Process()
+        self.peak_rss = 0
+        self.throttled = 0  # 因超过上限而暂停读取的次数
+        self.exceeded = 0   # 排空后仍超过上限的次数
+
+    def sample(self) -> int:
+        rss = self._process.memory_info().rss
+        self.peak_rss = max(self.peak_rss, rss)
+        return rss
+
+    def over_limit(self) -> bool:
+        return bool(self.limit_mb) and self.sample() > self.limit_mb * 1024 * 1024
+
+    def relieve(self, drain: Callable[[], None], log: Callable[[str], None] = print):
+        """超过上限时调用 drain() 排空流水线; 排空后仍超限则记录并告警 (仅首次)"""
+        if not self.over_limit():
+            return
+        self.throttled += 1
+        log(f"   ⏸️ RSS {self.sample() // (1024 * 1024)} MB over the {self.limit_mb} MB limit, draining pipeline...")
+        drain()
+        if self.over_limit():
+            self.exceeded += 1
+            if self.exceeded == 1:
+                log(
+                    f"   ⚠️ RSS still {self.sample() // (1024 * 1024)} MB after draining: resident data"
+                    f" (e.g. the BM25 index) exceeds INGEST_MEMORY_LIMIT_MB={self.limit_mb}, continuing anyway"
+                )
+
+    @property
+    def peak_rss_mb(self) -> float:
+        return round(self.peak_rss / (1024 * 1024), 1)
+
+
+class EmbedWritePipeline:
+    """
+    Ingest 的嵌入 / 写入流水线
+    - 嵌入在调用线程中按 embed_batch_size 分批进行, 结果放入有界队列
+    - 写入线程从队列取出向量, 攒够 write_batch_size 条后 upsert 到 Chroma
+    - 两个阶段重叠执行: 网络写入第 N 批时 CPU 在嵌入第 N+1 批
+    - 队列满时嵌入阻塞等待 (back-pressure), 内存中最多只有 queue_size 个批次的向量
+    """
+
+    def __init__(self, embeddings, collection, embed_batch_size: int = None, write_batch_size: int = None,
+                 queue_size: int = None, log: Callable[[str], None] = print, memory: MemoryGuard = None):
+        self.embeddings = embeddings
+        self.collection = collection
+        self.embed_batch_size = embed_batch_size or settings.INGEST_EMBED_BATCH_SIZE
+        self.write_batch_size = write_batch_size or settings.INGEST_WRITE_BATCH_SIZE
+        self.queue = queue.Queue(maxsize=max(1, queue_size or settings.INGEST_PIPELINE_QUEUE_SIZE))
+        self.log = log
+        self.memory = memory or MemoryGuard()
+        self.embed = StageStats()
+        self.write = StageStats()
+        self.elapsed_seconds = 0.0
+        self._error: Optional[BaseException] = None
+
+    def _upsert(self, batch: List[tuple]):
+        started = time.perf_counter()
+        self.collection.upsert(
+            ids=[item[0] for item in batch],
+            embeddings=[item[1] for item in batch],
+            documents=[item[2] for item in batch],
+            metadatas=[item[3] for item in batch],
+        )
+        elapsed = time.perf_counter() - started
+        self.write.busy_seconds += elapsed
+        self.write.items += len(batch)
+        observe_latency("ingest_write_batch", elapsed)
+        INGEST_CHUNKS.inc(len(batch))
+
+    def _writer(self, total: Optional[int]):
+        pending = []
+        acked = True       # 当前取出的队列项是否已 task_done()
+        finished = False   # 是否已取到 _DONE
+        try:
+            while True:
+                started = time.perf_counter()
+                item = self.queue.get()
+                acked = False
+                self.write.wait_seconds += time.perf_counter() - started
+                if item is _DONE:
+                    self.queue.task_done()
+                    acked = finished = True
+                    break
+                pending.extend(item)
+                while len(pending) >= self.write_batch_size:
+                    self._upsert(pending[:self.write_batch_size])
+                    pending = pending[self.write_batch_size:]
+                    self._progress(total)
+                self.queue.task_done()
+                acked = True
+            if pending:
+                self._upsert(pending)
+                self._progress(total)
+        except BaseException as e:
+            self._error = e
+            record_error("ingest_write")
+            if not acked:
+                self.queue.task_done()
+            # 继续消费队列, 让嵌入线程不会卡在 put() 上, 它会在下一批前发现错误并退出
+            while not finished:
+                item = self.queue.get()
+                self.queue.task_done()
+                finished = item is _DONE
+
+    def _progress(self, total: Optional[int]):
+        done = f"{self.write.items}/{total}" if total else str(self.write.items)
+        self.memory.sample()
+        self.log(
+            f"      ...ingested {done} | embed {self.embed.throughput:.0f} chunks/s"
+            f" | write {self.write.throughput:.0f} chunks/s | RSS peak {self.memory.peak_rss_mb} MB"
+        )
+
+    def _put(self, item):
+        started = time.perf_counter()
+        self.queue.put(item)
+        self.embed.wait_seconds += time.perf_counter() - started
+
+    def drain(self):
+        """
+        等待已嵌入的批次全部交给写入线程处理 (在嵌入线程中调用, 例如 chunk 生成器内部)
+        用于内存超限时的背压: 暂停产生新 chunk, 让排队中的向量先写出去并释放
+        """
+        if self._error is None:
+            self.queue.join()
+        gc.collect()
+
+    def run(self, chunks: Iterable[Document], total: Optional[int] = None) -> dict:
+        """
+        嵌入并写入所有 chunk (chunk.metadata 中需要有 chunk_id), 返回各阶段统计
+        chunks 可以是生成器: 只按需拉取, 任意时刻内存中只有当前嵌入批次与队列中的批次
+        """
+        started = time.perf_counter()
+        writer = threading.Thread(target=self._writer, args=(total,), name="ingest-writer", daemon=True)
+        writer.start()
+        try:
+            batch = []
+            for chunk in chunks:
+                batch.append(chunk)
+                if len(batch) >= self.embed_batch_size:
+                    self._embed_batch(batch)
+                    batch = []
+            if batch:
+                self._embed_batch(batch)
+        finally:
+            self.queue.put(_DONE)
+            writer.join()
+            self.elapsed_seconds = time.perf_counter() - started
+        if self._error is not None:
+            raise self._error
+        return self.stats()
+
+    def _embed_batch(self, batch: List[Document]):
+        if self._error is not None:
+            raise self._error
+        started = time.perf_counter()
+        texts = [chunk.page_content for chunk in batch]
+        vectors = self.embeddings.embed_documents(texts)
+        elapsed = time.perf_counter() - started
+        self.embed.busy_seconds += elapsed
+        observe_latency("ingest_embed_batch", elapsed)
+        self.embed.items += len(batch)
+        self.memory.sample()
+        self._put([
+            (chunk.metadata["chunk_id"], list(vector), text, chunk.metadata)
+            for chunk, vector, text in zip(batch, vectors, texts)
+        ])
+
+    def stats(self) -> dict:
+        return {
+            "embed": self.embed.to_dict(),
+            "write": self.write.to_dict(),
+            "elapsed_s": round(self.elapsed_seconds, 3),
+            "chunks_per_s": round(self.write.items / self.elapsed_seconds, 1) if self.elapsed_seconds else 0.0,
+            "peak_rss_mb": self.memory.peak_rss_mb,
+        }
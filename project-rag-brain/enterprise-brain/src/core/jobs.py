@@ -0,0 +1,143 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Callable, Optional
+from src.config.settings import get_settings
+from src.core.ingest import ingest_docs
+
+settings = get_settings()
+
+MAX_JOB_HISTORY = 100
+MAX_JOB_LOG_LINES = 50
+
+class IngestJob:
+    """一次入库同步任务; 多个触发 (如批量上传) 会合并到同一个排队中的任务"""
+
+    def __init__(self, reason: str):
+        self.id = uuid.uuid4().hex
+        self.status = "queued"  # queued -> running -> succeeded / failed
+        self.reasons = [reason]
+        self.queued_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.message = "Waiting for the ingest worker"
+        self.log = deque(maxlen=MAX_JOB_LOG_LINES)
+        self.result: Optional[dict] = None
+        self.error: Optional[str] = None
+
+    def progress(self, msg: str):
+        self.message = msg
+        self.log.append(msg)
+
+    def to_dict(self) -> dict:
+        now = time.time()
+        wait_end = self.started_at or now
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "triggers": len(self.reasons),
+            "reasons": list(self.reasons),
+            "message": self.message,
+            "log": list(self.log),
+            "queued_at": self.queued_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "wait_seconds": round(wait_end - self.queued_at, 3),
+            "run_seconds": round((self.finished_at or now) - self.started_at, 3) if self.started_at else None,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class IngestJobQueue:
+    """
+    进程内入库任务队列
+    - 单 worker 线程: 同一时间只有一个同步在跑, 不会并发删除/写入
+    - 合并 (coalescing): 排队中的任务会吸收后续触发, 十次上传只跑一次同步
+    - 运行中再有触发则排一个新任务, 保证新上传的文件一定会被同步
+    """
+
+    def __init__(self, runner: Callable = None, debounce_seconds: float = None):
+        self.runner = runner or ingest_docs
+        self.debounce_seconds = settings.INGEST_DEBOUNCE_SECONDS if debounce_seconds is None else debounce_seconds
+        self._jobs = OrderedDict()  # job id -> IngestJob (最近 MAX_JOB_HISTORY 个)
+        self._pending: Optional[IngestJob] = None
+        self._cond = threading.Condition()
+        self._worker = None
+
+    def submit(self, reason: str = "manual") -> IngestJob:
+        with self._cond:
+            if self._pending is not None:
+                self._pending.reasons.append(reason)
+                return self._pending
+
+            job = IngestJob(reason)
+            self._pending = job
+            self._jobs[job.id] = job
+            while len(self._jobs) > MAX_JOB_HISTORY:
+                self._jobs.popitem(last=False)
+
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run_forever, name="ingest-worker", daemon=True)
+                self._worker.start()
+            self._cond.notify()
+            return job
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def wait(self, job_id: str, timeout: float = None) -> Optional[IngestJob]:
+        """阻塞等待任务结束 (用于脚本/测试)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            job = self._jobs.get(job_id)
+            while job is not None and job.status in ("queued", "running"):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return job
+
+    def _run_forever(self):
+        while True:
+            with self._cond:
+                while self._pending is None:
+                    self._cond.wait()
+            # 等待一小段时间, 让同一批上传合并进同一个任务
+            time.sleep(self.debounce_seconds)
+            with self._cond:
+                job, self._pending = self._pending, None
+                job.status = "running"
+                job.started_at = time.time()
+            self._execute(job)
+
+    def _execute(self, job: IngestJob):
+        status, result, error = "succeeded", None, None
+        try:
+            result = self.runner(progress_callback=job.progress)
+            if result is not None and not result.get("ok", True):
+                status, error = "failed", result.get("error")
+        except Exception as e:
+            status, error = "failed", str(e)
+            job.progress(f"❌ Ingest failed: {e}")
+        finally:
+            with self._cond:
+                job.status = status
+                job.result = result
+                job.error = error
+                job.finished_at = time.time()
+                self._cond.notify_all()
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+def get_ingest_queue() -> IngestJobQueue:
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = IngestJobQueue()
+    return _queue
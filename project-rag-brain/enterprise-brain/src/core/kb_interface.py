@@ -1,14 +1,24 @@
 from abc import ABC, abstractmethod
+import asyncio
+import random
+import threading
+import time
+import weakref
 import requests
+import httpx
 import json
-from typing import List, Dict, Any
+from requests.adapters import HTTPAdapter
+from typing import List, Dict, Any, Optional
 from src.config.settings import get_settings
 from src.core.db import DBFactory
 from src.core.llm import get_embeddings
+from src.core.metrics import observe_latency, record_error, timed
 from langchain_chroma import Chroma
 
 settings = get_settings()
 
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
 class KnowledgeBase(ABC):
     """知识库抽象基类"""
     
@@ -20,6 +30,17 @@ class KnowledgeBase(ABC):
         """
         pass
 
+    async def aretrieve(self, query: str, k: int = 5) -> List[Dict[str, Any]]:
+        """异步检索; 默认在线程池中执行同步实现"""
+        return await asyncio.to_thread(self.retrieve, query, k)
+
+    def retrieve_batch(self, queries: List[str], k: int = 5) -> List[List[Dict[str, Any]]]:
+        """批量检索, 返回与 queries 一一对应的结果列表; 默认逐条调用 retrieve"""
+        return [self.retrieve(query, k) for query in queries]
+
+    async def aretrieve_batch(self, queries: List[str], k: int = 5) -> List[List[Dict[str, Any]]]:
+        return await asyncio.to_thread(self.retrieve_batch, queries, k)
+
     @abstractmethod
     def status(self) -> Dict[str, Any]:
         """获取知识库状态"""
@@ -29,6 +50,7 @@ class LocalKnowledgeBase(KnowledgeBase):
     """本地模式: 基于 ChromaDB + LangChain"""
     
     def retrieve(self, query: str, k: int = 5) -> List[Dict[str, Any]]:
+        started = time.perf_counter()
         try:
             embeddings = get_embeddings()
             vector_store = DBFactory.get_vector_store(embeddings)
@@ -44,63 +66,317 @@ class LocalKnowledgeBase(KnowledgeBase):
                     "page": doc.metadata.get("page", 0),
                     "score": float(score) # Chroma distance (lower is better usually, or similarity)
                 })
+            observe_latency("local_kb_search", time.perf_counter() - started)
             return results
         except Exception as e:
             print(f"❌ Local KB Search Error: {e}")
+            record_error("local_kb_search")
+            # 连接失效时丢弃连接, 下次检索重新连接
+            DBFactory.invalidate_on(e)
             return []
 
+    def retrieve_batch(self, queries: List[str], k: int = 5) -> List[List[Dict[str, Any]]]:
+        """
+        批量混合检索: 一次 embedding 前向计算 + 一次 Chroma 多查询 + 批量 BM25 打分, 再逐条 RRF 融合
+        出错时抛出异常, 由调用方决定如何报告 (不返回看起来正常的空结果)
+        """
+        from src.core.batch_retrieval import hybrid_search_batch
+        try:
+            with timed("batch_retrieval"):
+                batches = hybrid_search_batch(get_embeddings(), queries, k)
+        except Exception as e:
+            DBFactory.invalidate_on(e)
+            raise
+        return [
+            [
+                {
+                    "content": doc.page_content,
+                    "source": doc.metadata.get("filename") or doc.metadata.get("source", "unknown"),
+                    "page": doc.metadata.get("page", 0),
+                    "chunk_id": doc.metadata.get("chunk_id") or doc.id,
+                    "score": doc.metadata.get("rrf_score"),
+                }
+                for doc in docs
+            ]
+            for docs in batches
+        ]
+
     def status(self) -> Dict[str, Any]:
         return {"engine": "Local (ChromaDB)", "status": "active"}
 
 
+class CircuitBreaker:
+    """
+    熔断器: 连续失败 threshold 次后打开, reset_seconds 内直接拒绝请求;
+    之后进入半开状态, 放行一个试探请求, 成功则关闭, 失败则重新打开;
+    试探请求被取消 (客户端断开 / 超时) 而没有结果时由调用方 abandon_probe() 释放, 下一个请求重新试探
+    """
+
+    def __init__(self, threshold: int, reset_seconds: float):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def admit(self) -> Optional[str]:
+        """Returns: "closed" (正常放行), "probe" (半开状态下的试探请求) 或 None (拒绝)"""
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return "closed"
+            if state == "half_open" and not self._probing:
+                self._probing = True
+                return "probe"
+            return None
+
+    def allow(self) -> bool:
+        return self.admit() is not None
+
+    def abandon_probe(self):
+        """试探请求没有产生结果 (被取消), 释放试探名额而不改变熔断状态"""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+
+class RetryableError(Exception):
+    """可重试的 RAGFlow 错误 (429 / 5xx)"""
+
+
 class RAGFlowKnowledgeBase(KnowledgeBase):
-    """企业模式: 对接 RAGFlow API"""
+    """
+    企业模式: 对接 RAGFlow API
+    - 共享的 requests.Session / httpx.AsyncClient, keep-alive 复用连接
+    - 连接错误 / 超时 / 429 / 5xx 有限次重试 (指数退避 + 全抖动)
+    - 熔断: RAGFlow 持续不可用时直接返回空结果, 不再让每个请求都等超时
+    - 健康状态缓存 RAGFLOW_HEALTH_TTL_SECONDS 秒
+    """
     
     def __init__(self):
         self.base_url = settings.RAGFLOW_BASE_URL
         self.api_key = settings.RAGFLOW_API_KEY
         self.headers = {"Authorization": f"Bearer {self.api_key}"}
+        self.timeout = (settings.RAGFLOW_CONNECT_TIMEOUT, settings.RAGFLOW_READ_TIMEOUT)
+        self.max_retries = settings.RAGFLOW_MAX_RETRIES
+        self.breaker = CircuitBreaker(settings.RAGFLOW_BREAKER_THRESHOLD, settings.RAGFLOW_BREAKER_RESET_SECONDS)
 
-    def retrieve(self, query: str, k: int = 5) -> List[Dict[str, Any]]:
-        # RAGFlow API 规范 (假设 v1 接口)
-        # 具体 endpoint 需参考 RAGFlow 官方文档
-        url = f"{self.base_url}/api/v1/retrieval" 
-        payload = {
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.RAGFLOW_MAX_CONNECTIONS)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        # httpx.AsyncClient 绑定创建时的事件循环: 每个循环一个, 循环被回收时条目自动消失
+        self._async_clients = weakref.WeakKeyDictionary()  # event loop -> httpx.AsyncClient
+        self._async_clients_lock = threading.Lock()
+
+        self._health: Optional[Dict[str, Any]] = None
+        self._health_checked_at = 0.0
+        self._health_lock = threading.Lock()
+
+    def _get_async_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        with self._async_clients_lock:
+            client = self._async_clients.get(loop)
+            if client is None:
+                client = httpx.AsyncClient(
+                    headers=self.headers,
+                    timeout=httpx.Timeout(settings.RAGFLOW_READ_TIMEOUT, connect=settings.RAGFLOW_CONNECT_TIMEOUT),
+                    limits=httpx.Limits(
+                        max_connections=settings.RAGFLOW_MAX_CONNECTIONS,
+                        max_keepalive_connections=settings.RAGFLOW_MAX_CONNECTIONS,
+                    ),
+                )
+                self._async_clients[loop] = client
+        return client
+
+    async def aclose(self):
+        """关闭所有事件循环上的 AsyncClient"""
+        current = asyncio.get_running_loop()
+        with self._async_clients_lock:
+            clients = list(self._async_clients.items())
+            self._async_clients.clear()
+        for loop, client in clients:
+            try:
+                if loop is not current and loop.is_running():
+                    # 另一个线程中仍在运行的循环: 在它自己的循环上关闭
+                    await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(client.aclose(), loop))
+                else:
+                    await client.aclose()
+            except RuntimeError as e:
+                # 所属循环已关闭, 其连接已无法再使用
+                print(f"⚠️ Could not close RAGFlow client of a closed event loop: {e}")
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter: 在 [0, min(cap, base * 2^attempt)] 内随机, 避免重试风暴
+        return random.uniform(0, min(2.0, 0.2 * (2 ** attempt)))
+
+    # RAGFlow API 规范 (假设 v1 接口)
+    # 具体 endpoint 需参考 RAGFlow 官方文档
+    def _payload(self, query: str, k: int) -> Dict[str, Any]:
+        return {
             "question": query,
             "similarity_threshold": 0.2,
             "top_k": k
         }
-        
+
+    @staticmethod
+    def _parse(data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        # 适配 RAGFlow 返回格式 -> 统一格式
+        results = []
+        for item in data.get("data", []):
+            results.append({
+                "content": item.get("chunk_content"),
+                "source": item.get("doc_name"),
+                "score": item.get("similarity"),
+                "reference": item
+            })
+        return results
+
+    def retrieve(self, query: str, k: int = 5) -> List[Dict[str, Any]]:
+        admission = self.breaker.admit()
+        if admission is None:
+            print("⚠️ RAGFlow circuit open, skipping retrieval")
+            record_error("ragflow_circuit_open")
+            return []
         try:
-            response = requests.post(url, json=payload, headers=self.headers, timeout=5)
-            response.raise_for_status()
-            data = response.json()
-            
-            # 适配 RAGFlow 返回格式 -> 统一格式
-            results = []
-            for item in data.get("data", []):
-                results.append({
-                    "content": item.get("chunk_content"),
-                    "source": item.get("doc_name"),
-                    "score": item.get("similarity"),
-                    "reference": item
-                })
-            return results
-        except Exception as e:
-            print(f"❌ RAGFlow API Error: {e}")
+            return self._retrieve(query, k)
+        except BaseException:
+            # 只有中断 (KeyboardInterrupt 等) 会走到这里, 此时没有记录结果
+            if admission == "probe":
+                self.breaker.abandon_probe()
+            raise
+
+    def _retrieve(self, query: str, k: int) -> List[Dict[str, Any]]:
+        """带重试的同步检索; 普通异常都在内部处理并计入熔断器"""
+        url = f"{self.base_url}/api/v1/retrieval"
+        for attempt in range(self.max_retries + 1):
+            try:
+                # 连接错误 / 超时与 429 / 5xx 等所有失败都在 timed 内抛出, 每次失败的尝试恰好计数一次
+                with timed("ragflow_request"):
+                    response = self.session.post(url, json=self._payload(query, k), timeout=self.timeout)
+                    if response.status_code in RETRYABLE_STATUS:
+                        raise RetryableError(f"HTTP {response.status_code}")
+                    response.raise_for_status()
+                    results = self._parse(response.json())
+                self.breaker.record_success()
+                return results
+            except (requests.ConnectionError, requests.Timeout, RetryableError) as e:
+                if attempt < self.max_retries:
+                    time.sleep(self._backoff(attempt))
+                    continue
+                print(f"❌ RAGFlow API Error after {attempt + 1} attempts: {e}")
+            except Exception as e:
+                print(f"❌ RAGFlow API Error: {e}")
+            break
+        self.breaker.record_failure()
+        return []
+
+    async def aretrieve(self, query: str, k: int = 5) -> List[Dict[str, Any]]:
+        admission = self.breaker.admit()
+        if admission is None:
+            print("⚠️ RAGFlow circuit open, skipping retrieval")
+            record_error("ragflow_circuit_open")
             return []
+        try:
+            return await self._aretrieve(query, k)
+        except BaseException:
+            # 请求被取消 (客户端断开 / wait_for 超时): 没有结果, 释放试探名额
+            if admission == "probe":
+                self.breaker.abandon_probe()
+            raise
+
+    async def _aretrieve(self, query: str, k: int) -> List[Dict[str, Any]]:
+        client = self._get_async_client()
+        url = f"{self.base_url}/api/v1/retrieval"
+        for attempt in range(self.max_retries + 1):
+            try:
+                # 连接错误 / 超时与 429 / 5xx 等所有失败都在 timed 内抛出, 每次失败的尝试恰好计数一次
+                with timed("ragflow_request"):
+                    response = await client.post(url, json=self._payload(query, k))
+                    if response.status_code in RETRYABLE_STATUS:
+                        raise RetryableError(f"HTTP {response.status_code}")
+                    response.raise_for_status()
+                    results = self._parse(response.json())
+                self.breaker.record_success()
+                return results
+            except (httpx.TransportError, RetryableError) as e:
+                if attempt < self.max_retries:
+                    await asyncio.sleep(self._backoff(attempt))
+                    continue
+                print(f"❌ RAGFlow API Error after {attempt + 1} attempts: {e}")
+            except Exception as e:
+                print(f"❌ RAGFlow API Error: {e}")
+            break
+        self.breaker.record_failure()
+        return []
+
+    async def aretrieve_batch(self, queries: List[str], k: int = 5) -> List[List[Dict[str, Any]]]:
+        """RAGFlow 没有批量接口: 在共享连接池上并发发送, 并发数不超过连接池大小"""
+        semaphore = asyncio.Semaphore(settings.RAGFLOW_MAX_CONNECTIONS)
+
+        async def one(query):
+            async with semaphore:
+                return await self.aretrieve(query, k)
+
+        return await asyncio.gather(*(one(query) for query in queries))
 
     def status(self) -> Dict[str, Any]:
-        try:
-            # 简单的健康检查
-            resp = requests.get(f"{self.base_url}/health", timeout=2)
-            return {"engine": "RAGFlow", "status": "connected" if resp.status_code == 200 else "error"}
-        except:
-            return {"engine": "RAGFlow", "status": "disconnected"}
+        with self._health_lock:
+            now = time.monotonic()
+            if self._health is None or now - self._health_checked_at >= settings.RAGFLOW_HEALTH_TTL_SECONDS:
+                try:
+                    # 简单的健康检查
+                    resp = self.session.get(f"{self.base_url}/health", timeout=(settings.RAGFLOW_CONNECT_TIMEOUT, 2))
+                    self._health = {"engine": "RAGFlow", "status": "connected" if resp.status_code == 200 else "error"}
+                except Exception:
+                    self._health = {"engine": "RAGFlow", "status": "disconnected"}
+                self._health_checked_at = now
+            return {**self._health, "circuit": self.breaker.state}
+
+_kb_clients: Dict[str, KnowledgeBase] = {}
+_kb_lock = threading.Lock()
 
 def get_kb_client() -> KnowledgeBase:
-    """工厂方法: 获取当前配置的知识库客户端"""
-    if settings.RAG_ENGINE == "ragflow":
-        return RAGFlowKnowledgeBase()
-    else:
-        return LocalKnowledgeBase()
+    """工厂方法: 获取当前配置的知识库客户端 (进程级单例, 连接池与熔断状态在请求之间共享)"""
+    engine = settings.RAG_ENGINE
+    client = _kb_clients.get(engine)
+    if client is None:
+        with _kb_lock:
+            client = _kb_clients.get(engine)
+            if client is None:
+                client = RAGFlowKnowledgeBase() if engine == "ragflow" else LocalKnowledgeBase()
+                _kb_clients[engine] = client
+    return client
+
+async def aclose_kb_clients():
+    """关闭共享的 HTTP 连接池 (应用退出时调用)"""
+    for client in list(_kb_clients.values()):
+        if isinstance(client, RAGFlowKnowledgeBase):
+            await client.aclose()
@@ -0,0 +1,213 @@
+import os
+import math
+import heapq
+import pickle
+import hashlib
+import numpy as np
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+INDEX_FORMAT_VERSION = 2
+
+def default_preprocessing_func(text: str) -> List[str]:
+    # 与 langchain BM25Retriever 默认分词保持一致
+    return text.split()
+
+class LexicalIndex:
+    """
+    磁盘持久化的 BM25 倒排索引
+    - 以文件 (source) 为单位增量增删, 上传一个文件不再触发全量重建
+    - 打分只遍历查询词的倒排表, 而不是整个语料
+    """
+
+    def __init__(self, path: str, origin: str = "files", k1: float = 1.5, b: float = 0.75):
+        self.path = path
+        self.origin = origin  # "files": 解析 DATA_DIR 构建; "chunks": 来自 ingest 写入的 chunk
+        self.k1 = k1
+        self.b = b
+        self.sources: Dict[str, Dict[str, Any]] = {}           # source -> {"hash": str, "ids": [chunk_id]}
+        self.chunks: Dict[str, Tuple[str, dict]] = {}          # chunk_id -> (text, metadata)
+        self.postings: Dict[str, Dict[str, int]] = {}          # term -> {chunk_id: tf}
+        self.doc_len: Dict[str, int] = {}                      # chunk_id -> token count
+        self.total_len = 0
+        self._arrays = None  # 批量打分用的 numpy 视图, 索引变化时失效
+
+    def __len__(self):
+        return len(self.chunks)
+
+    # --- Persistence ---
+    @classmethod
+    def load(cls, path: str) -> Optional["LexicalIndex"]:
+        """从磁盘加载索引; 文件不存在或格式不兼容时返回 None"""
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "rb") as f:
+                state = pickle.load(f)
+            if state.get("version") != INDEX_FORMAT_VERSION:
+                print(f"⚠️ BM25 index format changed, ignoring {path}")
+                return None
+        except Exception as e:
+            print(f"⚠️ Could not load BM25 index {path}: {e}")
+            return None
+
+        index = cls(path, origin=state["origin"], k1=state["k1"], b=state["b"])
+        index.sources = state["sources"]
+        index.chunks = state["chunks"]
+        index.postings = state["postings"]
+        index.doc_len = state["doc_len"]
+        index.total_len = state["total_len"]
+        return index
+
+    def save(self):
+        """原子写入 (先写临时文件再替换), 读者不会看到写了一半的索引"""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        state = {
+            "version": INDEX_FORMAT_VERSION,
+            "origin": self.origin,
+            "k1": self.k1,
+            "b": self.b,
+            "sources": self.sources,
+            "chunks": self.chunks,
+            "postings": self.postings,
+            "doc_len": self.doc_len,
+            "total_len": self.total_len,
+        }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path)
+
+    # --- Incremental updates ---
+    def remove_source(self, source: str):
+        entry = self.sources.pop(os.path.normpath(source), None)
+        if not entry:
+            return
+        for chunk_id in entry["ids"]:
+            self._remove_chunk(chunk_id)
+
+    def upsert_source(self, source: str, file_hash: str, docs: List[Document], ids: Optional[List[str]] = None):
+        """替换某个文件的全部 chunk"""
+        source = os.path.normpath(source)
+        self.remove_source(source)
+        if ids is None:
+            prefix = hashlib.md5(source.encode("utf-8")).hexdigest()
+            ids = [f"{prefix}:{i}" for i in range(len(docs))]
+        for chunk_id, doc in zip(ids, docs):
+            self._add_chunk(chunk_id, doc.page_content, dict(doc.metadata))
+        self.sources[source] = {"hash": file_hash, "ids": list(ids)}
+
+    def _add_chunk(self, chunk_id: str, text: str, metadata: dict):
+        self._arrays = None
+        tokens = default_preprocessing_func(text)
+        self.chunks[chunk_id] = (text, {**metadata, "chunk_id": chunk_id})
+        self.doc_len[chunk_id] = len(tokens)
+        self.total_len += len(tokens)
+        for term, tf in Counter(tokens).items():
+            self.postings.setdefault(term, {})[chunk_id] = tf
+
+    def _remove_chunk(self, chunk_id: str):
+        if chunk_id not in self.chunks:
+            return
+        self._arrays = None
+        text, _ = self.chunks.pop(chunk_id)
+        self.total_len -= self.doc_len.pop(chunk_id, 0)
+        for term in set(default_preprocessing_func(text)):
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            posting.pop(chunk_id, None)
+            if not posting:
+                del self.postings[term]
+
+    # --- Scoring ---
+    def search(self, query: str, k: int = 4) -> List[Tuple[str, float]]:
+        """返回 [(chunk_id, bm25_score)], 按分数降序, 同分按 chunk 加入索引的顺序"""
+        n_docs = len(self.chunks)
+        if n_docs == 0:
+            return []
+        avgdl = self.total_len / n_docs or 1.0
+        scores: Dict[str, float] = {}
+        for term in set(default_preprocessing_func(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            df = len(posting)
+            # Lucene 风格 IDF, 恒为正, 避免高频词出现负分
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            for chunk_id, tf in posting.items():
+                norm = self.k1 * (1 - self.b + self.b * self.doc_len[chunk_id] / avgdl)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        positions = self._get_arrays()[1]
+        return heapq.nsmallest(k, scores.items(), key=lambda item: (-item[1], positions[item[0]]))
+
+    def _get_arrays(self):
+        if self._arrays is None:
+            ids = list(self.chunks)
+            positions = {chunk_id: i for i, chunk_id in enumerate(ids)}
+            doc_len = np.fromiter((self.doc_len[c] for c in ids), dtype=np.float64, count=len(ids))
+            self._arrays = (ids, positions, doc_len)
+        return self._arrays
+
+    def search_batch(self, queries: List[str], k: int = 4) -> List[List[Tuple[str, float]]]:
+        """
+        批量 BM25 打分, 结果与逐条 search() 相同 (包括同分时的顺序)
+        每个词项的得分向量 (倒排表上的 numpy 数组) 只计算一次, 被所有包含该词的查询共享;
+        每个查询的得分在稠密数组上累加, 用 partition 找出第 k 高的分数, 只对不低于它的候选排序
+        """
+        n_docs = len(self.chunks)
+        if n_docs == 0:
+            return [[] for _ in queries]
+        ids, positions, doc_len = self._get_arrays()
+        avgdl = self.total_len / n_docs or 1.0
+        norm = self.k1 * (1 - self.b + self.b * doc_len / avgdl)
+
+        term_scores = {}
+        for term in {t for query in queries for t in default_preprocessing_func(query)}:
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            df = len(posting)
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            idx = np.fromiter((positions[c] for c in posting), dtype=np.int64, count=df)
+            tf = np.fromiter(posting.values(), dtype=np.float64, count=df)
+            term_scores[term] = (idx, idf * tf * (self.k1 + 1) / (tf + norm[idx]))
+
+        results = []
+        for query in queries:
+            terms = [t for t in set(default_preprocessing_func(query)) if t in term_scores]
+            if not terms:
+                results.append([])
+                continue
+            scores = np.zeros(n_docs)
+            touched = np.zeros(n_docs, dtype=bool)
+            for term in terms:
+                idx, contribution = term_scores[term]
+                scores[idx] += contribution
+                touched[idx] = True
+            candidates = np.flatnonzero(touched)
+            if len(candidates) > k:
+                # 保留与第 k 名同分的全部候选, 再统一按 (-score, 加入顺序) 截断, 与 search() 一致
+                kth = np.partition(scores[candidates], len(candidates) - k)[len(candidates) - k]
+                candidates = candidates[scores[candidates] >= kth]
+            ranked = candidates[np.lexsort((candidates, -scores[candidates]))[:k]]
+            results.append([(ids[i], float(scores[i])) for i in ranked])
+        return results
+
+    def get_document(self, chunk_id: str) -> Document:
+        text, metadata = self.chunks[chunk_id]
+        return Document(id=chunk_id, page_content=text, metadata=dict(metadata))
+
+
+class LexicalRetriever(BaseRetriever):
+    """LangChain retriever over a LexicalIndex (drop-in replacement for BM25Retriever)."""
+    index: Any
+    k: int = 4
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun = None
+    ) -> List[Document]:
+        return [self.index.get_document(chunk_id) for chunk_id, _ in self.index.search(query, k=self.k)]
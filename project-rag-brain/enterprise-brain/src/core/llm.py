@@ -1,9 +1,16 @@
+import os
+import threading
 from langchain_openai import ChatOpenAI
 from langchain_huggingface import HuggingFaceEmbeddings
 from src.config.settings import get_settings
 
 settings = get_settings()
 
+_embeddings = None
+_embeddings_lock = threading.Lock()
+
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-int8")
+
 def get_llm():
     return ChatOpenAI(
         model=settings.LLM_MODEL_NAME,
@@ -13,9 +20,40 @@ def get_llm():
         streaming=True
     )
 
-def get_embeddings():
+def embedding_model_kwargs(backend: str = None) -> dict:
+    """SentenceTransformer 的构造参数: 选择 PyTorch 或 ONNX Runtime (可选 int8 量化) 推理"""
+    backend = backend or settings.EMBEDDING_BACKEND
+    if backend == "torch":
+        return {}
+    if backend == "onnx":
+        return {"backend": "onnx"}
+    if backend == "onnx-int8":
+        return {"backend": "onnx", "model_kwargs": {"file_name": settings.EMBEDDING_ONNX_INT8_FILE}}
+    raise ValueError(f"Unknown EMBEDDING_BACKEND {backend!r}, expected one of {EMBEDDING_BACKENDS}")
+
+def embedding_cache_name(backend: str = None, model_name: str = None) -> str:
+    """Embedding 缓存的命名空间: 不同后端的向量有细微差异, 不能互相复用"""
+    backend = backend or settings.EMBEDDING_BACKEND
+    model_name = model_name or settings.EMBEDDING_MODEL
+    return model_name if backend == "torch" else f"{model_name}@{backend}"
+
+def build_embeddings(backend: str = None) -> HuggingFaceEmbeddings:
     # Set HuggingFace endpoint for China
-    import os
     os.environ["HF_ENDPOINT"] = settings.HF_ENDPOINT
-    
-    return HuggingFaceEmbeddings(model_name=settings.EMBEDDING_MODEL)
+    return HuggingFaceEmbeddings(model_name=settings.EMBEDDING_MODEL, model_kwargs=embedding_model_kwargs(backend))
+
+def get_embeddings():
+    """
+    Returns a process-wide HuggingFaceEmbeddings instance (backend: EMBEDDING_BACKEND).
+    The sentence-transformers weights are loaded once on first use.
+    """
+    global _embeddings
+    if _embeddings is None:
+        with _embeddings_lock:
+            if _embeddings is None:
+                _embeddings = build_embeddings()
+    return _embeddings
+
+def warmup_embeddings():
+    """Load the model and run one inference so the first real query is not cold."""
+    get_embeddings().embed_query("warmup")
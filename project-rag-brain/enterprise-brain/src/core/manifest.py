@@ -0,0 +1,156 @@
+import os
+import sqlite3
+import hashlib
+from typing import Dict, List
+
+HASH_CHUNK_SIZE = 1024 * 1024  # 1 MB
+
+def calculate_file_hash(filepath, chunk_size=HASH_CHUNK_SIZE):
+    """流式计算文件的 MD5 哈希值 (按块读取, 不会把整个文件读进内存)"""
+    hasher = hashlib.md5()
+    try:
+        with open(filepath, 'rb') as f:
+            for block in iter(lambda: f.read(chunk_size), b""):
+                hasher.update(block)
+        return hasher.hexdigest()
+    except Exception as e:
+        print(f"⚠️ Error reading {filepath}: {e}")
+        return ""
+
+class IngestManifest:
+    """
+    本地入库清单 (SQLite)
+    files:   每个本地文件的 (size, mtime_ns, hash); size 与 mtime 都没变的文件直接复用上次的哈希
+    sources: 已入库文件的 hash; chunks: 已入库 chunk ID -> 所属文件
+    同步差异基于 sources/chunks 计算, 无需每次从 ChromaDB 拉取全部 chunk 的元数据。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.rehashed = 0  # 上次 hash_files() 真正读取并计算哈希的文件数
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                hash TEXT NOT NULL
+            )"""
+        )
+        self.conn.execute("CREATE TABLE IF NOT EXISTS sources (source TEXT PRIMARY KEY, hash TEXT NOT NULL)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS chunks (chunk_id TEXT PRIMARY KEY, source TEXT NOT NULL)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_chunks_source ON chunks (source)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def hash_files(self, paths: List[str]) -> Dict[str, str]:
+        """
+        返回 {path: hash}。只对新文件或 size/mtime 变化的文件真正计算哈希,
+        并清理已不存在的文件记录。
+        """
+        known = {
+            row[0]: (row[1], row[2], row[3])
+            for row in self.conn.execute("SELECT path, size, mtime_ns, hash FROM files")
+        }
+        hashes = {}
+        changed = []
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except OSError as e:
+                print(f"⚠️ Error reading {path}: {e}")
+                hashes[path] = ""
+                continue
+            entry = known.get(path)
+            if entry and entry[0] == st.st_size and entry[1] == st.st_mtime_ns and entry[2]:
+                hashes[path] = entry[2]
+                continue
+            file_hash = calculate_file_hash(path)
+            hashes[path] = file_hash
+            if file_hash:
+                changed.append((path, st.st_size, st.st_mtime_ns, file_hash))
+
+        removed = [(p,) for p in known if p not in hashes]
+        with self.conn:
+            if changed:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO files (path, size, mtime_ns, hash) VALUES (?, ?, ?, ?)",
+                    changed,
+                )
+            if removed:
+                self.conn.executemany("DELETE FROM files WHERE path = ?", removed)
+        self.rehashed = len(changed)
+        return hashes
+
+    # --- Indexed state (what ChromaDB holds) ---
+    @property
+    def reconciled(self) -> bool:
+        """是否已与 ChromaDB 对账过 (首次使用清单时需要从向量库导入现有状态)"""
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'reconciled'").fetchone()
+        return bool(row and row[0] == "1")
+
+    def indexed_state(self) -> Dict[str, dict]:
+        """返回 {source: {"ids": [...], "hash": str}}"""
+        state = {
+            source: {"ids": [], "hash": file_hash}
+            for source, file_hash in self.conn.execute("SELECT source, hash FROM sources")
+        }
+        for chunk_id, source in self.conn.execute("SELECT chunk_id, source FROM chunks ORDER BY rowid"):
+            state.setdefault(source, {"ids": [], "hash": ""})["ids"].append(chunk_id)
+        return state
+
+    def remove_sources(self, sources: List[str]):
+        with self.conn:
+            self.conn.executemany("DELETE FROM chunks WHERE source = ?", [(s,) for s in sources])
+            self.conn.executemany("DELETE FROM sources WHERE source = ?", [(s,) for s in sources])
+
+    def record_source(self, source: str, file_hash: str, chunk_ids: List[str]):
+        """记录某个文件入库后的 hash 与 chunk ID (覆盖旧记录)"""
+        with self.conn:
+            self.conn.execute("DELETE FROM chunks WHERE source = ?", (source,))
+            self.conn.execute("INSERT OR REPLACE INTO sources (source, hash) VALUES (?, ?)", (source, file_hash))
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO chunks (chunk_id, source) VALUES (?, ?)",
+                [(chunk_id, source) for chunk_id in chunk_ids],
+            )
+
+    def reconcile(self, collection, page_size: int = 1000, log=print) -> int:
+        """
+        修复模式: 分页扫描 ChromaDB 中的 chunk 元数据, 重建 sources/chunks 表。
+        只在首次启用清单或手动修复时运行, 每页只拉取 page_size 条, 内存占用有上限。
+        """
+        total = 0
+        offset = 0
+        with self.conn:
+            self.conn.execute("DELETE FROM chunks")
+            self.conn.execute("DELETE FROM sources")
+            while True:
+                page = collection.get(include=["metadatas"], limit=page_size, offset=offset)
+                ids = page["ids"]
+                if not ids:
+                    break
+                chunk_rows, source_rows = [], {}
+                for chunk_id, meta in zip(ids, page["metadatas"]):
+                    if not meta or not meta.get("source"):
+                        continue
+                    source = os.path.normpath(meta["source"])
+                    chunk_rows.append((chunk_id, source))
+                    source_rows.setdefault(source, meta.get("file_hash", ""))
+                self.conn.executemany("INSERT OR REPLACE INTO chunks (chunk_id, source) VALUES (?, ?)", chunk_rows)
+                self.conn.executemany("INSERT OR IGNORE INTO sources (source, hash) VALUES (?, ?)", source_rows.items())
+                offset += len(ids)
+                total += len(ids)
+                log(f"   🔎 Reconciled {total} chunks...")
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('reconciled', '1')")
+        return total
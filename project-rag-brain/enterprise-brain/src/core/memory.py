@@ -1,18 +1,320 @@
-import sqlite3
-from langgraph.checkpoint.sqlite import SqliteSaver
+import asyncio
+import zlib
+import aiosqlite
+from typing import Any, AsyncIterator, Iterator, List, Optional, Sequence, Tuple
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_metadata,
+)
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
 import os
 from src.config.settings import get_settings
+from src.core.metrics import timed
 
 settings = get_settings()
-_checkpointer = None
+_async_checkpointer = None
+_async_checkpointer_loop = None
+_async_checkpointer_lock = None
 
-def get_checkpointer():
+def _db_path():
+    return os.path.join(settings.BASE_DIR, "chat_history.db")
+
+def _pragmas(busy_timeout_ms: int) -> List[str]:
+    # WAL: 读不阻塞写; synchronous=NORMAL: WAL 下每次提交不再 fsync, 只在 checkpoint 时落盘
+    return [
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        f"PRAGMA busy_timeout={int(busy_timeout_ms)}",
+    ]
+
+class PooledAsyncSqliteSaver(BaseCheckpointSaver):
+    """
+    异步 SQLite checkpointer: 一个写连接 + 一组读连接 (WAL 模式)
+    - 读: 按 thread_id 哈希分到读连接, 不同会话的读互不排队, 也不会被写阻塞
+    - 写: 所有会话的 aput / aput_writes 进入同一个队列, 由写协程批量执行并只提交一次
+      (group commit), 多个连接之间不再争抢写锁, 也就不会出现 "database is locked"
+    - 调用方在其写入提交后才返回, 随后的读一定能看到这次写入
+    """
+
+    def __init__(self, writer: AsyncSqliteSaver, readers: List[AsyncSqliteSaver], max_batch: int = 64):
+        super().__init__(serde=writer.serde)
+        self.writer = writer
+        self.readers = readers or [writer]
+        self.max_batch = max_batch
+        self.loop = writer.loop
+        self.jsonplus_serde = JsonPlusSerializer()
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._writer_task: Optional[asyncio.Task] = None
+        self.batches = 0
+        self.batched_writes = 0
+
+    @classmethod
+    async def create(cls, path: str, pool_size: int = 1, busy_timeout_ms: int = 5000, max_batch: int = 64) -> "PooledAsyncSqliteSaver":
+        async def connect() -> AsyncSqliteSaver:
+            conn = await aiosqlite.connect(path)
+            for pragma in _pragmas(busy_timeout_ms):
+                await conn.execute(pragma)
+            saver = AsyncSqliteSaver(conn)
+            # 逐个建表, 避免多个连接同时执行 DDL
+            await saver.setup()
+            return saver
+
+        writer = await connect()
+        readers = [await connect() for _ in range(max(1, pool_size) - 1)]
+        return cls(writer, readers, max_batch=max_batch)
+
+    def _reader(self, thread_id) -> AsyncSqliteSaver:
+        if len(self.readers) == 1 or thread_id is None:
+            return self.readers[0]
+        return self.readers[zlib.crc32(str(thread_id).encode("utf-8")) % len(self.readers)]
+
+    def _reader_for(self, config: Optional[RunnableConfig]) -> AsyncSqliteSaver:
+        return self._reader((config or {}).get("configurable", {}).get("thread_id"))
+
+    async def aclose(self):
+        if self._writer_task is not None:
+            self._writer_task.cancel()
+            try:
+                await self._writer_task
+            except (asyncio.CancelledError, Exception):
+                # 写协程可能已因写入失败退出, 其异常已交给等待的调用方, 这里只需继续关闭连接
+                pass
+            self._writer_task = None
+        for saver in {id(s): s for s in [self.writer, *self.readers]}.values():
+            await saver.conn.close()
+
+    # --- Group commit ---
+    async def _write(self, statements: List[Tuple[str, List[tuple]]]):
+        """statements: [(sql, rows)], 在同一个事务中用 executemany 执行"""
+        if self._writer_task is None or self._writer_task.done():
+            self._writer_task = asyncio.create_task(self._write_loop())
+        future = asyncio.get_running_loop().create_future()
+        # 包含排队等待批量提交的时间, 即调用方实际感受到的写入延迟
+        with timed("checkpoint_write"):
+            await self._queue.put((statements, future))
+            await future
+
+    async def _write_loop(self):
+        conn = self.writer.conn
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                try:
+                    async with self.writer.lock:
+                        for statements, _ in batch:
+                            for sql, rows in statements:
+                                await conn.executemany(sql, rows)
+                        await conn.commit()
+                    self.batches += 1
+                    self.batched_writes += len(batch)
+                    for _, future in batch:
+                        if not future.done():
+                            future.set_result(None)
+                except Exception:
+                    # 整批回滚后逐条重试, 只让真正出错的写入失败
+                    await conn.rollback()
+                    await self._write_one_by_one(batch)
+            except BaseException as e:
+                # 回滚本身失败 (连接已损坏) 或被取消: 写协程退出前让所有等待中的调用方失败,
+                # 而不是永远挂起; 下一次写入会重新启动写协程
+                self._fail_pending(batch, e)
+                raise
+
+    def _fail_pending(self, batch, error: BaseException):
+        while not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        for _, future in batch:
+            if future.done():
+                continue
+            if isinstance(error, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(error)
+
+    async def _write_one_by_one(self, batch):
+        conn = self.writer.conn
+        for statements, future in batch:
+            try:
+                async with self.writer.lock:
+                    for sql, rows in statements:
+                        await conn.executemany(sql, rows)
+                    await conn.commit()
+                if not future.done():
+                    future.set_result(None)
+            except Exception as e:
+                await conn.rollback()
+                if not future.done():
+                    future.set_exception(e)
+
+    # --- Async API (graph.ainvoke / astream_events) ---
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        with timed("checkpoint_read"):
+            return await self._reader_for(config).aget_tuple(config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        async for item in self._reader_for(config).alist(config, filter=filter, before=before, limit=limit):
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        # 与 AsyncSqliteSaver.aput 相同的表结构与序列化, 只是交给写协程批量提交
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        type_, serialized_checkpoint = self.serde.dumps_typed(checkpoint)
+        serialized_metadata = self.jsonplus_serde.dumps(get_checkpoint_metadata(config, metadata))
+        await self._write([(
+            "INSERT OR REPLACE INTO checkpoints (thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(
+                str(thread_id),
+                checkpoint_ns,
+                checkpoint["id"],
+                config["configurable"].get("checkpoint_id"),
+                type_,
+                serialized_checkpoint,
+                serialized_metadata,
+            )],
+        )])
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        verb = "INSERT OR REPLACE" if all(w[0] in WRITES_IDX_MAP for w in writes) else "INSERT OR IGNORE"
+        await self._write([(
+            f"{verb} INTO writes (thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, type, value) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    str(config["configurable"]["thread_id"]),
+                    str(config["configurable"]["checkpoint_ns"]),
+                    str(config["configurable"]["checkpoint_id"]),
+                    task_id,
+                    WRITES_IDX_MAP.get(channel, idx),
+                    channel,
+                    *self.serde.dumps_typed(value),
+                )
+                for idx, (channel, value) in enumerate(writes)
+            ],
+        )])
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await self._write([
+            ("DELETE FROM checkpoints WHERE thread_id = ?", [(str(thread_id),)]),
+            ("DELETE FROM writes WHERE thread_id = ?", [(str(thread_id),)]),
+        ])
+
+    # --- Sync API (只能在事件循环以外的线程调用, 与 AsyncSqliteSaver 相同) ---
+    def _run_sync(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return self._reader_for(config).get_tuple(config)
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        return self._reader_for(config).list(config, filter=filter, before=before, limit=limit)
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return self._run_sync(self.aput(config, checkpoint, metadata, new_versions))
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        self._run_sync(self.aput_writes(config, writes, task_id, task_path))
+
+    def delete_thread(self, thread_id: str) -> None:
+        self._run_sync(self.adelete_thread(thread_id))
+
+    def get_next_version(self, current: Optional[str], channel: None) -> str:
+        return self.writer.get_next_version(current, channel)
+
+    def stats(self) -> dict:
+        return {
+            "readers": len(self.readers),
+            "batches": self.batches,
+            "writes": self.batched_writes,
+            "avg_batch": round(self.batched_writes / self.batches, 2) if self.batches else 0.0,
+        }
+
+
+async def aget_checkpointer():
     """
-    Returns a singleton SqliteSaver instance.
+    Returns a singleton PooledAsyncSqliteSaver for graph.ainvoke / astream_events.
+    The saver is bound to the event loop it was created on, so a new one is
+    created if the running loop changes (e.g. between test clients).
     """
-    global _checkpointer
-    if _checkpointer is None:
-        db_path = os.path.join(settings.BASE_DIR, "chat_history.db")
-        conn = sqlite3.connect(db_path, check_same_thread=False)
-        _checkpointer = SqliteSaver(conn)
-    return _checkpointer
+    global _async_checkpointer, _async_checkpointer_loop, _async_checkpointer_lock
+    loop = asyncio.get_running_loop()
+    if _async_checkpointer is not None and _async_checkpointer_loop is loop:
+        return _async_checkpointer
+
+    if _async_checkpointer_lock is None or _async_checkpointer_loop is not loop:
+        _async_checkpointer_lock = asyncio.Lock()
+        _async_checkpointer_loop = loop
+        if _async_checkpointer is not None:
+            # 旧 loop 上的连接无法在新 loop 中使用; 应在旧 loop 结束前调用 aclose_checkpointer()
+            print("⚠️ Event loop changed, creating a new async checkpointer")
+            _async_checkpointer = None
+
+    async with _async_checkpointer_lock:
+        if _async_checkpointer is None:
+            _async_checkpointer = await PooledAsyncSqliteSaver.create(
+                _db_path(),
+                pool_size=settings.CHECKPOINT_POOL_SIZE,
+                busy_timeout_ms=settings.CHECKPOINT_BUSY_TIMEOUT_MS,
+                max_batch=settings.CHECKPOINT_WRITE_BATCH,
+            )
+    return _async_checkpointer
+
+async def aclose_checkpointer():
+    """关闭异步 checkpointer 的连接 (aiosqlite 的后台线程不是 daemon, 不关闭会阻塞进程退出)"""
+    global _async_checkpointer
+    if _async_checkpointer is not None:
+        await _async_checkpointer.aclose()
+        _async_checkpointer = None
@@ -0,0 +1,133 @@
+import time
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+from uuid import UUID
+from langchain_core.callbacks import BaseCallbackHandler
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+
+# 从 1ms (BM25) 到 60s (长回答) 的延迟分桶
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+STAGE_LATENCY = Histogram(
+    "enterprise_brain_stage_latency_seconds",
+    "Latency of each request stage (embedding, bm25, chroma_search, llm_first_token, checkpoint_write, ...)",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+TOOL_LATENCY = Histogram(
+    "enterprise_brain_tool_latency_seconds",
+    "Agent tool execution latency",
+    ["tool"],
+    buckets=LATENCY_BUCKETS,
+)
+CACHE_REQUESTS = Counter(
+    "enterprise_brain_cache_requests_total",
+    "Cache lookups by cache and result",
+    ["cache", "result"],
+)
+INGEST_CHUNKS = Counter(
+    "enterprise_brain_ingest_chunks_total",
+    "Chunks embedded and written to the vector store by ingest",
+)
+ERRORS = Counter(
+    "enterprise_brain_errors_total",
+    "Errors by stage",
+    ["stage"],
+)
+
+
+def observe_latency(stage: str, seconds: float):
+    STAGE_LATENCY.labels(stage).observe(seconds)
+
+def record_error(stage: str):
+    ERRORS.labels(stage).inc()
+
+def record_cache(cache: str, hit: bool, count: int = 1):
+    if count:
+        CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc(count)
+
+@contextmanager
+def timed(stage: str):
+    """记录代码块耗时; 抛出异常时同时计入该阶段的错误数"""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        record_error(stage)
+        raise
+    finally:
+        observe_latency(stage, time.perf_counter() - started)
+
+def render_metrics():
+    """Returns: (Prometheus 文本格式的内容, content type)"""
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+class StageMetricsHandler(BaseCallbackHandler):
+    """
+    LangChain 回调: 记录 LLM 调用 (首 token / 完整耗时) 与工具执行耗时
+    挂在 Agent 的 LLM 和工具上, 同步与异步调用都会触发; 回调里只做计时, 直接在调用线程中执行
+    """
+    run_inline = True
+
+    def __init__(self):
+        self._llm_started: Dict[UUID, float] = {}
+        self._first_token_seen = set()
+        self._tools: Dict[UUID, tuple] = {}
+        self._lock = threading.Lock()
+
+    # --- LLM ---
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs: Any):
+        with self._lock:
+            self._llm_started[run_id] = time.perf_counter()
+
+    def on_llm_start(self, serialized, prompts, *, run_id: UUID, **kwargs: Any):
+        with self._lock:
+            self._llm_started[run_id] = time.perf_counter()
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs: Any):
+        with self._lock:
+            started = self._llm_started.get(run_id)
+            if started is None or run_id in self._first_token_seen:
+                return
+            self._first_token_seen.add(run_id)
+        observe_latency("llm_first_token", time.perf_counter() - started)
+
+    def _finish_llm(self, run_id: UUID) -> Optional[float]:
+        with self._lock:
+            self._first_token_seen.discard(run_id)
+            started = self._llm_started.pop(run_id, None)
+        return None if started is None else time.perf_counter() - started
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs: Any):
+        elapsed = self._finish_llm(run_id)
+        if elapsed is not None:
+            observe_latency("llm", elapsed)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._finish_llm(run_id)
+        record_error("llm")
+
+    # --- Tools ---
+    def on_tool_start(self, serialized, input_str: str, *, run_id: UUID, **kwargs: Any):
+        name = (serialized or {}).get("name") or kwargs.get("name") or "unknown"
+        with self._lock:
+            self._tools[run_id] = (name, time.perf_counter())
+
+    def _finish_tool(self, run_id: UUID) -> Optional[tuple]:
+        with self._lock:
+            entry = self._tools.pop(run_id, None)
+        if entry is not None:
+            TOOL_LATENCY.labels(entry[0]).observe(time.perf_counter() - entry[1])
+        return entry
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any):
+        self._finish_tool(run_id)
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        entry = self._finish_tool(run_id)
+        record_error(f"tool_{entry[0]}" if entry else "tool")
+
+
+stage_metrics_handler = StageMetricsHandler()
@@ -0,0 +1,113 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import List, Optional
+from langchain_core.documents import Document
+from src.config.settings import get_settings
+
+settings = get_settings()
+
+_reranker = None
+_reranker_lock = threading.Lock()
+
+
+class CrossEncoderReranker:
+    """
+    CPU cross-encoder 重排
+    - 所有 (query, chunk) 对在一次前向计算中打分 (batch_size = 候选数)
+    - 有延迟预算: 超时或出错时返回融合顺序的前 k 个, 不让重排拖慢回答
+    - 单线程执行: 上一次重排还没结束 (例如超时后仍在计算) 时直接跳过, 请求不会在模型前排队
+    """
+
+    def __init__(self, model_name: str = None, budget_ms: float = None, model=None):
+        self.model_name = model_name or settings.RERANK_MODEL
+        self.budget_ms = settings.RERANK_BUDGET_MS if budget_ms is None else budget_ms
+        self._model = model
+        self._model_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="reranker")
+        self._busy = threading.Semaphore(1)
+        self._stats_lock = threading.Lock()
+        self.reranked = 0
+        self.fallbacks = {"timeout": 0, "busy": 0, "error": 0}
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    from sentence_transformers import CrossEncoder
+                    os.environ["HF_ENDPOINT"] = settings.HF_ENDPOINT
+                    self._model = CrossEncoder(self.model_name, device="cpu")
+        return self._model
+
+    def warmup(self):
+        """加载模型并跑一次推理, 首个请求不承担加载开销"""
+        self.model.predict([("warmup", "warmup")])
+
+    def _score(self, query: str, docs: List[Document]):
+        try:
+            pairs = [(query, doc.page_content) for doc in docs]
+            return self.model.predict(pairs, batch_size=len(pairs), show_progress_bar=False)
+        finally:
+            self._busy.release()
+
+    def _fallback(self, reason: str, docs: List[Document], k: int) -> List[Document]:
+        with self._stats_lock:
+            self.fallbacks[reason] += 1
+        return docs[:k]
+
+    def rerank(self, query: str, docs: List[Document], k: int) -> List[Document]:
+        if len(docs) <= 1:
+            return docs[:k]
+        if not self._busy.acquire(blocking=False):
+            return self._fallback("busy", docs, k)
+
+        started = time.perf_counter()
+        try:
+            future = self._executor.submit(self._score, query, docs)
+        except Exception:
+            self._busy.release()
+            raise
+        try:
+            scores = future.result(timeout=self.budget_ms / 1000.0)
+        except FutureTimeout:
+            print(f"⚠️ Rerank exceeded {self.budget_ms:.0f}ms budget, using fused order")
+            return self._fallback("timeout", docs, k)
+        except Exception as e:
+            print(f"⚠️ Rerank failed, using fused order: {e}")
+            return self._fallback("error", docs, k)
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        ranked = sorted(zip(docs, scores), key=lambda item: float(item[1]), reverse=True)[:k]
+        with self._stats_lock:
+            self.reranked += 1
+        return [
+            Document(
+                id=doc.id,
+                page_content=doc.page_content,
+                metadata={**doc.metadata, "rerank_score": round(float(score), 4), "rerank_ms": round(elapsed_ms, 2)},
+            )
+            for doc, score in ranked
+        ]
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {"reranked": self.reranked, "fallbacks": dict(self.fallbacks)}
+
+
+def get_reranker() -> Optional[CrossEncoderReranker]:
+    """返回进程级共享的 reranker; RERANK_ENABLED=False 时返回 None"""
+    global _reranker
+    if not settings.RERANK_ENABLED:
+        return None
+    if _reranker is None:
+        with _reranker_lock:
+            if _reranker is None:
+                _reranker = CrossEncoderReranker()
+    return _reranker
+
+def warmup_reranker():
+    reranker = get_reranker()
+    if reranker is not None:
+        reranker.warmup()
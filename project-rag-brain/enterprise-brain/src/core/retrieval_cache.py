@@ -0,0 +1,95 @@
+import re
+import time
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+from langchain_core.documents import Document
+from src.config.settings import get_settings
+from src.core.metrics import record_cache
+
+settings = get_settings()
+
+_TRAILING_PUNCTUATION = "?？!！。.,，;；:： "
+
+def normalize_query(query: str) -> str:
+    """全角/半角统一、忽略大小写、合并空白、去掉句末标点: "VPN 怎么申请？" == "vpn  怎么申请" """
+    text = unicodedata.normalize("NFKC", query).casefold()
+    text = re.sub(r"\s+", " ", text).strip()
+    return text.rstrip(_TRAILING_PUNCTUATION)
+
+
+class RetrievalCache:
+    """
+    检索结果缓存: (规范化查询, 引擎, k, 索引代数) -> 排序后的 chunk (ID, 文本, 元数据)
+    - LRU: 超过 max_entries 时淘汰最久未使用的条目
+    - TTL: 条目超过 ttl_seconds 视为过期 (RAGFlow 模式下远端索引的变化无法通过代数感知)
+    - 入库成功会递增索引代数, 旧代的条目不会再被命中, 随 LRU 自然淘汰
+    """
+
+    def __init__(self, max_entries: int = None, ttl_seconds: float = None):
+        self.max_entries = settings.RETRIEVAL_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+        self.ttl_seconds = settings.RETRIEVAL_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self._entries = OrderedDict()  # key -> (created_at, ((id, text, metadata), ...))
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(query: str, engine: str, k: int, generation: int) -> Tuple:
+        return (normalize_query(query), engine, k, generation)
+
+    def get(self, key) -> Optional[List[Document]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] > self.ttl_seconds:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                record_cache("retrieval", hit=False)
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        record_cache("retrieval", hit=True)
+        return [Document(id=doc_id, page_content=text, metadata=dict(metadata)) for doc_id, text, metadata in entry[1]]
+
+    def put(self, key, docs: List[Document]):
+        # 空结果与降级结果 (某个检索分支失败) 可能只是暂时的, 不缓存
+        if not docs or any(doc.metadata.get("partial") for doc in docs):
+            return
+        frozen = tuple((doc.id, doc.page_content, dict(doc.metadata)) for doc in docs)
+        with self._lock:
+            self._entries[key] = (time.monotonic(), frozen)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+_retrieval_cache = None
+_retrieval_cache_lock = threading.Lock()
+
+def get_retrieval_cache() -> Optional[RetrievalCache]:
+    """返回进程级共享的检索缓存; RETRIEVAL_CACHE_ENABLED=False 时返回 None"""
+    global _retrieval_cache
+    if not settings.RETRIEVAL_CACHE_ENABLED:
+        return None
+    if _retrieval_cache is None:
+        with _retrieval_cache_lock:
+            if _retrieval_cache is None:
+                _retrieval_cache = RetrievalCache()
+    return _retrieval_cache
@@ -1,36 +1,44 @@
 from langchain_core.retrievers import BaseRetriever
-from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
 from langchain_core.documents import Document
 from typing import List
 from src.config.settings import get_settings
 from src.core.db import DBFactory
 from src.core.kb_interface import get_kb_client, RAGFlowKnowledgeBase
+from src.core.lexical_index import LexicalIndex, LexicalRetriever
+from src.core.hybrid_retriever import HybridRetriever
+from src.core.reranker import get_reranker
+from src.core.metrics import timed
 
 # Local mode imports
 import os
 import glob
-from langchain_community.retrievers import BM25Retriever
-from langchain.retrievers import EnsembleRetriever
+from itertools import groupby
 from langchain_community.document_loaders import TextLoader, PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
 settings = get_settings()
 
 _bm25_retriever_cache = None
+# Bumped by ingest after every successful sync; caches keyed on it never serve stale data.
+_index_generation = 0
 
 # --- Local Helper Functions ---
 def load_all_docs():
-    """Load and split all documents from the data directory for BM25 (Local Mode)."""
-    patterns = ["**/*.md", "**/*.txt", "**/*.pdf"]
-    documents = []
-    
+    """
+    Load and split the documents in the data directory for BM25 (Local Mode).
+    Yields chunks file by file, so only one file's pages are in memory at a time;
+    chunks of the same source are always yielded together.
+    """
     if not os.path.exists(settings.DATA_DIR):
-        return []
+        return
 
+    patterns = ["**/*.md", "**/*.txt", "**/*.pdf"]
     files = []
     for p in patterns:
         files.extend(glob.glob(os.path.join(settings.DATA_DIR, p), recursive=True))
 
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
     for f in files:
         try:
             ext = os.path.splitext(f)[1].lower()
@@ -38,12 +46,72 @@ def load_all_docs():
                 loader = PyPDFLoader(f)
             else:
                 loader = TextLoader(f, encoding='utf-8')
-            documents.extend(loader.load())
+            documents = loader.load()
         except Exception as e:
             print(f"Error loading {f} for BM25: {e}")
+            continue
+        yield from text_splitter.split_documents(documents)
 
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    return text_splitter.split_documents(documents)
+def load_stored_chunks(page_size: int = 1000):
+    """
+    Read the chunks ingest already persisted in Chroma, grouped by source:
+    {source: {"hash": str, "ids": [...], "docs": [Document]}}.
+    Chunks written before ingest assigned chunk IDs get their ID backfilled into metadata.
+    """
+    collection = DBFactory.get_collection()
+    by_source = {}
+    offset = 0
+    while True:
+        page = collection.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+        ids = page["ids"]
+        if not ids:
+            break
+
+        backfill_ids, backfill_metas = [], []
+        for chunk_id, text, meta in zip(ids, page["documents"], page["metadatas"]):
+            meta = meta or {}
+            if meta.get("chunk_id") != chunk_id:
+                meta = {**meta, "chunk_id": chunk_id}
+                backfill_ids.append(chunk_id)
+                backfill_metas.append(meta)
+            source = os.path.normpath(meta.get("source", ""))
+            entry = by_source.setdefault(source, {"hash": meta.get("file_hash", ""), "ids": [], "docs": []})
+            entry["ids"].append(chunk_id)
+            entry["docs"].append(Document(id=chunk_id, page_content=text or "", metadata=meta))
+
+        if backfill_ids:
+            collection.update(ids=backfill_ids, metadatas=backfill_metas)
+        offset += len(ids)
+    return by_source
+
+def load_lexical_index() -> LexicalIndex:
+    """
+    Load the on-disk BM25 index. Only the very first start (no index file yet)
+    pays for a bootstrap; afterwards ingest keeps it updated per file.
+    Depending on LEXICAL_INDEX_SOURCE the bootstrap reuses the chunks stored in
+    Chroma ("chunks") or re-parses the data directory ("files").
+    Raises if the chunks cannot be read from Chroma: an empty index built from a
+    failed bootstrap must neither be saved nor treated as "no documents".
+    """
+    origin = settings.LEXICAL_INDEX_SOURCE
+    index = LexicalIndex.load(settings.BM25_INDEX_PATH)
+    if index is not None and index.origin == origin:
+        return index
+
+    index = LexicalIndex(settings.BM25_INDEX_PATH, origin=origin)
+    if origin == "chunks":
+        print("🏗️ Building BM25 index from stored chunks...")
+        # Chroma 不可用时直接抛出: 不落盘, 预热会按 WARMUP_RETRY_SECONDS 重试
+        stored = load_stored_chunks()
+        for source, entry in stored.items():
+            index.upsert_source(source, entry["hash"], entry["docs"], ids=entry["ids"])
+    else:
+        print("🏗️ Building BM25 index from data directory...")
+        # load_all_docs 按文件逐个产出, 同一文件的 chunk 相邻, 逐个文件写入索引
+        for source, docs in groupby(load_all_docs(), key=lambda d: os.path.normpath(d.metadata.get("source", ""))):
+            index.upsert_source(source, "", list(docs))
+    index.save()
+    return index
 
 # --- Wrapper for Unified Interface ---
 class UnifiedRetriever(BaseRetriever):
@@ -51,6 +119,21 @@ class UnifiedRetriever(BaseRetriever):
     A LangChain-compatible retriever that delegates to either 
     Local KB or RAGFlow based on settings.
     """
+    k: int = 5
+
+    @staticmethod
+    def _to_documents(results) -> List[Document]:
+        documents = []
+        for item in results:
+            documents.append(Document(
+                page_content=item.get("content", ""),
+                metadata={
+                    "source": item.get("source"),
+                    "score": item.get("score")
+                }
+            ))
+        return documents
+
     def _get_relevant_documents(
         self, query: str, *, run_manager: CallbackManagerForRetrieverRun = None
     ) -> List[Document]:
@@ -59,52 +142,75 @@ class UnifiedRetriever(BaseRetriever):
         
         # If using RAGFlow, call it directly
         if isinstance(kb, RAGFlowKnowledgeBase):
-            results = kb.retrieve(query, k=5)
-            documents = []
-            for item in results:
-                documents.append(Document(
-                    page_content=item.get("content", ""),
-                    metadata={
-                        "source": item.get("source"),
-                        "score": item.get("score")
-                    }
-                ))
-            return documents
+            with timed("ragflow_retrieval"):
+                return self._to_documents(kb.retrieve(query, k=self.k))
             
         # If using Local, we shouldn't really be here via this wrapper for efficiency, 
         # but as a fallback/simplification:
         return []
 
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun = None
+    ) -> List[Document]:
+        kb = get_kb_client()
+        if isinstance(kb, RAGFlowKnowledgeBase):
+            with timed("ragflow_retrieval"):
+                return self._to_documents(await kb.aretrieve(query, k=self.k))
+        return []
+
 def get_retriever(embeddings):
     """
     Factory function to return the correct LangChain retriever.
     """
-    global _bm25_retriever_cache
-    
     # 1. Check Mode
     if settings.RAG_ENGINE == "ragflow":
         return UnifiedRetriever()
 
-    # 2. Local Mode: Build Ensemble (Vector + BM25)
+    # 2. Local Mode: BM25 + Vector, 两个分支并行检索后用 RRF 融合
     vector_store = DBFactory.get_vector_store(embeddings)
-    vector_retriever = vector_store.as_retriever(search_kwargs={"k": 3})
     
-    if _bm25_retriever_cache is None:
-        docs = load_all_docs()
-        if docs:
-            _bm25_retriever_cache = BM25Retriever.from_documents(docs)
-            _bm25_retriever_cache.k = 3
-        else:
-            return vector_retriever
-
-    ensemble_retriever = EnsembleRetriever(
-        retrievers=[_bm25_retriever_cache, vector_retriever],
-        weights=[0.4, 0.6]
+    bm25_retriever = warm_bm25_cache()
+    if bm25_retriever is None:
+        return vector_store.as_retriever(search_kwargs={"k": settings.RETRIEVAL_TOP_K})
+
+    return HybridRetriever(
+        lexical_index=bm25_retriever.index,
+        vector_store=vector_store,
+        k=settings.RETRIEVAL_TOP_K,
+        candidate_k=settings.RETRIEVAL_CANDIDATE_K,
+        rrf_k=settings.RETRIEVAL_RRF_K,
+        lexical_weight=settings.RETRIEVAL_LEXICAL_WEIGHT,
+        vector_weight=settings.RETRIEVAL_VECTOR_WEIGHT,
+        reranker=get_reranker(),
+        rerank_candidates=settings.RERANK_CANDIDATES,
     )
-    
-    return ensemble_retriever
+
+def warm_bm25_cache():
+    """
+    Load the BM25 retriever if it is cold. Called by the startup warmup
+    so the first chat request does not pay for loading the index.
+    Returns None when there are no documents to index; raises when the
+    index cannot be built (e.g. Chroma is unreachable during the bootstrap).
+    """
+    global _bm25_retriever_cache
+    if _bm25_retriever_cache is None:
+        with timed("bm25_index_load"):
+            index = load_lexical_index()
+        if len(index):
+            _bm25_retriever_cache = LexicalRetriever(index=index, k=settings.RETRIEVAL_TOP_K)
+    return _bm25_retriever_cache
 
 def reset_bm25_cache():
-    """Call this after ingestion to force reload BM25 index."""
+    """Call this after ingestion to force reload BM25 index from disk."""
     global _bm25_retriever_cache
     _bm25_retriever_cache = None
+
+def get_index_generation() -> int:
+    return _index_generation
+
+def bump_index_generation():
+    """Call this after a successful sync: resets BM25 and invalidates index-dependent caches."""
+    global _index_generation
+    reset_bm25_cache()
+    _index_generation += 1
+    return _index_generation
@@ -0,0 +1,181 @@
+import json
+import threading
+import time
+import uuid
+from typing import List, Optional, Tuple
+from langchain_core.messages import AIMessage, HumanMessage
+from src.config.settings import get_settings
+from src.core.db import DBFactory
+from src.core.llm import get_embeddings
+from src.core.metrics import record_cache, timed
+
+settings = get_settings()
+
+# 超过容量后淘汰到上限的 90%: 淘汰需要扫描全部条目, 留出余量后约每 10% 容量的写入才扫描一次
+EVICT_LOW_WATERMARK = 0.9
+
+class SemanticCache:
+    """
+    语义回答缓存 (基于 CACHE_COLLECTION_NAME 集合, cosine 距离)
+    - 命中: 新问题与历史问题的相似度 >= SEMANTIC_CACHE_THRESHOLD 且未过期, 直接返回历史回答与来源
+    - 失效: 入库改动了回答引用的文档时删除对应条目; 超过 TTL 或容量上限时淘汰最旧的条目
+    只用于非 Pro 模式 (纯知识库问答), Agent 模式的回答依赖联网/代码执行, 不缓存。
+    """
+
+    def __init__(self, embeddings=None):
+        self._embeddings = embeddings
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # 集合条目数的进程内估计, 首次写入时 count() 一次, 之后增量维护, 每次淘汰时校正
+        self._size: Optional[int] = None
+
+    @property
+    def embeddings(self):
+        # 失效操作不需要模型, 按需获取共享的 Embedding 实例
+        if self._embeddings is None:
+            self._embeddings = get_embeddings()
+        return self._embeddings
+
+    def _collection(self):
+        return DBFactory.get_cache_collection(self._embeddings)
+
+    def lookup(self, question: str) -> Tuple[Optional[dict], List[float]]:
+        """
+        Returns: (entry or None, question embedding)
+        entry: {"response": str, "sources": [str], "similarity": float}
+        """
+        with timed("embedding"):
+            embedding = self.embeddings.embed_query(question)
+        with timed("semantic_cache_search"):
+            result = self._collection().query(
+                query_embeddings=[embedding],
+                n_results=1,
+                include=["metadatas", "distances"],
+            )
+        ids = result["ids"][0] if result["ids"] else []
+        if ids:
+            meta = result["metadatas"][0][0]
+            similarity = 1.0 - result["distances"][0][0]
+            expired = time.time() - meta.get("created_at", 0) > settings.SEMANTIC_CACHE_TTL_SECONDS
+            if expired:
+                self._collection().delete(ids=[ids[0]])
+                with self._lock:
+                    if self._size is not None:
+                        self._size -= 1
+            elif similarity >= settings.SEMANTIC_CACHE_THRESHOLD:
+                with self._lock:
+                    self.hits += 1
+                record_cache("semantic", hit=True)
+                return {
+                    "response": meta["response"],
+                    "sources": json.loads(meta.get("sources", "[]")),
+                    "similarity": similarity,
+                }, embedding
+        with self._lock:
+            self.misses += 1
+        record_cache("semantic", hit=False)
+        return None, embedding
+
+    def store(self, question: str, embedding: List[float], response: str, sources: List[str]):
+        collection = self._collection()
+        collection.add(
+            ids=[uuid.uuid4().hex],
+            embeddings=[embedding],
+            documents=[question],
+            metadatas=[{
+                "response": response,
+                "sources": json.dumps(sorted(sources), ensure_ascii=False),
+                "created_at": time.time(),
+            }],
+        )
+        with self._lock:
+            self._size = collection.count() if self._size is None else self._size + 1
+            full = self._size > settings.SEMANTIC_CACHE_MAX_ENTRIES
+        if full:
+            self.evict(collection, target=int(settings.SEMANTIC_CACHE_MAX_ENTRIES * EVICT_LOW_WATERMARK))
+
+    def evict(self, collection=None, target: int = None):
+        """删除过期条目, 并按创建时间淘汰最旧的条目直到条目数不超过 target (默认容量上限)"""
+        collection = collection or self._collection()
+        target = settings.SEMANTIC_CACHE_MAX_ENTRIES if target is None else target
+        entries = collection.get(include=["metadatas"])
+        now = time.time()
+        ordered = sorted(zip(entries["ids"], entries["metadatas"]), key=lambda e: e[1].get("created_at", 0))
+        expired = [i for i, m in ordered if now - m.get("created_at", 0) > settings.SEMANTIC_CACHE_TTL_SECONDS]
+        expired_set = set(expired)
+        live = [i for i, _ in ordered if i not in expired_set]
+        overflow = live[:max(0, len(live) - target)]
+        to_delete = expired + overflow
+        if to_delete:
+            collection.delete(ids=to_delete)
+        with self._lock:
+            self._size = len(live) - len(overflow)
+        return len(to_delete)
+
+    def invalidate_sources(self, filenames: List[str]) -> int:
+        """
+        删除引用了这些文件的缓存条目。
+        没有引用来源的条目 (如“知识库中没有相关信息”) 在知识库有任何变动时也一并删除。
+        """
+        filenames = set(filenames)
+        collection = self._collection()
+        entries = collection.get(include=["metadatas"])
+        stale = []
+        for entry_id, meta in zip(entries["ids"], entries["metadatas"]):
+            cited = set(json.loads(meta.get("sources", "[]")))
+            if not cited or cited & filenames:
+                stale.append(entry_id)
+        if stale:
+            collection.delete(ids=stale)
+        with self._lock:
+            self._size = len(entries["ids"]) - len(stale)
+        return len(stale)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+_semantic_cache = None
+_semantic_cache_lock = threading.Lock()
+
+def get_semantic_cache() -> Optional[SemanticCache]:
+    """返回进程级共享的语义缓存; SEMANTIC_CACHE_ENABLED=False 时返回 None"""
+    global _semantic_cache
+    if not settings.SEMANTIC_CACHE_ENABLED:
+        return None
+    if _semantic_cache is None:
+        with _semantic_cache_lock:
+            if _semantic_cache is None:
+                _semantic_cache = SemanticCache()
+    return _semantic_cache
+
+def safe_lookup(cache: SemanticCache, question: str):
+    """缓存故障不影响问答: 出错时视为未命中"""
+    try:
+        return cache.lookup(question)
+    except Exception as e:
+        print(f"⚠️ Semantic cache lookup failed: {e}")
+        return None, None
+
+def safe_store(cache: SemanticCache, question: str, embedding, response: str, sources: List[str]):
+    if embedding is None or not response:
+        return
+    try:
+        cache.store(question, embedding, response, sources)
+    except Exception as e:
+        print(f"⚠️ Semantic cache store failed: {e}")
+
+async def is_new_thread(graph, config) -> bool:
+    """只在会话的第一轮使用缓存: 追问依赖上下文, 相似的句子不代表相同的问题"""
+    state = await graph.aget_state(config)
+    return not state.values.get("messages")
+
+async def record_cached_turn(graph, config, question: str, response: str):
+    """把命中缓存的这一轮写入会话记忆, 后续追问仍有上下文"""
+    await graph.aupdate_state(
+        config,
+        {"messages": [HumanMessage(content=question), AIMessage(content=response)]},
+        as_node="agent",
+    )
@@ -1,25 +1,61 @@
-from langchain.tools import tool
+from langchain_core.tools import StructuredTool
 from langchain_core.documents import Document
 from typing import List
+from src.config.settings import get_settings
+from src.core.retriever import get_index_generation
+from src.core.retrieval_cache import get_retrieval_cache
+from src.core.context_packer import pack_context
+
+settings = get_settings()
+
+def _header(doc: Document) -> str:
+    source = doc.metadata.get("filename") or doc.metadata.get("source") or "Unknown"
+    return f"Source: {source}\nContent: "
 
 def format_docs(docs: List[Document]) -> str:
+    # 去重并合并重叠的 chunk, 按检索顺序裁剪到 CONTEXT_TOKEN_BUDGET
     formatted = []
-    for doc in docs:
-        source = doc.metadata.get("filename") or doc.metadata.get("source") or "Unknown"
+    for doc in pack_context(docs, header=_header):
         content = doc.page_content.replace("\n", " ")
-        formatted.append(f"Source: {source}\nContent: {content}")
+        formatted.append(f"{_header(doc)}{content}")
     return "\n\n".join(formatted)
 
+def _cache_key(cache, retriever, query: str):
+    k = getattr(retriever, "k", None) or settings.RETRIEVAL_TOP_K
+    return cache.make_key(query, settings.RAG_ENGINE, k, get_index_generation())
+
 def get_retrieval_tool(retriever):
-    @tool(name="knowledge_base")
     def retrieve_docs(query: str) -> str:
-        """
-        搜索企业内部知识库。关于公司战略、SOP、技术文档的问题优先使用此工具。
-        返回结果包含文档来源和内容片段。
-        """
-        docs = retriever.invoke(query)
+        cache = get_retrieval_cache()
+        key = _cache_key(cache, retriever, query) if cache is not None else None
+        docs = cache.get(key) if cache is not None else None
+        if docs is None:
+            docs = retriever.invoke(query)
+            if cache is not None:
+                cache.put(key, docs)
+        if not docs:
+            return "No relevant documents found."
+        return format_docs(docs)
+
+    async def aretrieve_docs(query: str) -> str:
+        # Async path used by graph.ainvoke / astream_events: never blocks the event loop
+        cache = get_retrieval_cache()
+        key = _cache_key(cache, retriever, query) if cache is not None else None
+        docs = cache.get(key) if cache is not None else None
+        if docs is None:
+            docs = await retriever.ainvoke(query)
+            if cache is not None:
+                cache.put(key, docs)
         if not docs:
             return "No relevant documents found."
         return format_docs(docs)
-    
-    return retrieve_docs
+
+    return StructuredTool.from_function(
+        func=retrieve_docs,
+        coroutine=aretrieve_docs,
+        name="knowledge_base",
+        description=(
+            "搜索企业内部知识库。关于公司战略、SOP、技术文档的问题优先使用此工具。"
+            "返回结果包含文档来源和内容片段。"
+        ),
+    )
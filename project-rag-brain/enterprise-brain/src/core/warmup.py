@@ -0,0 +1,78 @@
+import threading
+import time
+from src.config.settings import get_settings
+from src.core.db import DBFactory
+from src.core.llm import warmup_embeddings
+from src.core.retriever import warm_bm25_cache
+from src.core.reranker import warmup_reranker
+
+settings = get_settings()
+
+# component -> warmed up?
+_status = {"embeddings": False, "bm25": False, "chroma": False, "reranker": False}
+_errors = {}
+_lock = threading.Lock()
+_thread = None
+
+def _warm_chroma():
+    DBFactory.get_client().heartbeat()
+    DBFactory.get_collection()
+
+_STEPS = [
+    ("embeddings", warmup_embeddings),
+    ("chroma", _warm_chroma),
+    ("bm25", warm_bm25_cache),
+    ("reranker", warmup_reranker),
+]
+
+def run_warmup():
+    """
+    依次预热各组件, 失败的组件会按 WARMUP_RETRY_SECONDS 间隔重试, 直到全部就绪
+    """
+    # RAGFlow 模式下检索由远端负责, 本地索引无需预热
+    if settings.RAG_ENGINE == "ragflow":
+        with _lock:
+            _status["bm25"] = True
+            _status["chroma"] = True
+    # 未启用重排时无需加载 cross-encoder
+    if settings.RAG_ENGINE == "ragflow" or not settings.RERANK_ENABLED:
+        with _lock:
+            _status["reranker"] = True
+
+    while not is_ready():
+        for name, step in _STEPS:
+            if _status[name]:
+                continue
+            try:
+                started = time.perf_counter()
+                step()
+                with _lock:
+                    _status[name] = True
+                    _errors.pop(name, None)
+                print(f"🔥 Warmed up {name} in {time.perf_counter() - started:.2f}s")
+            except Exception as e:
+                with _lock:
+                    _errors[name] = str(e)
+                print(f"⚠️ Warmup of {name} failed: {e}")
+        if not is_ready():
+            time.sleep(settings.WARMUP_RETRY_SECONDS)
+
+def start_warmup():
+    """在后台线程中启动预热, 不阻塞服务启动 (/health 立即可用)"""
+    global _thread
+    if _thread is None or not _thread.is_alive():
+        _thread = threading.Thread(target=run_warmup, name="warmup", daemon=True)
+        _thread.start()
+    return _thread
+
+def is_ready() -> bool:
+    with _lock:
+        return all(_status.values())
+
+def get_readiness():
+    with _lock:
+        return {
+            "ready": all(_status.values()),
+            "components": dict(_status),
+            "errors": dict(_errors),
+        }
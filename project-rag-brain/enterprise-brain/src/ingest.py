@@ -15,12 +15,12 @@ DATA_DIR = "data"
 COLLECTION_NAME = "enterprise_docs"
 
 def calculate_file_hash(filepath):
-    """计算文件的 MD5 哈希值"""
+    """流式计算文件的 MD5 哈希值 (按 1MB 分块读取)"""
     hasher = hashlib.md5()
     try:
         with open(filepath, 'rb') as f:
-            buf = f.read()
-            hasher.update(buf)
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                hasher.update(block)
         return hasher.hexdigest()
     except Exception as e:
         print(f"⚠️ Error reading {filepath}: {e}")
@@ -70,8 +70,8 @@ def ingest_docs():
     print(f"👀 DB contains chunks from {len(db_state)} files.")
 
     # --- 2. 获取本地文件状态 ---
-    local_files = glob.glob(os.path.join(DATA_DIR, "**/*.md"), recursive=True) +
-                  glob.glob(os.path.join(DATA_DIR, "**/*.txt"), recursive=True)
+    local_files = (glob.glob(os.path.join(DATA_DIR, "**/*.md"), recursive=True) +
+                   glob.glob(os.path.join(DATA_DIR, "**/*.txt"), recursive=True))
     
     local_state = {} # path -> hash
     for f in local_files:
@@ -0,0 +1,7 @@
+import os
+import tempfile
+
+# Settings requires an API key; unit tests never call the real LLM.
+os.environ.setdefault("DEEPSEEK_API_KEY", "test-key")
+# Keep on-disk index state (BM25 index etc.) out of the working tree.
+os.environ.setdefault("INDEX_DIR", tempfile.mkdtemp(prefix="eb-index-"))
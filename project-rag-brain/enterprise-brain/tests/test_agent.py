@@ -0,0 +1,68 @@
+import sys
+import os
+
+# Add src to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.core.agent import get_agent, invalidate_agents
+from src.core.db import DBFactory
+from src.core.retriever import bump_index_generation
+from unittest.mock import MagicMock, patch
+
+@patch("src.core.retriever.load_all_docs", return_value=[])
+@patch("src.core.agent.build_agent")
+def test_agent_registry_reuses_graph(mock_build_agent, mock_load_docs):
+    mock_build_agent.side_effect = lambda *args, **kwargs: (MagicMock(), "System Prompt")
+    invalidate_agents()
+    checkpointer = MagicMock()
+
+    first = get_agent(pro_mode=False, embeddings=MagicMock(), checkpointer=checkpointer)
+    second = get_agent(pro_mode=False, embeddings=MagicMock(), checkpointer=checkpointer)
+    pro = get_agent(pro_mode=True, embeddings=MagicMock(), checkpointer=checkpointer)
+
+    assert first is second
+    assert pro is not first
+    assert mock_build_agent.call_count == 2
+
+@patch("src.core.retriever.load_all_docs", return_value=[])
+@patch("src.core.agent.build_agent")
+def test_agent_registry_invalidated_by_ingest(mock_build_agent, mock_load_docs):
+    mock_build_agent.side_effect = lambda *args, **kwargs: (MagicMock(), "System Prompt")
+    invalidate_agents()
+    checkpointer = MagicMock()
+
+    before = get_agent(pro_mode=False, embeddings=MagicMock(), checkpointer=checkpointer)
+    bump_index_generation()
+    after = get_agent(pro_mode=False, embeddings=MagicMock(), checkpointer=checkpointer)
+
+    assert before is not after
+    assert mock_build_agent.call_count == 2
+
+@patch("src.core.retriever.load_all_docs", return_value=[])
+@patch("src.core.agent.build_agent")
+def test_agent_registry_invalidated_by_chroma_reconnect(mock_build_agent, mock_load_docs):
+    mock_build_agent.side_effect = lambda *args, **kwargs: (MagicMock(), "System Prompt")
+    invalidate_agents()
+    checkpointer = MagicMock()
+
+    before = get_agent(pro_mode=False, embeddings=MagicMock(), checkpointer=checkpointer)
+    # 检索失败后丢弃连接: 旧 Agent 里的 VectorStore 绑定的是已失效的 client
+    DBFactory.invalidate()
+    after = get_agent(pro_mode=False, embeddings=MagicMock(), checkpointer=checkpointer)
+
+    assert before is not after
+    assert mock_build_agent.call_count == 2
+
+@patch("src.core.retriever.load_all_docs", return_value=[])
+@patch("src.core.agent.build_agent")
+def test_agents_bound_to_a_replaced_checkpointer_are_evicted(mock_build_agent, mock_load_docs):
+    from src.core import agent as agent_module
+    mock_build_agent.side_effect = lambda *args, **kwargs: (MagicMock(), "System Prompt")
+    invalidate_agents()
+    old_checkpointer, new_checkpointer = MagicMock(), MagicMock()
+
+    get_agent(pro_mode=False, embeddings=MagicMock(), checkpointer=old_checkpointer)
+    get_agent(pro_mode=True, embeddings=MagicMock(), checkpointer=old_checkpointer)
+    get_agent(pro_mode=False, embeddings=MagicMock(), checkpointer=new_checkpointer)
+
+    assert [k[3] for k in agent_module._agent_registry] == [id(new_checkpointer)]
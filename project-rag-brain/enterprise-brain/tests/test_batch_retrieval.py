@@ -0,0 +1,47 @@
+import sys
+import os
+
+# Add src to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.documents import Document
+from src.core.batch_retrieval import embed_queries, hybrid_search_batch
+from src.core.lexical_index import LexicalIndex, LexicalRetriever
+from unittest.mock import MagicMock, patch
+
+def test_embed_queries_uses_one_batched_call():
+    embeddings = MagicMock(spec=["embed_documents", "embed_query"])
+    embeddings.embed_documents.return_value = [[0.1], [0.2]]
+    assert embed_queries(embeddings, ["a", "b"]) == [[0.1], [0.2]]
+    embeddings.embed_documents.assert_called_once_with(["a", "b"])
+    embeddings.embed_query.assert_not_called()
+
+def test_embed_queries_respects_query_specific_encoding():
+    embeddings = MagicMock()
+    embeddings.query_encode_kwargs = {"prompt": "query: "}
+    embeddings.embed_query.side_effect = lambda q: [len(q)]
+    assert embed_queries(embeddings, ["a", "bb"]) == [[1], [2]]
+
+@patch("src.core.batch_retrieval.warm_bm25_cache")
+@patch("src.core.batch_retrieval.DBFactory")
+def test_hybrid_search_batch_issues_one_chroma_query(mock_db_factory, mock_warm_bm25, tmp_path):
+    index = LexicalIndex(str(tmp_path / "bm25.pkl"), origin="chunks")
+    index.upsert_source("data/vpn.md", "h", [Document(page_content="vpn access"), Document(page_content="leave policy")], ids=["c-1", "c-2"])
+    mock_warm_bm25.return_value = LexicalRetriever(index=index)
+    collection = mock_db_factory.get_collection.return_value
+    collection.query.return_value = {
+        "ids": [["c-1"], ["c-2"]],
+        "documents": [["vpn access"], ["leave policy"]],
+        "metadatas": [[{"chunk_id": "c-1", "source": "data/vpn.md"}], [{"chunk_id": "c-2", "source": "data/vpn.md"}]],
+        "distances": [[0.1], [0.2]],
+    }
+    embeddings = MagicMock(spec=["embed_documents", "embed_query"])
+    embeddings.embed_documents.return_value = [[0.1], [0.2]]
+
+    results = hybrid_search_batch(embeddings, ["vpn", "leave"], k=2)
+
+    collection.query.assert_called_once()
+    assert collection.query.call_args[1]["query_embeddings"] == [[0.1], [0.2]]
+    assert [d.metadata["chunk_id"] for d in results[0]] == ["c-1"]
+    assert [d.metadata["chunk_id"] for d in results[1]] == ["c-2"]
+    assert results[0][0].metadata["lexical_rank"] == results[0][0].metadata["vector_rank"] == 1
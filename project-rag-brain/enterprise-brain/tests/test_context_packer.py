@@ -0,0 +1,67 @@
+import sys
+import os
+
+# Add src to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.documents import Document
+from src.core.context_packer import estimate_tokens, merge_chunks, pack_context
+from src.core.tools.retrieval import format_docs
+
+TEXT = " ".join(f"sentence{i} about the VPN access policy." for i in range(60))
+
+def _chunk(source, seq, text):
+    return Document(page_content=text, metadata={"source": source, "chunk_id": f"src-{source}-abc-{seq}"})
+
+def test_estimate_tokens_counts_cjk_per_character():
+    assert estimate_tokens("远程办公政策") == 6
+    assert estimate_tokens("a" * 40) == 10
+
+def test_duplicate_chunk_ids_are_dropped():
+    doc = _chunk("a.md", 0, "VPN 申请流程")
+    merged = merge_chunks([doc, doc, _chunk("b.md", 0, "请假政策")])
+    assert [d.page_content for _, d in merged] == ["VPN 申请流程", "请假政策"]
+
+def test_overlapping_chunks_from_same_source_are_merged():
+    # 模拟 chunk_size=400, chunk_overlap=100 的切分结果, 检索顺序与文件顺序不同
+    first, second = TEXT[:400], TEXT[300:700]
+    docs = [_chunk("a.md", 1, second), _chunk("b.md", 0, "unrelated"), _chunk("a.md", 0, first)]
+
+    merged = merge_chunks(docs)
+
+    assert len(merged) == 2
+    rank, doc = merged[0]
+    assert rank == 0
+    assert doc.page_content == TEXT[:700]
+    assert doc.metadata["merged_chunk_ids"] == ["src-a.md-abc-0", "src-a.md-abc-1"]
+
+def test_non_adjacent_chunks_stay_separate():
+    docs = [_chunk("a.md", 0, "VPN 申请流程"), _chunk("a.md", 5, "报销需要发票")]
+    assert len(merge_chunks(docs)) == 2
+
+def test_adjacent_chunks_without_overlap_are_joined():
+    merged = merge_chunks([_chunk("a.md", 3, "第二段"), _chunk("a.md", 2, "第一段")])
+    assert [d.page_content for _, d in merged] == ["第一段 第二段"]
+
+def test_budget_keeps_highest_ranked_blocks():
+    docs = [_chunk("a.md", 0, "甲" * 300), _chunk("b.md", 0, "乙" * 300), _chunk("c.md", 0, "丙" * 300)]
+
+    packed = pack_context(docs, budget=700)
+
+    assert [d.metadata["source"] for d in packed] == ["a.md", "b.md", "c.md"]
+    assert packed[2].metadata["truncated"] is True
+    assert sum(estimate_tokens(d.page_content) for d in packed) <= 700
+
+    packed = pack_context(docs, budget=620)
+    assert [d.metadata["source"] for d in packed] == ["a.md", "b.md"]  # 剩余预算太少, 不再截断塞入
+
+def test_first_block_is_truncated_rather_than_dropped():
+    packed = pack_context([_chunk("a.md", 0, "甲" * 300)], budget=100)
+    assert len(packed) == 1 and estimate_tokens(packed[0].page_content) <= 100
+
+def test_format_docs_dedupes_overlap(monkeypatch):
+    from src.core import context_packer
+    monkeypatch.setattr(context_packer.settings, "CONTEXT_TOKEN_BUDGET", 0)
+    first, second = TEXT[:400], TEXT[300:700]
+    output = format_docs([_chunk("a.md", 0, first), _chunk("a.md", 1, second), _chunk("a.md", 0, first)])
+    assert output == f"Source: a.md\nContent: {TEXT[:700]}"
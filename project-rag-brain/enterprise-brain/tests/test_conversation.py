@@ -0,0 +1,101 @@
+import sys
+import os
+import asyncio
+
+# Add src to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.runnables import RunnableLambda
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.prebuilt import create_react_agent
+from src.core.conversation import ConversationMemory, ConversationState, compact_tool_outputs, window_start
+from unittest.mock import MagicMock
+
+def _turn(i, tool_output="x" * 2000):
+    return [
+        HumanMessage(content=f"question {i}"),
+        AIMessage(content="", tool_calls=[{"name": "knowledge_base", "args": {"query": f"q{i}"}, "id": f"call-{i}"}]),
+        ToolMessage(content=tool_output, name="knowledge_base", tool_call_id=f"call-{i}"),
+        AIMessage(content=f"answer {i}"),
+    ]
+
+def test_window_starts_on_turn_boundary():
+    messages = _turn(0) + _turn(1) + _turn(2)
+    assert window_start(messages, 2) == 4
+    assert window_start(messages, 5) == 0
+    assert window_start(messages, 0) == 0
+
+def test_compact_keeps_current_turn_tool_output():
+    messages = _turn(0) + _turn(1)[:3]
+    compacted = compact_tool_outputs(messages, 100)
+    assert len(compacted[2].content) < 200
+    assert "truncated" in compacted[2].content
+    assert compacted[6].content == "x" * 2000
+    # The original state messages are not modified
+    assert messages[2].content == "x" * 2000
+
+def test_hook_summarizes_messages_leaving_the_window():
+    llm = MagicMock()
+    llm.invoke.return_value = AIMessage(content="用户问过 question 0 和 question 1")
+    memory = ConversationMemory(llm, window_turns=2, tool_output_chars=100, summarize=True)
+    messages = _turn(0) + _turn(1) + _turn(2) + [HumanMessage(content="question 3")]
+
+    update = memory({"messages": messages})
+
+    assert update["summarized_count"] == 8
+    assert update["summary"] == "用户问过 question 0 和 question 1"
+    window = update["llm_input_messages"]
+    assert isinstance(window[0], SystemMessage) and "question 0" in window[0].content
+    assert [m.content for m in window if isinstance(m, HumanMessage)] == ["question 2", "question 3"]
+    prompt = llm.invoke.call_args[0][0]
+    assert "question 1" in prompt and "question 2" not in prompt
+
+    # Already summarized messages are not sent to the summarizer again
+    llm.invoke.reset_mock()
+    update = memory({"messages": messages, "summary": update["summary"], "summarized_count": 8})
+    llm.invoke.assert_not_called()
+    assert "summary" not in update
+
+def test_hook_keeps_old_summary_when_summarizer_fails():
+    llm = MagicMock()
+    llm.invoke.side_effect = RuntimeError("llm down")
+    memory = ConversationMemory(llm, window_turns=1, summarize=True)
+    messages = _turn(0) + [HumanMessage(content="question 1")]
+
+    update = memory({"messages": messages, "summary": "old summary"})
+
+    assert "summarized_count" not in update
+    assert "old summary" in update["llm_input_messages"][0].content
+
+class _RecordingModel(GenericFakeChatModel):
+    calls: list = []
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _generate(self, messages, *args, **kwargs):
+        self.calls.append(messages)
+        return super()._generate(messages, *args, **kwargs)
+
+def test_prompt_size_is_bounded_across_turns():
+    llm = _RecordingModel(messages=iter(AIMessage(content=f"answer {i}") for i in range(100)))
+    summarizer = MagicMock()
+    summarizer.ainvoke.side_effect = lambda prompt: asyncio.sleep(0, result=AIMessage(content="summary"))
+    memory = ConversationMemory(summarizer, window_turns=2, summarize=True)
+    graph = create_react_agent(
+        llm, [], checkpointer=InMemorySaver(), state_schema=ConversationState,
+        pre_model_hook=RunnableLambda(memory, afunc=memory.acall),
+    )
+    config = {"configurable": {"thread_id": "long-session"}}
+
+    async def chat():
+        for i in range(8):
+            await graph.ainvoke({"messages": [HumanMessage(content=f"question {i}")]}, config)
+        return await graph.aget_state(config)
+
+    state = asyncio.run(chat())
+    assert len(state.values["messages"]) == 16  # full history is still checkpointed
+    prompt_sizes = [len(messages) for messages in llm.calls]
+    assert max(prompt_sizes[3:]) == prompt_sizes[-1] == 4  # summary + 1 previous turn + question
@@ -0,0 +1,84 @@
+import sys
+import os
+
+# Add src to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.core.db import DBFactory
+from unittest.mock import MagicMock, patch
+
+@patch("src.core.db.chromadb.HttpClient")
+def test_client_is_reused(mock_http_client):
+    DBFactory.invalidate()
+    mock_http_client.return_value = MagicMock()
+
+    first = DBFactory.get_client()
+    second = DBFactory.get_client()
+
+    assert first is second
+    assert mock_http_client.call_count == 1
+
+@patch("src.core.db.settings")
+@patch("src.core.db.chromadb.HttpClient")
+def test_reconnect_on_failed_health_check(mock_http_client, mock_settings):
+    mock_settings.CHROMA_HEALTHCHECK_SECONDS = 0
+    DBFactory.invalidate()
+    broken = MagicMock()
+    broken.heartbeat.side_effect = ConnectionError("chroma down")
+    healthy = MagicMock()
+    mock_http_client.side_effect = [broken, healthy]
+
+    assert DBFactory.get_client() is broken
+    assert DBFactory.get_client() is healthy
+    assert DBFactory.stats()["health_failures"] >= 1
+
+@patch("src.core.db.Chroma")
+@patch("src.core.db.chromadb.HttpClient")
+def test_vector_store_and_collection_cached(mock_http_client, mock_chroma):
+    DBFactory.invalidate()
+    client = MagicMock()
+    mock_http_client.return_value = client
+    embeddings = MagicMock()
+
+    assert DBFactory.get_vector_store(embeddings) is DBFactory.get_vector_store(embeddings)
+    assert DBFactory.get_collection() is DBFactory.get_collection()
+    assert mock_chroma.call_count == 1
+    assert client.get_or_create_collection.call_count == 1
+
+def test_persistent_mode_uses_in_process_client(tmp_path, monkeypatch):
+    from src.core import db
+    monkeypatch.setattr(db.settings, "CHROMA_MODE", "persistent")
+    monkeypatch.setattr(db.settings, "INDEX_DIR", str(tmp_path))
+    DBFactory.invalidate()
+    try:
+        collection = DBFactory.get_collection("bench_test")
+        collection.upsert(ids=["a"], embeddings=[[0.1, 0.2]], documents=["VPN"])
+
+        assert collection.count() == 1
+        assert os.path.isdir(os.path.join(str(tmp_path), "chroma"))
+    finally:
+        DBFactory.invalidate()
+
+def test_only_connection_errors_drop_the_connection(monkeypatch):
+    import httpx
+    from src.core import db
+    monkeypatch.setattr(db.settings, "CHROMA_MODE", "http")
+    DBFactory.invalidate()
+    generation = DBFactory.generation()
+
+    # 模型 / 参数错误: 重连无济于事, 不丢弃连接 (否则所有缓存的 Agent 都会重建)
+    assert DBFactory.invalidate_on(ValueError("Embedding dimension 384 does not match 768")) is False
+    assert DBFactory.invalidate_on(RuntimeError("CUDA out of memory")) is False
+    assert DBFactory.generation() == generation
+
+    try:
+        try:
+            raise httpx.ConnectError("connection refused")
+        except httpx.ConnectError as e:
+            raise RuntimeError("similarity search failed") from e
+    except RuntimeError as wrapped:
+        assert DBFactory.invalidate_on(wrapped) is True
+    assert DBFactory.generation() == generation + 1
+
+    monkeypatch.setattr(db.settings, "CHROMA_MODE", "persistent")
+    assert DBFactory.invalidate_on(httpx.ConnectError("n/a")) is False
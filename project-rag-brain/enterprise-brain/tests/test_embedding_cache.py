@@ -0,0 +1,83 @@
+import sys
+import os
+
+# Add src to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from types import SimpleNamespace
+from src.core import embedding_cache
+from src.core.embedding_cache import EmbeddingCache, CachedEmbeddings, get_cached_embeddings
+from unittest.mock import MagicMock, patch
+
+def test_cache_roundtrip_survives_reload(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "all-MiniLM-L6-v2")
+    cache.put_many(["alpha", "beta"], [[0.1, 0.2], [0.3, 0.4]])
+
+    reloaded = EmbeddingCache(str(tmp_path), "all-MiniLM-L6-v2")
+    vectors = reloaded.get_many(["beta", "gamma", "alpha"])
+
+    assert vectors[1] is None
+    assert abs(vectors[0][0] - 0.3) < 1e-6
+    assert abs(vectors[2][1] - 0.2) < 1e-6
+    assert reloaded.stats()["hits"] == 2
+
+def test_cache_is_scoped_per_model(tmp_path):
+    EmbeddingCache(str(tmp_path), "model-a").put_many(["alpha"], [[1.0, 0.0]])
+    assert EmbeddingCache(str(tmp_path), "model-b").get_many(["alpha"]) == [None]
+
+def test_cached_embeddings_only_embeds_new_chunks(tmp_path):
+    model = MagicMock()
+    model.embed_documents.side_effect = lambda texts: [[float(len(t)), 1.0] for t in texts]
+    embeddings = CachedEmbeddings(model, EmbeddingCache(str(tmp_path), "m"))
+
+    embeddings.embed_documents(["unchanged chunk", "old chunk"])
+    vectors = embeddings.embed_documents(["unchanged chunk", "edited chunk!"])
+
+    assert model.embed_documents.call_args_list[-1][0][0] == ["edited chunk!"]
+    assert vectors[0] == [15.0, 1.0]
+    assert vectors[1] == [13.0, 1.0]
+
+def test_caches_sharing_a_directory_never_reuse_row_numbers(tmp_path):
+    # 两个实例模拟 API 服务与命令行 ingest 两个进程
+    first = EmbeddingCache(str(tmp_path), "m")
+    second = EmbeddingCache(str(tmp_path), "m")
+    first.put_many(["alpha"], [[1.0, 0.0]])
+    second.put_many(["beta", "alpha"], [[0.0, 1.0], [9.0, 9.0]])
+    first.put_many(["gamma"], [[0.5, 0.5]])
+
+    reloaded = EmbeddingCache(str(tmp_path), "m")
+    assert reloaded.get_many(["alpha", "beta", "gamma"]) == [[1.0, 0.0], [0.0, 1.0], [0.5, 0.5]]
+    assert reloaded.n_rows == 3
+
+def test_partial_writes_from_a_crashed_process_are_truncated(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "m")
+    cache.put_many(["alpha"], [[1.0, 2.0]])
+    with open(cache.vectors_path, "ab") as f:
+        f.write(b"\x00" * 3)
+    with open(cache.index_path, "a", encoding="utf-8") as f:
+        f.write("deadbeef\t")
+
+    cache = EmbeddingCache(str(tmp_path), "m")
+    cache.put_many(["beta"], [[3.0, 4.0]])
+
+    assert EmbeddingCache(str(tmp_path), "m").get_many(["alpha", "beta"]) == [[1.0, 2.0], [3.0, 4.0]]
+
+def _embedder(model_name, **model_kwargs):
+    return SimpleNamespace(model_name=model_name, model_kwargs=model_kwargs, embed_documents=None, embed_query=None)
+
+def test_get_cached_embeddings_is_keyed_by_model_and_backend(tmp_path):
+    fake_settings = SimpleNamespace(EMBEDDING_CACHE_ENABLED=True, EMBEDDING_CACHE_DIR=str(tmp_path),
+                                    EMBEDDING_ONNX_INT8_FILE="onnx/q.onnx")
+    with patch.object(embedding_cache, "settings", fake_settings), patch.dict(embedding_cache._caches, clear=True):
+        torch_a = get_cached_embeddings(_embedder("model-a"))
+        torch_a_again = get_cached_embeddings(_embedder("model-a"))
+        onnx_a = get_cached_embeddings(_embedder("model-a", backend="onnx"))
+        int8_a = get_cached_embeddings(_embedder("model-a", backend="onnx", model_kwargs={"file_name": "onnx/q.onnx"}))
+        torch_b = get_cached_embeddings(_embedder("model-b"))
+        unknown = MagicMock()
+
+        assert torch_a.cache is torch_a_again.cache
+        assert len({id(torch_a.cache), id(onnx_a.cache), id(int8_a.cache), id(torch_b.cache)}) == 4
+        assert int8_a.cache.directory.endswith("model-a_onnx-int8")
+        # 识别不出模型的 embeddings 不走缓存
+        assert get_cached_embeddings(unknown) is unknown
@@ -0,0 +1,62 @@
+import sys
+import os
+import numpy as np
+import pytest
+
+# Add src to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.core.llm import build_embeddings, embedding_cache_name, embedding_model_kwargs, settings
+from unittest.mock import patch
+
+SAMPLE_TEXTS = [
+    "如何申请 VPN 远程访问权限?",
+    "Quarterly strategy review: expand the enterprise AI platform to three new regions.",
+    "报销流程: 先在 OA 提交申请, 部门经理审批后由财务打款。",
+    "The on-call engineer rotates weekly and must acknowledge pages within 15 minutes.",
+]
+
+# Minimum cosine similarity between a backend's vectors and the PyTorch vectors
+TOLERANCE = {"onnx": 0.999, "onnx-int8": 0.98}
+
+def test_backend_model_kwargs(monkeypatch):
+    monkeypatch.setattr(settings, "EMBEDDING_ONNX_INT8_FILE", "onnx/model_qint8_avx512.onnx")
+    assert embedding_model_kwargs("torch") == {}
+    assert embedding_model_kwargs("onnx") == {"backend": "onnx"}
+    assert embedding_model_kwargs("onnx-int8") == {
+        "backend": "onnx",
+        "model_kwargs": {"file_name": "onnx/model_qint8_avx512.onnx"},
+    }
+    with pytest.raises(ValueError):
+        embedding_model_kwargs("tensorrt")
+
+def test_embedding_cache_is_namespaced_by_backend():
+    assert embedding_cache_name("torch") == settings.EMBEDDING_MODEL
+    assert embedding_cache_name("onnx-int8") == f"{settings.EMBEDDING_MODEL}@onnx-int8"
+    assert embedding_cache_name("onnx") != embedding_cache_name("onnx-int8")
+
+@patch("src.core.llm.HuggingFaceEmbeddings")
+def test_build_embeddings_selects_backend(mock_hf):
+    build_embeddings("onnx")
+    assert mock_hf.call_args[1]["model_kwargs"] == {"backend": "onnx"}
+
+def _load_or_skip(backend):
+    """Only compare backends whose weights are already in the local HuggingFace cache."""
+    from huggingface_hub import try_to_load_from_cache
+    repo = settings.EMBEDDING_MODEL if "/" in settings.EMBEDDING_MODEL else f"sentence-transformers/{settings.EMBEDDING_MODEL}"
+    weights = {"torch": "config.json", "onnx": "onnx/model.onnx", "onnx-int8": settings.EMBEDDING_ONNX_INT8_FILE}[backend]
+    if not isinstance(try_to_load_from_cache(repo, weights), str):
+        pytest.skip(f"{repo}/{weights} is not cached locally")
+    try:
+        return build_embeddings(backend)
+    except Exception as e:  # e.g. the onnx extra is not installed
+        pytest.skip(f"{backend} backend unavailable: {e}")
+
+@pytest.mark.parametrize("backend", ["onnx", "onnx-int8"])
+def test_onnx_vectors_match_torch_within_tolerance(backend):
+    reference = np.asarray(_load_or_skip("torch").embed_documents(SAMPLE_TEXTS))
+    vectors = np.asarray(_load_or_skip(backend).embed_documents(SAMPLE_TEXTS))
+
+    assert vectors.shape == reference.shape
+    cosine = (vectors * reference).sum(axis=1) / (np.linalg.norm(vectors, axis=1) * np.linalg.norm(reference, axis=1))
+    assert cosine.min() >= TOLERANCE[backend]
@@ -15,10 +15,33 @@ def test_health_check():
     assert response.status_code == 200
     assert response.json() == {"status": "ok"}
 
-@patch("src.api.routes.chat.build_agent")
+@patch("src.api.main.get_readiness")
+def test_ready_probe_not_ready(mock_get_readiness):
+    mock_get_readiness.return_value = {
+        "ready": False,
+        "components": {"embeddings": True, "bm25": False, "chroma": False},
+        "errors": {"chroma": "Connection refused"},
+    }
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json()["components"]["bm25"] is False
+
+@patch("src.api.main.get_readiness")
+def test_ready_probe_ready(mock_get_readiness):
+    mock_get_readiness.return_value = {
+        "ready": True,
+        "components": {"embeddings": True, "bm25": True, "chroma": True},
+        "errors": {},
+    }
+    response = client.get("/ready")
+    assert response.status_code == 200
+    assert response.json()["ready"] is True
+
+@patch("src.api.routes.chat.get_semantic_cache", return_value=None)
+@patch("src.api.routes.chat.get_agent")
 @patch("src.api.routes.chat.get_embeddings")
-@patch("src.api.routes.chat.get_checkpointer")
-def test_chat_endpoint(mock_get_checkpointer, mock_get_embeddings, mock_build_agent):
+@patch("src.api.routes.chat.aget_checkpointer", new_callable=AsyncMock)
+def test_chat_endpoint(mock_get_checkpointer, mock_get_embeddings, mock_get_agent, mock_get_cache):
     # Mock embeddings
     mock_get_embeddings.return_value = MagicMock()
     mock_get_checkpointer.return_value = MagicMock()
@@ -29,20 +52,86 @@ def test_chat_endpoint(mock_get_checkpointer, mock_get_embeddings, mock_build_ag
     mock_message = MagicMock()
     mock_message.content = "Hello! I am the Brain."
     
-    mock_graph.invoke.return_value = {
+    mock_graph.ainvoke = AsyncMock(return_value={
         "messages": [mock_message]
-    }
-    mock_build_agent.return_value = (mock_graph, "System Prompt")
+    })
+    mock_get_agent.return_value = (mock_graph, "System Prompt")
 
     response = client.post("/api/v1/chat", json={"message": "Hello", "session_id": "test-session"})
     
     assert response.status_code == 200
     assert response.json()["response"] == "Hello! I am the Brain."
 
-@patch("src.api.routes.stream.build_agent")
+@patch("src.api.routes.chat.get_semantic_cache")
+@patch("src.api.routes.chat.get_agent")
+@patch("src.api.routes.chat.get_embeddings")
+@patch("src.api.routes.chat.aget_checkpointer", new_callable=AsyncMock)
+def test_chat_semantic_cache_hit(mock_get_checkpointer, mock_get_embeddings, mock_get_agent, mock_get_cache):
+    mock_graph = MagicMock()
+    mock_graph.ainvoke = AsyncMock()
+    mock_graph.aupdate_state = AsyncMock()
+    mock_get_agent.return_value = (mock_graph, "System Prompt")
+    mock_get_cache.return_value.lookup.return_value = (
+        {"response": "请在 IT 门户提交 VPN 申请。", "sources": ["vpn.md"], "similarity": 0.98},
+        [0.1, 0.2],
+    )
+
+    # No session id -> brand new conversation, cache is consulted
+    response = client.post("/api/v1/chat", json={"message": "如何申请 VPN 权限?"})
+
+    assert response.status_code == 200
+    assert response.json() == {"response": "请在 IT 门户提交 VPN 申请。", "sources": ["vpn.md"]}
+    mock_graph.ainvoke.assert_not_called()
+    # The cached turn is still written to conversation memory
+    mock_graph.aupdate_state.assert_called_once()
+
+@patch("src.api.routes.chat.get_semantic_cache", return_value=None)
+@patch("src.api.routes.chat.get_agent")
+@patch("src.api.routes.chat.get_embeddings")
+@patch("src.api.routes.chat.aget_checkpointer", new_callable=AsyncMock)
+def test_agent_rebuild_does_not_block_concurrent_requests(mock_get_checkpointer, mock_get_embeddings, mock_get_agent, mock_get_cache):
+    import asyncio
+    import time
+    from src.api.routes.chat import chat
+    from src.api.schemas import ChatRequest
+
+    mock_message = MagicMock()
+    mock_message.content = "ok"
+    mock_graph = MagicMock()
+    mock_graph.ainvoke = AsyncMock(return_value={"messages": [mock_message]})
+
+    def slow_rebuild(*args, **kwargs):
+        # 入库后首个请求: 重建 Agent (加载 BM25 索引、连接 Chroma) 是同步阻塞操作
+        time.sleep(0.5)
+        return mock_graph, "System Prompt"
+
+    mock_get_agent.side_effect = slow_rebuild
+
+    async def concurrent_request(gaps, done):
+        # 并发的其它请求: 每次让出事件循环后应很快被再次调度, 记录最长的等待
+        while not done.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(0.01)
+            gaps.append(time.perf_counter() - started)
+
+    async def run():
+        gaps, done = [], asyncio.Event()
+        other = asyncio.create_task(concurrent_request(gaps, done))
+        await asyncio.sleep(0)
+        response = await chat(ChatRequest(message="first after ingest"))
+        done.set()
+        await other
+        return max(gaps), response
+
+    longest_wait, response = asyncio.run(run())
+    assert longest_wait < 0.3
+    assert response.response == "ok"
+
+@patch("src.api.routes.stream.get_semantic_cache", return_value=None)
+@patch("src.api.routes.stream.get_agent")
 @patch("src.api.routes.stream.get_embeddings")
-@patch("src.api.routes.stream.get_checkpointer")
-def test_chat_stream_endpoint(mock_get_checkpointer, mock_get_embeddings, mock_build_agent):
+@patch("src.api.routes.stream.aget_checkpointer", new_callable=AsyncMock)
+def test_chat_stream_endpoint(mock_get_checkpointer, mock_get_embeddings, mock_get_agent, mock_get_cache):
     # Mock embeddings
     mock_get_embeddings.return_value = MagicMock()
     mock_get_checkpointer.return_value = MagicMock()
@@ -61,7 +150,7 @@ def test_chat_stream_endpoint(mock_get_checkpointer, mock_get_embeddings, mock_b
     # Because astream_events is called as a method, we need to ensure it returns the generator
     mock_graph.astream_events.side_effect = async_gen
     
-    mock_build_agent.return_value = (mock_graph, "System Prompt")
+    mock_get_agent.return_value = (mock_graph, "System Prompt")
 
     with client.stream("POST", "/api/v1/chat/stream", json={"message": "Hi", "session_id": "test-stream"}) as response:
         assert response.status_code == 200
@@ -75,6 +164,11 @@ def test_chat_stream_endpoint(mock_get_checkpointer, mock_get_embeddings, mock_b
         assert any("doc1.pdf" in line for line in lines)
         assert any("[DONE]" in line for line in lines)
 
+    # Time to first token and total stream latency are exported on /metrics
+    metrics = client.get("/metrics").text
+    assert 'enterprise_brain_stage_latency_seconds_count{stage="stream_first_token"}' in metrics
+    assert 'enterprise_brain_stage_latency_seconds_count{stage="stream_total"}' in metrics
+
 @patch("src.api.routes.upload.glob.glob")
 @patch("src.api.routes.upload.os.path.exists")
 def test_list_files(mock_exists, mock_glob):
@@ -96,9 +190,11 @@ def test_list_files(mock_exists, mock_glob):
     assert "doc3.md" in files
     assert len(files) == 3
 
-@patch("src.api.routes.upload.ingest_docs")
+@patch("src.api.routes.upload.get_ingest_queue")
 @patch("src.api.routes.upload.shutil.copyfileobj")
-def test_upload_endpoint(mock_copy, mock_ingest):
+def test_upload_endpoint(mock_copy, mock_get_queue):
+    mock_get_queue.return_value.submit.return_value = MagicMock(id="job-1")
+
     # Mock file upload
     filename = "test_doc.txt"
     file_content = b"Dummy content"
@@ -110,3 +206,50 @@ def test_upload_endpoint(mock_copy, mock_ingest):
     assert response.status_code == 200
     assert response.json()["filename"] == filename
     assert "triggered" in response.json()["status"]
+    assert response.json()["job_id"] == "job-1"
+
+@patch("src.api.routes.ingest.get_ingest_queue")
+def test_ingest_job_status(mock_get_queue):
+    from src.core.jobs import IngestJob
+    job = IngestJob("upload:a.md")
+    job.progress("📊 Sync Plan: +1 | ~0 | -0")
+    mock_get_queue.return_value.get.side_effect = lambda job_id: job if job_id == job.id else None
+
+    response = client.get(f"/api/v1/ingest/jobs/{job.id}")
+    assert response.status_code == 200
+    assert response.json()["status"] == "queued"
+    assert response.json()["message"].startswith("📊")
+
+    assert client.get("/api/v1/ingest/jobs/unknown").status_code == 404
+
+@patch("src.api.routes.retrieve.get_kb_client")
+def test_retrieve_batch_streams_ndjson(mock_get_kb, monkeypatch):
+    import json
+    from src.api.routes import retrieve
+    monkeypatch.setattr(retrieve.settings, "RETRIEVE_BATCH_CHUNK_SIZE", 2)
+    calls = []
+
+    async def fake_batch(queries, k):
+        calls.append(list(queries))
+        if "boom" in queries:
+            raise RuntimeError("chroma down")
+        return [[{"content": f"about {q}", "source": f"{q}.md", "score": 0.5}] for q in queries]
+
+    mock_get_kb.return_value.aretrieve_batch = fake_batch
+
+    response = client.post("/api/v1/retrieve/batch", json={"queries": ["vpn", "leave", "boom", "x", "hr"], "k": 3})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["index"] for line in lines] == [0, 1, 2, 3, 4]
+    assert lines[0]["results"][0]["source"] == "vpn.md"
+    assert lines[2]["error"] == lines[3]["error"] == "chroma down"
+    assert lines[4]["results"][0]["source"] == "hr.md"
+    assert calls == [["vpn", "leave"], ["boom", "x"], ["hr"]]
+
+def test_retrieve_batch_rejects_oversized_requests(monkeypatch):
+    from src.api.routes import retrieve
+    monkeypatch.setattr(retrieve.settings, "RETRIEVE_BATCH_MAX_QUERIES", 2)
+    response = client.post("/api/v1/retrieve/batch", json={"queries": ["a", "b", "c"]})
+    assert response.status_code == 413
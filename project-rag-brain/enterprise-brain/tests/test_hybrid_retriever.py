@@ -0,0 +1,95 @@
+import sys
+import os
+import time
+import asyncio
+
+# Add src to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.documents import Document
+from src.core.hybrid_retriever import HybridRetriever, rrf_fuse, branch_latency
+from src.core.lexical_index import LexicalIndex
+from unittest.mock import MagicMock, patch
+
+def _doc(chunk_id, text=None):
+    return Document(id=chunk_id, page_content=text or f"text {chunk_id}", metadata={"chunk_id": chunk_id, "source": f"data/{chunk_id}.md"})
+
+def _index(tmp_path, chunks):
+    index = LexicalIndex(str(tmp_path / "bm25.pkl"), origin="chunks")
+    index.upsert_source("data/all.md", "h", [Document(page_content=text) for text in chunks.values()], ids=list(chunks))
+    return index
+
+def test_rrf_dedupes_by_chunk_id_and_ranks_shared_hits_first():
+    lexical = [_doc("a"), _doc("b"), _doc("c")]
+    vector = [_doc("d"), _doc("b"), _doc("a")]
+
+    fused = rrf_fuse([("lexical", 0.4, lexical), ("vector", 0.6, vector)], k=3)
+
+    ids = [d.metadata["chunk_id"] for d in fused]
+    assert len(ids) == len(set(ids)) == 3
+    assert set(ids[:2]) == {"a", "b"}  # found by both branches
+    assert fused[0].metadata["lexical_rank"] and fused[0].metadata["vector_rank"]
+    assert fused[0].metadata["rrf_score"] > fused[-1].metadata["rrf_score"]
+
+def test_branches_run_concurrently(tmp_path):
+    index = _index(tmp_path, {"a": "vpn 申请", "b": "报销 流程"})
+    slow_search = index.search
+    index.search = lambda query, k: (time.sleep(0.2), slow_search(query, k))[1]
+    vector_store = MagicMock()
+    vector_store.similarity_search.side_effect = lambda query, k: (time.sleep(0.2), [_doc("b", "报销 流程")])[1]
+    retriever = HybridRetriever(lexical_index=index, vector_store=vector_store, k=2, candidate_k=10)
+
+    start = time.perf_counter()
+    docs = retriever.invoke("vpn")
+    elapsed = time.perf_counter() - start
+
+    assert elapsed < 0.35  # max(branch), not sum(branch)
+    assert {d.metadata["chunk_id"] for d in docs} == {"a", "b"}
+    vector_store.similarity_search.assert_called_once_with("vpn", k=10)
+    stats = branch_latency.stats()
+    assert stats["lexical"]["last_ms"] >= 200 and stats["vector"]["last_ms"] >= 200
+    assert stats["total"]["last_ms"] < 350
+
+    start = time.perf_counter()
+    docs = asyncio.run(retriever.ainvoke("vpn"))
+    assert time.perf_counter() - start < 0.35
+    assert {d.metadata["chunk_id"] for d in docs} == {"a", "b"}
+
+@patch("src.core.hybrid_retriever.DBFactory")
+def test_vector_failure_falls_back_to_lexical(mock_db_factory, tmp_path):
+    index = _index(tmp_path, {"a": "vpn 申请", "b": "报销 流程"})
+    vector_store = MagicMock()
+    vector_store.similarity_search.side_effect = ConnectionError("chroma down")
+    retriever = HybridRetriever(lexical_index=index, vector_store=vector_store, k=3)
+
+    docs = retriever.invoke("vpn")
+
+    assert [d.metadata["chunk_id"] for d in docs] == ["a"]
+    error = mock_db_factory.invalidate_on.call_args[0][0]
+    assert isinstance(error, ConnectionError)
+
+def test_vector_branch_times_embedding_and_chroma_search_separately(tmp_path):
+    from langchain_core.embeddings import Embeddings
+    from prometheus_client import REGISTRY
+
+    class FakeEmbeddings(Embeddings):
+        def embed_documents(self, texts):
+            return [[1.0, 0.0] for _ in texts]
+
+        def embed_query(self, text):
+            return [1.0, 0.0]
+
+    def count(stage):
+        return REGISTRY.get_sample_value("enterprise_brain_stage_latency_seconds_count", {"stage": stage}) or 0
+
+    vector_store = MagicMock()
+    vector_store.embeddings = FakeEmbeddings()
+    vector_store.similarity_search_by_vector.return_value = [_doc("b", "报销 流程")]
+    retriever = HybridRetriever(lexical_index=_index(tmp_path, {"a": "vpn 申请"}), vector_store=vector_store, k=2)
+    before = {stage: count(stage) for stage in ("embedding", "chroma_search", "bm25", "hybrid_retrieval")}
+
+    docs = retriever.invoke("报销")
+
+    assert [d.metadata["chunk_id"] for d in docs] == ["b"]
+    vector_store.similarity_search_by_vector.assert_called_once_with([1.0, 0.0], k=retriever.candidate_k)
+    assert all(count(stage) == before[stage] + 1 for stage in before)
@@ -0,0 +1,136 @@
+import sys
+import os
+
+# Add src to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.core.ingest import iter_parsed_files, make_chunk_id
+from unittest.mock import MagicMock, patch
+
+def _write(tmp_path, name, text):
+    path = os.path.normpath(str(tmp_path / name))
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    return path
+
+def test_iter_parsed_files_in_process_pool_isolates_failures(tmp_path):
+    good_a = _write(tmp_path, "a.md", "# VPN\n申请流程")
+    good_b = _write(tmp_path, "b.txt", "remote work policy")
+    missing = os.path.normpath(str(tmp_path / "missing.md"))
+    local_state = {good_a: "hash-a", good_b: "hash-b", missing: ""}
+    logs = []
+
+    results = list(iter_parsed_files([good_a, missing, good_b], local_state, logs.append, workers=2))
+
+    assert [r[0] for r in results] == [good_a, missing, good_b]
+    path, docs, error = results[0]
+    assert error is None
+    assert docs[0].metadata["file_hash"] == "hash-a"
+    assert docs[0].metadata["source"] == good_a
+    assert docs[0].metadata["filename"] == "a.md"
+    assert results[1][2]  # error reported for the bad file only
+    assert results[2][1][0].page_content == "remote work policy"
+
+def test_chunk_ids_are_deterministic():
+    assert make_chunk_id("data/a.md", "abcdef0123456789", 3) == make_chunk_id("data/a.md", "abcdef0123456789", 3)
+    assert make_chunk_id("data/a.md", "abcdef0123456789", 3) != make_chunk_id("data/b.md", "abcdef0123456789", 3)
+
+def _ingest_env(tmp_path, monkeypatch):
+    from src.core import ingest
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    monkeypatch.setattr(ingest.settings, "DATA_DIR", str(data_dir))
+    monkeypatch.setattr(ingest.settings, "INDEX_DIR", str(tmp_path / "index"))
+    monkeypatch.setattr(ingest.settings, "INGEST_PARSE_WORKERS", 1)
+    monkeypatch.setattr(ingest.settings, "EMBEDDING_CACHE_ENABLED", False)
+    monkeypatch.setattr(ingest.settings, "SEMANTIC_CACHE_ENABLED", False)
+    monkeypatch.setattr("src.core.retriever.load_stored_chunks", lambda: {})
+    return data_dir
+
+@patch("src.core.ingest.get_embeddings")
+@patch("src.core.ingest.DBFactory")
+def test_sync_diffs_against_local_manifest(mock_db_factory, mock_get_embeddings, tmp_path, monkeypatch):
+    from src.core.ingest import ingest_docs
+    data_dir = _ingest_env(tmp_path, monkeypatch)
+    (data_dir / "vpn.md").write_text("VPN 申请 流程", encoding="utf-8")
+    (data_dir / "hr.md").write_text("请假 政策", encoding="utf-8")
+    collection = MagicMock()
+    collection.get.return_value = {"ids": [], "metadatas": []}
+    mock_db_factory.get_collection.return_value = collection
+    mock_get_embeddings.return_value.embed_documents.side_effect = lambda texts: [[0.1, 0.2] for _ in texts]
+
+    # First sync: reconcile once against Chroma, then add both files
+    ingest_docs()
+    assert collection.get.call_count == 1
+    assert collection.upsert.call_count == 1
+    added_ids = collection.upsert.call_args[1]["ids"]
+
+    # No-op sync: no metadata scan, nothing written
+    ingest_docs()
+    assert collection.get.call_count == 1
+    assert collection.upsert.call_count == 1
+
+    # Editing a file deletes exactly its old chunk IDs
+    vpn_path = data_dir / "vpn.md"
+    vpn_path.write_text("VPN 申请 流程 已更新", encoding="utf-8")
+    os.utime(vpn_path, ns=(1, 1))
+    ingest_docs()
+    deleted = collection.delete.call_args[1]["ids"]
+    assert len(deleted) == 1 and deleted[0] in added_ids
+    assert collection.get.call_count == 1
+
+    # Repair mode rescans Chroma page by page
+    ingest_docs(reconcile=True)
+    assert collection.get.call_count == 2
+
+@patch("src.core.ingest.get_embeddings")
+@patch("src.core.ingest.DBFactory")
+def test_ingest_streams_files_under_memory_ceiling(mock_db_factory, mock_get_embeddings, tmp_path, monkeypatch):
+    from src.core import ingest
+    data_dir = _ingest_env(tmp_path, monkeypatch)
+    for i in range(3):
+        (data_dir / f"doc{i}.md").write_text(f"文档 {i} 内容", encoding="utf-8")
+    monkeypatch.setattr(ingest.settings, "INGEST_MEMORY_LIMIT_MB", 1)  # always exceeded
+    collection = MagicMock()
+    collection.get.return_value = {"ids": [], "metadatas": []}
+    mock_db_factory.get_collection.return_value = collection
+    mock_get_embeddings.return_value.embed_documents.side_effect = lambda texts: [[0.1, 0.2] for _ in texts]
+    logs = []
+
+    summary = ingest.ingest_docs(progress_callback=logs.append)
+
+    assert summary["chunks"] == 3
+    assert summary["peak_rss_mb"] > 1
+    assert sum(len(c[1]["ids"]) for c in collection.upsert.call_args_list) == 3
+    # 每个文件切分后都检查一次内存上限, 超限时先排空流水线再读下一个文件
+    assert sum("draining pipeline" in line for line in logs) == 3
+    assert any("Peak RSS" in line for line in logs)
+
+def test_iter_parsed_files_is_lazy(tmp_path):
+    paths = [_write(tmp_path, f"{i}.txt", f"text {i}") for i in range(3)]
+    parsed = iter_parsed_files(paths, {p: "h" for p in paths}, print, workers=1)
+
+    first = next(parsed)
+    assert first[0] == paths[0] and first[1][0].page_content == "text 0"
+    assert [r[0] for r in parsed] == paths[1:]
+
+@patch("src.core.ingest.get_embeddings")
+@patch("src.core.ingest.DBFactory")
+def test_failed_bm25_bootstrap_aborts_before_touching_chroma(mock_db_factory, mock_get_embeddings, tmp_path, monkeypatch):
+    import pytest
+    from src.core import ingest
+    data_dir = _ingest_env(tmp_path, monkeypatch)
+    monkeypatch.setattr(ingest.settings, "LEXICAL_INDEX_SOURCE", "chunks")
+    def unavailable():
+        raise ConnectionError("chroma down")
+    monkeypatch.setattr("src.core.retriever.load_stored_chunks", unavailable)
+    (data_dir / "vpn.md").write_text("VPN 申请 流程", encoding="utf-8")
+    collection = MagicMock()
+    collection.get.return_value = {"ids": [], "metadatas": []}
+    mock_db_factory.get_collection.return_value = collection
+
+    with pytest.raises(ConnectionError):
+        ingest.ingest_docs()
+
+    assert not collection.upsert.called and not collection.delete.called
+    assert not os.path.exists(ingest.settings.BM25_INDEX_PATH)
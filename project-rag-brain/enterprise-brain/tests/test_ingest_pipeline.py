@@ -0,0 +1,136 @@
+import sys
+import os
+import time
+import threading
+import pytest
+
+# Add src to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.documents import Document
+from src.core.ingest_pipeline import EmbedWritePipeline, MemoryGuard
+
+def _chunks(n):
+    return [Document(page_content=f"chunk {i}", metadata={"chunk_id": f"id-{i}", "source": "a.md"}) for i in range(n)]
+
+class FakeEmbeddings:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = []
+
+    def embed_documents(self, texts):
+        time.sleep(self.delay)
+        self.calls.append(len(texts))
+        return [[float(len(t)), 1.0] for t in texts]
+
+class FakeCollection:
+    def __init__(self, delay=0.0, fail_on=None):
+        self.delay = delay
+        self.fail_on = fail_on
+        self.batches = []
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        time.sleep(self.delay)
+        if self.fail_on is not None and len(self.batches) == self.fail_on:
+            raise RuntimeError("chroma unavailable")
+        assert len(ids) == len(embeddings) == len(documents) == len(metadatas)
+        self.batches.append(list(ids))
+
+def test_pipeline_writes_every_chunk_in_configured_batches():
+    embeddings, collection, logs = FakeEmbeddings(), FakeCollection(), []
+    pipeline = EmbedWritePipeline(embeddings, collection, embed_batch_size=4, write_batch_size=10, queue_size=2, log=logs.append)
+
+    stats = pipeline.run(iter(_chunks(25)), total=25)
+
+    assert embeddings.calls == [4, 4, 4, 4, 4, 4, 1]
+    assert [len(b) for b in collection.batches] == [10, 10, 5]
+    assert [i for b in collection.batches for i in b] == [f"id-{i}" for i in range(25)]
+    assert stats["embed"]["chunks"] == stats["write"]["chunks"] == 25
+    assert logs[-1].startswith("      ...ingested 25/25 | embed")
+
+def test_embedding_overlaps_with_writes():
+    # 每批嵌入 50ms、写入 50ms: 串行约 0.4s, 流水线约 0.25s
+    embeddings, collection = FakeEmbeddings(delay=0.05), FakeCollection(delay=0.05)
+    pipeline = EmbedWritePipeline(embeddings, collection, embed_batch_size=2, write_batch_size=2, queue_size=2, log=lambda m: None)
+
+    stats = pipeline.run(_chunks(8))
+
+    assert stats["elapsed_s"] < 0.35
+
+def test_slow_writer_applies_back_pressure():
+    collection = FakeCollection(delay=0.05)
+    pipeline = EmbedWritePipeline(FakeEmbeddings(), collection, embed_batch_size=1, write_batch_size=1, queue_size=1, log=lambda m: None)
+    max_queued = []
+
+    def watch():
+        while not done.is_set():
+            max_queued.append(pipeline.queue.qsize())
+            time.sleep(0.005)
+
+    done = threading.Event()
+    watcher = threading.Thread(target=watch)
+    watcher.start()
+    stats = pipeline.run(_chunks(6))
+    done.set()
+    watcher.join()
+
+    assert max(max_queued) <= 1
+    assert stats["embed"]["wait_s"] > 0.1  # 嵌入阶段在等待写入
+
+def test_writer_error_is_raised_and_stops_embedding():
+    embeddings = FakeEmbeddings()
+    pipeline = EmbedWritePipeline(embeddings, FakeCollection(delay=0.01, fail_on=0), embed_batch_size=1, write_batch_size=1, queue_size=1, log=lambda m: None)
+
+    with pytest.raises(RuntimeError, match="chroma unavailable"):
+        pipeline.run(_chunks(50))
+    assert sum(embeddings.calls) < 50
+
+def test_final_partial_batch_failure_is_raised_cleanly():
+    thread_errors = []
+    previous_hook = threading.excepthook
+    threading.excepthook = thread_errors.append
+    try:
+        # 5 个 chunk, 每批写 4 个: 第二次 upsert 是 _DONE 之后的最后一个不完整批次
+        pipeline = EmbedWritePipeline(FakeEmbeddings(), FakeCollection(fail_on=1), embed_batch_size=1, write_batch_size=4, log=lambda m: None)
+        with pytest.raises(RuntimeError, match="chroma unavailable"):
+            pipeline.run(_chunks(5))
+    finally:
+        threading.excepthook = previous_hook
+    # 写入线程内不应再出现 "task_done() called too many times"
+    assert thread_errors == []
+    assert pipeline.write.items == 4
+
+def test_drain_inside_chunk_generator_waits_for_writes():
+    collection = FakeCollection(delay=0.02)
+    pipeline = EmbedWritePipeline(FakeEmbeddings(), collection, embed_batch_size=2, write_batch_size=2, queue_size=4, log=lambda m: None)
+    written_at_drain = []
+
+    def stream():
+        for i, chunk in enumerate(_chunks(8)):
+            yield chunk
+            if i == 5:
+                pipeline.drain()
+                written_at_drain.append(pipeline.write.items)
+
+    stats = pipeline.run(stream())
+
+    assert written_at_drain == [6]
+    assert stats["write"]["chunks"] == 8
+    assert stats["peak_rss_mb"] > 0
+
+def test_memory_limit_is_advisory_when_draining_cannot_free_enough():
+    memory = MemoryGuard(limit_mb=1)  # 任何进程的 RSS 都超过 1 MB, 排空也压不回去
+    drains, messages = [], []
+
+    memory.relieve(lambda: drains.append(1), messages.append)
+    memory.relieve(lambda: drains.append(1), messages.append)
+
+    assert len(drains) == 2
+    assert memory.throttled == 2
+    assert memory.exceeded == 2
+    assert sum("still" in m for m in messages) == 1  # 只告警一次
+
+def test_memory_guard_without_limit_never_drains():
+    memory = MemoryGuard(limit_mb=0)
+    memory.relieve(lambda: pytest.fail("should not drain"), lambda m: None)
+    assert memory.throttled == memory.exceeded == 0
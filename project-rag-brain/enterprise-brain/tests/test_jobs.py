@@ -0,0 +1,60 @@
+import sys
+import os
+import threading
+
+# Add src to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.core.jobs import IngestJobQueue
+
+def test_burst_of_submits_is_coalesced():
+    runs = []
+    def runner(progress_callback=None):
+        runs.append(1)
+        progress_callback("✅ Sync complete!")
+        return {"ok": True, "chunks": 3}
+
+    queue = IngestJobQueue(runner=runner, debounce_seconds=0.2)
+    jobs = [queue.submit(reason=f"upload:{i}.md") for i in range(10)]
+
+    assert len({job.id for job in jobs}) == 1
+    job = queue.wait(jobs[0].id, timeout=5)
+    assert job.status == "succeeded"
+    assert len(job.reasons) == 10
+    assert job.result["chunks"] == 3
+    assert job.to_dict()["run_seconds"] is not None
+    assert runs == [1]
+
+def test_only_one_sync_runs_at_a_time():
+    started = threading.Event()
+    release = threading.Event()
+    active = []
+    overlap = []
+    def runner(progress_callback=None):
+        active.append(1)
+        overlap.append(len(active))
+        started.set()
+        release.wait(5)
+        active.pop()
+        return {"ok": True}
+
+    queue = IngestJobQueue(runner=runner, debounce_seconds=0)
+    first = queue.submit()
+    assert started.wait(5)
+    # Submitted while the first sync runs -> a new queued job, not a concurrent run
+    second = queue.submit()
+    assert second.id != first.id
+    assert second.status == "queued"
+    release.set()
+
+    assert queue.wait(second.id, timeout=5).status == "succeeded"
+    assert max(overlap) == 1
+
+def test_failed_sync_is_reported():
+    def runner(progress_callback=None):
+        return {"ok": False, "error": "Could not connect to ChromaDB"}
+
+    queue = IngestJobQueue(runner=runner, debounce_seconds=0)
+    job = queue.wait(queue.submit().id, timeout=5)
+    assert job.status == "failed"
+    assert "ChromaDB" in job.error
@@ -0,0 +1,175 @@
+import sys
+import os
+import asyncio
+
+# Add src to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+import pytest
+import requests
+from src.core import kb_interface
+from src.core.kb_interface import CircuitBreaker, RAGFlowKnowledgeBase, get_kb_client, settings
+from unittest.mock import MagicMock, patch
+
+RAGFLOW_DATA = {"data": [{"chunk_content": "VPN 申请流程", "doc_name": "vpn.md", "similarity": 0.9}]}
+
+def _response(status, payload=None):
+    response = MagicMock()
+    response.status_code = status
+    response.json.return_value = payload or {}
+    if status >= 400:
+        response.raise_for_status.side_effect = requests.HTTPError(f"HTTP {status}")
+    return response
+
+def _client(monkeypatch, **overrides):
+    monkeypatch.setattr(settings, "RAGFLOW_MAX_RETRIES", overrides.get("retries", 2))
+    monkeypatch.setattr(settings, "RAGFLOW_BREAKER_THRESHOLD", overrides.get("threshold", 5))
+    kb = RAGFlowKnowledgeBase()
+    kb._backoff = lambda attempt: 0
+    return kb
+
+def test_get_kb_client_is_a_singleton(monkeypatch):
+    monkeypatch.setattr(settings, "RAG_ENGINE", "ragflow")
+    monkeypatch.setattr(kb_interface, "_kb_clients", {})
+    first = get_kb_client()
+    assert first is get_kb_client()
+    assert isinstance(first, RAGFlowKnowledgeBase)
+
+def test_retrieve_retries_transient_errors(monkeypatch):
+    kb = _client(monkeypatch)
+    kb.session = MagicMock()
+    kb.session.post.side_effect = [requests.ConnectionError("reset"), _response(503), _response(200, RAGFLOW_DATA)]
+
+    results = kb.retrieve("vpn", k=3)
+
+    assert [r["source"] for r in results] == ["vpn.md"]
+    assert kb.session.post.call_count == 3
+    assert kb.breaker.state == "closed"
+
+def test_client_errors_are_not_retried(monkeypatch):
+    kb = _client(monkeypatch)
+    kb.session = MagicMock()
+    kb.session.post.return_value = _response(401)
+
+    assert kb.retrieve("vpn") == []
+    assert kb.session.post.call_count == 1
+
+def test_circuit_opens_after_consecutive_failures(monkeypatch):
+    kb = _client(monkeypatch, retries=0, threshold=2)
+    kb.session = MagicMock()
+    kb.session.post.side_effect = requests.Timeout("slow")
+
+    kb.retrieve("vpn")
+    kb.retrieve("vpn")
+    assert kb.breaker.state == "open"
+    kb.retrieve("vpn")
+    assert kb.session.post.call_count == 2  # third call short-circuited
+
+@pytest.mark.parametrize("failure", [requests.ConnectionError("reset"), _response(503)])
+def test_transport_errors_and_retryable_statuses_count_the_same(monkeypatch, failure):
+    from src.core.metrics import ERRORS
+    kb = _client(monkeypatch, retries=1, threshold=2)
+    kb.session = MagicMock()
+    if isinstance(failure, Exception):
+        kb.session.post.side_effect = failure
+    else:
+        kb.session.post.return_value = failure
+    errors = ERRORS.labels("ragflow_request")
+    before = errors._value.get()
+
+    kb.retrieve("vpn")
+    assert kb.breaker.state == "closed"
+    kb.retrieve("vpn")
+
+    assert kb.breaker.state == "open"
+    assert errors._value.get() - before == 4  # 2 calls x 2 attempts
+
+def test_breaker_half_open_probe():
+    breaker = CircuitBreaker(threshold=1, reset_seconds=0)
+    breaker.record_failure()
+    assert breaker.state == "half_open"
+    assert breaker.allow() is True
+    assert breaker.allow() is False  # only one probe at a time
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+def test_status_is_cached(monkeypatch):
+    monkeypatch.setattr(settings, "RAGFLOW_HEALTH_TTL_SECONDS", 60)
+    kb = _client(monkeypatch)
+    kb.session = MagicMock()
+    kb.session.get.return_value = _response(200)
+
+    assert kb.status()["status"] == "connected"
+    assert kb.status()["circuit"] == "closed"
+    assert kb.session.get.call_count == 1
+
+def test_aretrieve_reuses_async_client_and_retries(monkeypatch):
+    kb = _client(monkeypatch)
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if len(calls) == 1:
+            return httpx.Response(502)
+        return httpx.Response(200, json=RAGFLOW_DATA)
+
+    real_client = httpx.AsyncClient
+
+    async def run():
+        with patch.object(kb_interface.httpx, "AsyncClient", side_effect=lambda **kw: real_client(transport=httpx.MockTransport(handler), **kw)):
+            first = await kb.aretrieve("vpn", k=3)
+            client = kb._get_async_client()
+            second = await kb.aretrieve("vpn", k=3)
+            same_client = kb._get_async_client() is client
+            await kb.aclose()
+            return first, second, same_client
+
+    first, second, same_client = asyncio.run(run())
+    assert [r["source"] for r in first] == ["vpn.md"] == [r["source"] for r in second]
+    assert len(calls) == 3
+    assert same_client
+    assert calls[0].headers["Authorization"].startswith("Bearer ")
+
+def test_one_async_client_per_event_loop_and_aclose_closes_all(monkeypatch):
+    kb = _client(monkeypatch)
+
+    async def get_client():
+        return kb._get_async_client()
+
+    async def close():
+        await kb.aclose()
+
+    first_loop, second_loop = asyncio.new_event_loop(), asyncio.new_event_loop()
+    try:
+        first = first_loop.run_until_complete(get_client())
+        second = second_loop.run_until_complete(get_client())
+        assert first is not second
+        assert second_loop.run_until_complete(get_client()) is second
+        # 在另一个循环上创建新客户端不会丢掉 (泄漏) 旧循环的连接池
+        second_loop.run_until_complete(close())
+    finally:
+        first_loop.close()
+        second_loop.close()
+    assert first.is_closed and second.is_closed
+    assert len(kb._async_clients) == 0
+
+def test_cancelled_probe_releases_half_open_breaker(monkeypatch):
+    kb = _client(monkeypatch)
+    kb.breaker = CircuitBreaker(threshold=1, reset_seconds=0)
+    kb.breaker.record_failure()
+    started = asyncio.Event()
+
+    async def hanging_probe(query, k):
+        started.set()
+        await asyncio.sleep(10)
+
+    async def run():
+        with patch.object(kb, "_aretrieve", side_effect=hanging_probe):
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(kb.aretrieve("vpn"), timeout=0.05)
+
+    asyncio.run(run())
+    assert started.is_set()
+    assert kb.breaker.state == "half_open"
+    assert kb.breaker.allow() is True  # the next request may probe again
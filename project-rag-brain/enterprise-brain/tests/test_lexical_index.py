@@ -0,0 +1,80 @@
+import sys
+import os
+
+# Add src to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.core.lexical_index import LexicalIndex, LexicalRetriever
+from langchain_core.documents import Document
+
+def _docs(*texts):
+    return [Document(page_content=t, metadata={"filename": "x.md"}) for t in texts]
+
+def test_search_ranks_matching_chunk_first(tmp_path):
+    index = LexicalIndex(str(tmp_path / "bm25.pkl"))
+    index.upsert_source("data/vpn.md", "h1", _docs("how to apply for vpn access", "office hours"))
+    index.upsert_source("data/hr.md", "h2", _docs("holiday policy and leave"))
+
+    results = index.search("vpn access", k=2)
+
+    assert len(results) == 1
+    assert index.get_document(results[0][0]).page_content == "how to apply for vpn access"
+
+def test_upsert_and_remove_are_incremental(tmp_path):
+    index = LexicalIndex(str(tmp_path / "bm25.pkl"))
+    index.upsert_source("data/a.md", "h1", _docs("alpha beta", "gamma"))
+    index.upsert_source("data/b.md", "h2", _docs("delta"))
+
+    index.upsert_source("data/a.md", "h3", _docs("epsilon"))
+    assert len(index) == 2
+    assert index.search("alpha") == []
+    assert index.sources[os.path.normpath("data/a.md")]["hash"] == "h3"
+
+    index.remove_source("data/b.md")
+    assert len(index) == 1
+    assert "delta" not in index.postings
+    assert index.total_len == 1
+
+def test_save_and_load_roundtrip(tmp_path):
+    path = str(tmp_path / "bm25.pkl")
+    index = LexicalIndex(path)
+    index.upsert_source("data/a.md", "h1", _docs("remote work policy"))
+    index.save()
+
+    loaded = LexicalIndex.load(path)
+    retriever = LexicalRetriever(index=loaded, k=3)
+
+    docs = retriever.invoke("remote")
+    assert [d.page_content for d in docs] == ["remote work policy"]
+    assert LexicalIndex.load(str(tmp_path / "missing.pkl")) is None
+
+def test_search_batch_matches_single_search(tmp_path):
+    index = LexicalIndex(str(tmp_path / "bm25.pkl"))
+    index.upsert_source("data/vpn.md", "h1", _docs("how to apply for vpn access", "vpn vpn client setup", "office hours"))
+    index.upsert_source("data/hr.md", "h2", _docs("holiday policy and leave", "apply for leave"))
+    queries = ["vpn access", "apply for leave", "unknown words", "office vpn"]
+
+    batch = index.search_batch(queries, k=2)
+
+    for query, hits in zip(queries, batch):
+        single = index.search(query, k=2)
+        assert [round(score, 9) for _, score in hits] == [round(score, 9) for _, score in single]
+        assert [chunk_id for chunk_id, _ in hits] == [chunk_id for chunk_id, _ in single]
+    assert batch[2] == []
+
+    # The numpy view is rebuilt after incremental updates
+    index.remove_source("data/vpn.md")
+    assert index.search_batch(["vpn access"], k=2) == [[]]
+
+def test_tied_scores_break_ties_identically_in_batch_and_single_search(tmp_path):
+    index = LexicalIndex(str(tmp_path / "bm25.pkl"))
+    # 相同文本 => 相同 BM25 分数; ID 故意不按字母序, 同分时按加入索引的顺序排列
+    tied_ids = ["z", "m", "a", "q", "b", "c", "y", "d"]
+    index.upsert_source("data/faq.md", "h1", _docs(*["vpn guide"] * len(tied_ids)), ids=tied_ids)
+    index.upsert_source("data/vpn.md", "h2", _docs("vpn vpn guide"), ids=["best"])
+
+    for k in (1, 3, 5, 20):
+        single = [chunk_id for chunk_id, _ in index.search("vpn guide", k=k)]
+        batch = [chunk_id for chunk_id, _ in index.search_batch(["vpn guide"], k=k)[0]]
+        assert batch == single
+        assert single == (["best"] + tied_ids)[:k]
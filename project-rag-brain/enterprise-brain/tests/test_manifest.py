@@ -0,0 +1,48 @@
+import sys
+import os
+import hashlib
+
+# Add src to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.core.manifest import IngestManifest, calculate_file_hash
+from unittest.mock import patch
+
+def test_streaming_hash_matches_md5(tmp_path):
+    path = tmp_path / "big.txt"
+    payload = os.urandom(3 * 1024 * 1024 + 17)
+    path.write_bytes(payload)
+
+    assert calculate_file_hash(str(path), chunk_size=64 * 1024) == hashlib.md5(payload).hexdigest()
+
+def test_unchanged_files_skip_hashing(tmp_path):
+    doc = tmp_path / "a.md"
+    doc.write_text("v1", encoding="utf-8")
+    db_path = str(tmp_path / "manifest.db")
+
+    with IngestManifest(db_path) as manifest:
+        first = manifest.hash_files([str(doc)])
+        assert manifest.rehashed == 1
+
+    with IngestManifest(db_path) as manifest:
+        with patch("src.core.manifest.calculate_file_hash") as mock_hash:
+            second = manifest.hash_files([str(doc)])
+        mock_hash.assert_not_called()
+        assert second == first
+
+def test_modified_and_deleted_files(tmp_path):
+    doc = tmp_path / "a.md"
+    other = tmp_path / "b.md"
+    doc.write_text("v1", encoding="utf-8")
+    other.write_text("keep", encoding="utf-8")
+    db_path = str(tmp_path / "manifest.db")
+
+    with IngestManifest(db_path) as manifest:
+        before = manifest.hash_files([str(doc), str(other)])
+        doc.write_text("version two", encoding="utf-8")
+        after = manifest.hash_files([str(doc)])
+
+        assert after[str(doc)] != before[str(doc)]
+        assert manifest.rehashed == 1
+        paths = [row[0] for row in manifest.conn.execute("SELECT path FROM files")]
+        assert paths == [str(doc)]
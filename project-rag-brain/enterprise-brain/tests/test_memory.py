@@ -0,0 +1,125 @@
+import sys
+import os
+import asyncio
+import sqlite3
+
+# Add src to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.core import memory
+from unittest.mock import AsyncMock, MagicMock, patch
+
+def test_async_checkpointer_is_shared_per_event_loop(tmp_path):
+    db_path = str(tmp_path / "chat_history.db")
+
+    async def get_twice():
+        first = await memory.aget_checkpointer()
+        second = await memory.aget_checkpointer()
+        await memory.aclose_checkpointer()
+        return first, second
+
+    with patch.object(memory, "_db_path", return_value=db_path):
+        first, second = asyncio.run(get_twice())
+        assert first is second
+
+        # A new event loop (e.g. a new server process / test client) gets its own saver
+        third, _ = asyncio.run(get_twice())
+        assert third is not first
+
+def test_async_checkpointer_round_trip(tmp_path):
+    db_path = str(tmp_path / "chat_history.db")
+    config = {"configurable": {"thread_id": "t-1", "checkpoint_ns": ""}}
+
+    async def round_trip():
+        from langgraph.checkpoint.base import empty_checkpoint
+        saver = await memory.aget_checkpointer()
+        checkpoint = empty_checkpoint()
+        await saver.aput(config, checkpoint, {"source": "input", "step": 0}, {})
+        stored = await saver.aget_tuple(config)
+        await memory.aclose_checkpointer()
+        return checkpoint["id"], stored
+
+    with patch.object(memory, "_db_path", return_value=db_path):
+        checkpoint_id, stored = asyncio.run(round_trip())
+    assert stored.checkpoint["id"] == checkpoint_id
+
+def test_pooled_saver_concurrent_sessions(tmp_path):
+    from langgraph.checkpoint.base import empty_checkpoint
+    db_path = str(tmp_path / "chat_history.db")
+
+    async def session(saver, i):
+        config = {"configurable": {"thread_id": f"s-{i}", "checkpoint_ns": ""}}
+        checkpoint = empty_checkpoint()
+        saved = await saver.aput(config, checkpoint, {"source": "input", "step": 0}, {})
+        await saver.aput_writes(saved, [("messages", f"hello {i}"), ("answer", i)], task_id="t")
+        stored = await saver.aget_tuple(config)
+        return checkpoint["id"], stored
+
+    async def run():
+        saver = await memory.PooledAsyncSqliteSaver.create(db_path, pool_size=4, busy_timeout_ms=5000)
+        try:
+            mode = await (await saver.readers[1].conn.execute("PRAGMA journal_mode")).fetchone()
+            results = await asyncio.gather(*(session(saver, i) for i in range(60)))
+            return mode[0], results, {id(saver._reader(f"s-{i}")) for i in range(60)}, saver.stats()
+        finally:
+            await saver.aclose()
+
+    journal_mode, results, used_readers, stats = asyncio.run(run())
+    assert journal_mode == "wal"
+    assert len(used_readers) > 1
+    # 60 sessions x 2 writes were group-committed in fewer transactions
+    assert stats["writes"] == 120
+    assert stats["batches"] < 120
+    for i, (checkpoint_id, stored) in enumerate(results):
+        assert stored.checkpoint["id"] == checkpoint_id
+        assert {(channel, value) for _, channel, value in stored.pending_writes} == {("messages", f"hello {i}"), ("answer", i)}
+
+def test_pooled_saver_as_graph_checkpointer(tmp_path):
+    from typing import TypedDict
+    from langgraph.graph import StateGraph, START, END
+    db_path = str(tmp_path / "chat_history.db")
+
+    class State(TypedDict):
+        count: int
+
+    builder = StateGraph(State)
+    builder.add_node("inc", lambda state: {"count": state["count"] + 1})
+    builder.add_edge(START, "inc")
+    builder.add_edge("inc", END)
+
+    async def run():
+        saver = await memory.PooledAsyncSqliteSaver.create(db_path, pool_size=2)
+        try:
+            graph = builder.compile(checkpointer=saver)
+            config = {"configurable": {"thread_id": "graph-1"}}
+            await graph.ainvoke({"count": 1}, config)
+            state = await graph.aget_state(config)
+            return state.values
+        finally:
+            await saver.aclose()
+
+    assert asyncio.run(run()) == {"count": 2}
+
+def test_writer_failure_fails_every_pending_write_instead_of_hanging(tmp_path):
+    db_path = str(tmp_path / "chat_history.db")
+
+    async def run():
+        saver = await memory.PooledAsyncSqliteSaver.create(db_path, pool_size=1, max_batch=1)
+        real_conn = saver.writer.conn
+        broken = MagicMock()
+        broken.executemany = AsyncMock(side_effect=sqlite3.OperationalError("disk I/O error"))
+        broken.rollback = AsyncMock(side_effect=sqlite3.OperationalError("cannot rollback"))
+        saver.writer.conn = broken
+        try:
+            # max_batch=1: 写协程退出时其余写入仍在队列中排队
+            return await asyncio.wait_for(
+                asyncio.gather(*(saver.adelete_thread(f"t-{i}") for i in range(5)), return_exceptions=True),
+                timeout=5,
+            )
+        finally:
+            saver.writer.conn = real_conn
+            await saver.aclose()
+
+    results = asyncio.run(run())
+    assert len(results) == 5
+    assert all(isinstance(r, sqlite3.OperationalError) for r in results)
@@ -0,0 +1,75 @@
+import sys
+import os
+import uuid
+import pytest
+
+# Add src to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from prometheus_client import REGISTRY
+from langchain_core.documents import Document
+from src.core.metrics import StageMetricsHandler, record_cache, timed
+from src.core.retrieval_cache import RetrievalCache
+
+def _count(stage):
+    return REGISTRY.get_sample_value("enterprise_brain_stage_latency_seconds_count", {"stage": stage}) or 0
+
+def _errors(stage):
+    return REGISTRY.get_sample_value("enterprise_brain_errors_total", {"stage": stage}) or 0
+
+def _cache(cache, result):
+    return REGISTRY.get_sample_value("enterprise_brain_cache_requests_total", {"cache": cache, "result": result}) or 0
+
+def test_timed_records_latency_and_errors():
+    before, errors_before = _count("test_stage"), _errors("test_stage")
+    with timed("test_stage"):
+        pass
+    with pytest.raises(RuntimeError):
+        with timed("test_stage"):
+            raise RuntimeError("boom")
+
+    assert _count("test_stage") == before + 2
+    assert _errors("test_stage") == errors_before + 1
+
+def test_retrieval_cache_counts_hits_and_misses():
+    cache = RetrievalCache(max_entries=10, ttl_seconds=60)
+    key = cache.make_key("VPN", "local", 3, 0)
+    hits, misses = _cache("retrieval", "hit"), _cache("retrieval", "miss")
+
+    cache.get(key)
+    cache.put(key, [Document(page_content="VPN 申请流程", metadata={})])
+    cache.get(key)
+
+    assert _cache("retrieval", "hit") == hits + 1
+    assert _cache("retrieval", "miss") == misses + 1
+
+def test_callback_handler_records_llm_first_token_and_tools():
+    handler = StageMetricsHandler()
+    first, llm, tool = _count("llm_first_token"), _count("llm"), REGISTRY.get_sample_value(
+        "enterprise_brain_tool_latency_seconds_count", {"tool": "knowledge_base"}) or 0
+
+    run_id = uuid.uuid4()
+    handler.on_chat_model_start({}, [[]], run_id=run_id)
+    handler.on_llm_new_token("你", run_id=run_id)
+    handler.on_llm_new_token("好", run_id=run_id)
+    handler.on_llm_end(None, run_id=run_id)
+    tool_run = uuid.uuid4()
+    handler.on_tool_start({"name": "knowledge_base"}, "VPN", run_id=tool_run)
+    handler.on_tool_end("Source: a.md", run_id=tool_run)
+
+    assert _count("llm_first_token") == first + 1  # only the first token of a run
+    assert _count("llm") == llm + 1
+    assert REGISTRY.get_sample_value("enterprise_brain_tool_latency_seconds_count", {"tool": "knowledge_base"}) == tool + 1
+
+def test_metrics_endpoint_exposes_prometheus_text():
+    from fastapi.testclient import TestClient
+    from src.api.main import app
+    record_cache("semantic", hit=True)
+
+    response = TestClient(app).get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "enterprise_brain_cache_requests_total" in response.text
+    assert "enterprise_brain_stage_latency_seconds_bucket" in response.text
+    assert "enterprise_brain_ingest_chunks_total" in response.text
@@ -0,0 +1,71 @@
+import sys
+import os
+import time
+
+# Add src to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.documents import Document
+from src.core.reranker import CrossEncoderReranker
+from src.core.hybrid_retriever import HybridRetriever
+from unittest.mock import MagicMock
+
+def _docs(*texts):
+    return [Document(id=str(i), page_content=text, metadata={"chunk_id": str(i)}) for i, text in enumerate(texts)]
+
+def _model(scores, delay=0.0):
+    model = MagicMock()
+    model.predict.side_effect = lambda pairs, **kwargs: (time.sleep(delay), scores[:len(pairs)])[1]
+    return model
+
+def test_rerank_scores_all_pairs_in_one_batch():
+    model = _model([0.1, 0.9, 0.5])
+    reranker = CrossEncoderReranker(model=model, budget_ms=1000)
+
+    docs = reranker.rerank("vpn", _docs("a", "b", "c"), k=2)
+
+    assert [d.page_content for d in docs] == ["b", "c"]
+    assert docs[0].metadata["rerank_score"] == 0.9
+    model.predict.assert_called_once()
+    pairs = model.predict.call_args[0][0]
+    assert pairs == [("vpn", "a"), ("vpn", "b"), ("vpn", "c")]
+    assert model.predict.call_args[1]["batch_size"] == 3
+
+def test_rerank_falls_back_to_fused_order_over_budget():
+    reranker = CrossEncoderReranker(model=_model([0.1, 0.9], delay=0.3), budget_ms=50)
+
+    docs = reranker.rerank("vpn", _docs("a", "b"), k=1)
+
+    assert [d.page_content for d in docs] == ["a"]
+    assert reranker.stats()["fallbacks"]["timeout"] == 1
+    # The slow pass is still running: the next request skips the model instead of queueing
+    docs = reranker.rerank("vpn", _docs("a", "b"), k=1)
+    assert [d.page_content for d in docs] == ["a"]
+    assert reranker.stats()["fallbacks"]["busy"] == 1
+
+def test_rerank_falls_back_on_model_error():
+    model = MagicMock()
+    model.predict.side_effect = RuntimeError("boom")
+    reranker = CrossEncoderReranker(model=model, budget_ms=1000)
+
+    docs = reranker.rerank("vpn", _docs("a", "b"), k=1)
+
+    assert [d.page_content for d in docs] == ["a"]
+    assert reranker.stats()["fallbacks"]["error"] == 1
+    # The worker is free again after the failure
+    model.predict.side_effect = None
+    model.predict.return_value = [0.0, 1.0]
+    assert reranker.rerank("vpn", _docs("a", "b"), k=1)[0].page_content == "b"
+
+def test_hybrid_retriever_reranks_fused_candidates():
+    vector_store = MagicMock()
+    vector_store.similarity_search.return_value = _docs("a", "b", "c", "d")
+    reranker = MagicMock()
+    reranker.rerank.side_effect = lambda query, docs, k: list(reversed(docs))[:k]
+    retriever = HybridRetriever(vector_store=vector_store, k=2, reranker=reranker, rerank_candidates=3)
+
+    docs = retriever.invoke("vpn")
+
+    candidates = reranker.rerank.call_args[0][1]
+    assert len(candidates) == 3
+    assert [d.page_content for d in docs] == ["c", "b"]
@@ -0,0 +1,73 @@
+import sys
+import os
+import asyncio
+
+# Add src to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.documents import Document
+from src.core.retrieval_cache import RetrievalCache, normalize_query
+from src.core.retriever import bump_index_generation
+from src.core.tools.retrieval import get_retrieval_tool
+from unittest.mock import MagicMock, patch
+
+def _docs(*ids, **extra):
+    return [Document(id=i, page_content=f"text {i}", metadata={"chunk_id": i, "source": f"{i}.md", **extra}) for i in ids]
+
+def test_normalize_query():
+    assert normalize_query("  VPN  怎么申请？") == normalize_query("vpn 怎么申请") == "vpn 怎么申请"
+    assert normalize_query("ＶＰＮ") == "vpn"
+
+def test_lru_eviction_and_hit_rate():
+    cache = RetrievalCache(max_entries=2, ttl_seconds=60)
+    cache.put("a", _docs("1"))
+    cache.put("b", _docs("2"))
+    assert cache.get("a")[0].id == "1"   # "a" is now most recently used
+    cache.put("c", _docs("3"))           # evicts "b"
+
+    assert cache.get("b") is None
+    assert cache.get("c")[0].metadata["chunk_id"] == "3"
+    assert cache.stats() == {"entries": 2, "hits": 2, "misses": 1, "hit_rate": 0.6667}
+
+def test_ttl_expiry(monkeypatch):
+    cache = RetrievalCache(max_entries=10, ttl_seconds=10)
+    now = [1000.0]
+    monkeypatch.setattr("src.core.retrieval_cache.time.monotonic", lambda: now[0])
+    cache.put("a", _docs("1"))
+    now[0] += 11
+    assert cache.get("a") is None
+    assert cache.stats()["entries"] == 0
+
+def test_empty_and_partial_results_are_not_cached():
+    cache = RetrievalCache(max_entries=10, ttl_seconds=60)
+    cache.put("empty", [])
+    cache.put("partial", _docs("1", partial=True))
+    assert cache.stats()["entries"] == 0
+
+def test_cached_docs_are_copies():
+    cache = RetrievalCache(max_entries=10, ttl_seconds=60)
+    cache.put("a", _docs("1"))
+    cache.get("a")[0].metadata["chunk_id"] = "mutated"
+    assert cache.get("a")[0].metadata["chunk_id"] == "1"
+
+@patch("src.core.tools.retrieval.get_retrieval_cache")
+def test_tool_serves_repeats_from_cache_until_ingest(mock_get_cache):
+    mock_get_cache.return_value = RetrievalCache(max_entries=10, ttl_seconds=60)
+    retriever = MagicMock()
+    retriever.k = 3
+    retriever.invoke.return_value = _docs("1")
+    tool = get_retrieval_tool(retriever)
+
+    first = tool.invoke({"query": "VPN 怎么申请？"})
+    second = tool.invoke({"query": "vpn 怎么申请"})
+    assert first == second and "Source: 1.md" in first
+    assert retriever.invoke.call_count == 1
+
+    # The async path shares the same cache
+    asyncio.run(tool.ainvoke({"query": "vpn 怎么申请"}))
+    retriever.ainvoke.assert_not_called()
+
+    # A successful ingest bumps the index generation: no stale results
+    bump_index_generation()
+    tool.invoke({"query": "vpn 怎么申请"})
+    assert retriever.invoke.call_count == 2
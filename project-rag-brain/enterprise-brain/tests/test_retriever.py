@@ -4,13 +4,16 @@ import os
 # Add src to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from src.core.retriever import get_retriever, reset_bm25_cache
+from src.core.retriever import get_retriever, load_all_docs, reset_bm25_cache, settings
+from src.core.hybrid_retriever import HybridRetriever
+from langchain_core.documents import Document
 from unittest.mock import MagicMock, patch
 
 @patch("src.core.retriever.load_all_docs")
 @patch("src.core.retriever.DBFactory")
-@patch("src.core.retriever.EnsembleRetriever")
-def test_hybrid_retriever(mock_ensemble, mock_db_factory, mock_load_docs):
+def test_hybrid_retriever(mock_db_factory, mock_load_docs, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "INDEX_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "LEXICAL_INDEX_SOURCE", "files")
     # Setup Mocks
     mock_embeddings = MagicMock()
     
@@ -21,30 +24,25 @@ def test_hybrid_retriever(mock_ensemble, mock_db_factory, mock_load_docs):
     mock_db_factory.get_vector_store.return_value = mock_vector_store
     
     # Mock Documents for BM25
-    mock_doc = MagicMock()
-    mock_doc.page_content = "Test content"
-    mock_load_docs.return_value = [mock_doc]
+    mock_load_docs.return_value = [Document(page_content="Test content", metadata={"source": "data/a.md"})]
     
     # Test initialization
     reset_bm25_cache()
     retriever = get_retriever(mock_embeddings)
     
-    # Verify EnsembleRetriever was called
-    mock_ensemble.assert_called_once()
-    
-    # Check arguments passed to EnsembleRetriever
-    call_args = mock_ensemble.call_args[1]
-    retrievers = call_args['retrievers']
-    weights = call_args['weights']
-    
-    assert len(retrievers) == 2
-    assert retrievers[1] == mock_vector_retriever  # 2nd is vector
-    assert weights == [0.4, 0.6]
+    # Verify the hybrid retriever fuses BM25 with the vector store
+    assert isinstance(retriever, HybridRetriever)
+    assert len(retriever.lexical_index) == 1
+    assert retriever.vector_store == mock_vector_store
+    assert (retriever.lexical_weight, retriever.vector_weight) == (0.4, 0.6)
+    assert retriever.candidate_k == settings.RETRIEVAL_CANDIDATE_K
 
 @patch("src.core.retriever.load_all_docs")
 @patch("src.core.retriever.DBFactory")
-def test_hybrid_retriever_fallback(mock_db_factory, mock_load_docs):
+def test_hybrid_retriever_fallback(mock_db_factory, mock_load_docs, tmp_path, monkeypatch):
     """Test fallback to vector only if no docs found"""
+    monkeypatch.setattr(settings, "INDEX_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "LEXICAL_INDEX_SOURCE", "files")
     mock_embeddings = MagicMock()
     
     mock_vector_store = MagicMock()
@@ -60,3 +58,86 @@ def test_hybrid_retriever_fallback(mock_db_factory, mock_load_docs):
     
     # Should return vector retriever directly
     assert retriever == mock_vector_retriever
+
+@patch("src.core.retriever.load_all_docs")
+@patch("src.core.retriever.DBFactory")
+def test_bm25_index_loaded_from_disk(mock_db_factory, mock_load_docs, tmp_path, monkeypatch):
+    """Only the first start bootstraps from the data directory"""
+    monkeypatch.setattr(settings, "INDEX_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "LEXICAL_INDEX_SOURCE", "files")
+    mock_load_docs.return_value = [Document(page_content="VPN 申请 流程", metadata={"source": "data/vpn.md"})]
+
+    reset_bm25_cache()
+    get_retriever(MagicMock())
+    reset_bm25_cache()
+    get_retriever(MagicMock())
+
+    assert mock_load_docs.call_count == 1
+    assert os.path.exists(settings.BM25_INDEX_PATH)
+
+@patch("src.core.retriever.load_all_docs")
+@patch("src.core.retriever.DBFactory")
+def test_bm25_index_built_from_stored_chunks(mock_db_factory, mock_load_docs, tmp_path, monkeypatch):
+    """In chunks mode BM25 reuses the chunks ingest stored, with the same IDs"""
+    monkeypatch.setattr(settings, "INDEX_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "LEXICAL_INDEX_SOURCE", "chunks")
+    collection = MagicMock()
+    collection.get.side_effect = [
+        {
+            "ids": ["c-1", "c-2"],
+            "documents": ["VPN 申请 流程", "远程 办公 政策"],
+            "metadatas": [
+                {"source": "data/vpn.md", "file_hash": "h1", "chunk_id": "c-1"},
+                {"source": "data/remote.md", "file_hash": "h2"},
+            ],
+        },
+        {"ids": [], "documents": [], "metadatas": []},
+    ]
+    mock_db_factory.get_collection.return_value = collection
+
+    reset_bm25_cache()
+    retriever = get_retriever(MagicMock())
+
+    mock_load_docs.assert_not_called()
+    # Legacy chunk without chunk_id metadata gets it backfilled
+    collection.update.assert_called_once()
+    assert collection.update.call_args[1]["ids"] == ["c-2"]
+
+    hits = retriever.lexical_index.search("VPN", k=3)
+    assert [chunk_id for chunk_id, _ in hits] == ["c-1"]
+
+def test_load_all_docs_yields_chunks_file_by_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "DATA_DIR", str(tmp_path))
+    (tmp_path / "a.md").write_text("VPN " * 400, encoding="utf-8")
+    (tmp_path / "b.txt").write_text("远程办公", encoding="utf-8")
+
+    chunks = load_all_docs()
+    assert not isinstance(chunks, list)  # generator, nothing loaded yet
+
+    sources = [c.metadata["source"] for c in chunks]
+    assert len(sources) > 2
+    assert sorted(set(sources)) == sorted({str(tmp_path / "a.md"), str(tmp_path / "b.txt")})
+    # chunks of one file are contiguous
+    assert sum(1 for prev, cur in zip(sources, sources[1:]) if prev != cur) == 1
+
+@patch("src.core.retriever.load_stored_chunks", side_effect=ConnectionError("chroma down"))
+@patch("src.core.retriever.DBFactory")
+def test_failed_bm25_bootstrap_is_not_saved_or_marked_warm(mock_db_factory, mock_load_stored, tmp_path, monkeypatch):
+    import pytest
+    from src.core import warmup
+    monkeypatch.setattr(settings, "INDEX_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "LEXICAL_INDEX_SOURCE", "chunks")
+    monkeypatch.setitem(warmup._status, "bm25", False)
+    reset_bm25_cache()
+
+    with pytest.raises(ConnectionError):
+        get_retriever(MagicMock())
+    assert not os.path.exists(settings.BM25_INDEX_PATH)
+
+    # Warmup records the failure and keeps bm25 "not ready" so the retry loop tries again
+    monkeypatch.setattr(warmup, "_STEPS", [("bm25", warmup.warm_bm25_cache)])
+    monkeypatch.setattr(warmup, "is_ready", lambda: warmup._status["bm25"] or mock_load_stored.call_count >= 3)
+    monkeypatch.setattr(warmup.settings, "WARMUP_RETRY_SECONDS", 0)
+    warmup.run_warmup()
+    assert warmup._status["bm25"] is False
+    assert "chroma down" in warmup._errors["bm25"]
@@ -0,0 +1,102 @@
+import sys
+import os
+import json
+import time
+
+# Add src to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.core.semantic_cache import SemanticCache, settings
+from unittest.mock import MagicMock, patch
+
+def _query_result(similarity, created_at, sources=("vpn.md",)):
+    return {
+        "ids": [["entry-1"]],
+        "distances": [[1.0 - similarity]],
+        "metadatas": [[{
+            "response": "请在 IT 门户提交申请",
+            "sources": json.dumps(list(sources)),
+            "created_at": created_at,
+        }]],
+    }
+
+@patch("src.core.semantic_cache.DBFactory")
+def test_lookup_hit_and_miss_by_threshold(mock_db_factory):
+    collection = mock_db_factory.get_cache_collection.return_value
+    embeddings = MagicMock()
+    embeddings.embed_query.return_value = [0.1, 0.2]
+    cache = SemanticCache(embeddings)
+
+    collection.query.return_value = _query_result(settings.SEMANTIC_CACHE_THRESHOLD + 0.01, time.time())
+    hit, embedding = cache.lookup("如何申请 VPN 权限?")
+    assert hit["sources"] == ["vpn.md"]
+    assert embedding == [0.1, 0.2]
+
+    collection.query.return_value = _query_result(settings.SEMANTIC_CACHE_THRESHOLD - 0.2, time.time())
+    hit, _ = cache.lookup("报销流程是什么?")
+    assert hit is None
+    assert cache.stats() == {"hits": 1, "misses": 1}
+
+@patch("src.core.semantic_cache.DBFactory")
+def test_expired_entry_is_deleted(mock_db_factory):
+    collection = mock_db_factory.get_cache_collection.return_value
+    cache = SemanticCache(MagicMock())
+    collection.query.return_value = _query_result(1.0, time.time() - settings.SEMANTIC_CACHE_TTL_SECONDS - 1)
+
+    hit, _ = cache.lookup("如何申请 VPN 权限?")
+
+    assert hit is None
+    collection.delete.assert_called_once_with(ids=["entry-1"])
+
+@patch("src.core.semantic_cache.DBFactory")
+def test_invalidate_entries_citing_changed_files(mock_db_factory):
+    collection = mock_db_factory.get_cache_collection.return_value
+    collection.get.return_value = {
+        "ids": ["a", "b", "c"],
+        "metadatas": [
+            {"sources": json.dumps(["vpn.md"])},
+            {"sources": json.dumps(["hr.md"])},
+            {"sources": json.dumps([])},
+        ],
+    }
+    cache = SemanticCache(MagicMock())
+
+    assert cache.invalidate_sources(["vpn.md"]) == 2
+    collection.delete.assert_called_once_with(ids=["a", "c"])
+
+@patch("src.core.semantic_cache.DBFactory")
+def test_evict_oldest_beyond_capacity(mock_db_factory, monkeypatch):
+    monkeypatch.setattr(settings, "SEMANTIC_CACHE_MAX_ENTRIES", 2)
+    collection = mock_db_factory.get_cache_collection.return_value
+    now = time.time()
+    collection.get.return_value = {
+        "ids": ["new", "old", "mid"],
+        "metadatas": [{"created_at": now}, {"created_at": now - 30}, {"created_at": now - 10}],
+    }
+    cache = SemanticCache(MagicMock())
+
+    assert cache.evict() == 1
+    collection.delete.assert_called_once_with(ids=["old"])
+
+@patch("src.core.semantic_cache.DBFactory")
+def test_full_cache_evicts_to_low_watermark_instead_of_scanning_every_store(mock_db_factory, monkeypatch):
+    monkeypatch.setattr(settings, "SEMANTIC_CACHE_MAX_ENTRIES", 10)
+    collection = mock_db_factory.get_cache_collection.return_value
+    collection.count.return_value = 11
+    now = time.time()
+    collection.get.return_value = {
+        "ids": [f"e{i}" for i in range(11)],
+        "metadatas": [{"created_at": now - 100 + i} for i in range(11)],
+    }
+    cache = SemanticCache(MagicMock())
+
+    cache.store("q0", [0.1], "a", [])
+    # 淘汰到 9 条 (90%), 删除最旧的 2 条
+    collection.delete.assert_called_once_with(ids=["e0", "e1"])
+
+    cache.store("q1", [0.1], "a", [])
+    assert collection.count.call_count == 1
+    assert collection.get.call_count == 1
+
+    cache.store("q2", [0.1], "a", [])
+    assert collection.get.call_count == 2